@@ -0,0 +1,124 @@
+"""
+Per-request cost of the request middleware: the former
+@app.middleware("http") version (BaseHTTPMiddleware) against the pure-ASGI
+RequestContextMiddleware, both measured over an app without middleware.
+
+    python -m benchmarks.middleware_overhead --requests 20000
+
+Requests go through httpx's ASGI transport to a trivial endpoint, so the
+difference between the runs is the middleware itself. Logging is silenced
+unless --with-logging is given.
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+from collections.abc import Awaitable, Callable
+import httpx
+from fastapi import FastAPI, Request, Response
+from src.logging_config import (
+    hold_sampled_records,
+    log_context,
+    release_sampled_records,
+)
+from src.metrics import REQUESTS_IN_FLIGHT, observe_request, route_label
+from src.middleware import RequestContextMiddleware
+
+logger = logging.getLogger("src.main")
+
+
+async def base_http_middleware(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """The middleware as it was registered with @app.middleware("http")."""
+    correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+    token = log_context.set(
+        {
+            "correlation_id": correlation_id,
+            "method": request.method,
+            "path": request.url.path,
+            "client_ip": request.client.host if request.client else "unknown",
+        }
+    )
+    held_records = hold_sampled_records()
+    start_time = time.time()
+    status_code = 500
+    in_flight = REQUESTS_IN_FLIGHT.labels(request.method)
+    in_flight.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        process_time = time.time() - start_time
+        response.headers["X-Process-Time"] = str(process_time)
+        response.headers["X-Correlation-ID"] = correlation_id
+        logger.info(
+            "Request completed in %.4fs with status %s",
+            process_time,
+            response.status_code,
+        )
+        return response
+    finally:
+        elapsed = time.time() - start_time
+        in_flight.dec()
+        observe_request(
+            request.method, route_label(request.scope), status_code, elapsed
+        )
+        release_sampled_records(held_records, elapsed)
+        log_context.reset(token)
+
+
+def make_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    if variant == "base_http":
+        _ = app.middleware("http")(base_http_middleware)
+    elif variant == "asgi":
+        app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/ping")
+    async def ping() -> dict[str, str]:
+        return {"status": "ok"}
+
+    return app
+
+
+async def measure(variant: str, requests: int, warmup: int) -> list[float]:
+    transport = httpx.ASGITransport(app=make_app(variant))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        for _ in range(warmup):
+            _ = await c.get("/ping")
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            _ = await c.get("/ping")
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    _ = parser.add_argument("--requests", type=int, default=20000)
+    _ = parser.add_argument("--warmup", type=int, default=1000)
+    _ = parser.add_argument("--with-logging", action="store_true")
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        logging.disable(logging.INFO)
+
+    results = {
+        variant: asyncio.run(measure(variant, args.requests, args.warmup))
+        for variant in ("none", "base_http", "asgi")
+    }
+    baseline = statistics.median(results["none"])
+    print(f"{'middleware':<12}{'p50 us':>10}{'p99 us':>10}{'overhead us':>13}")
+    for variant, timings in results.items():
+        timings.sort()
+        p50 = statistics.median(timings)
+        p99 = timings[int(0.99 * len(timings))]
+        print(f"{variant:<12}{p50:>10.1f}{p99:>10.1f}{p50 - baseline:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
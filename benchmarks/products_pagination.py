@@ -0,0 +1,117 @@
+"""
+Catalog paging cost at increasing depth: keyset (GET /products) vs OFFSET,
+and the cached page path.
+
+    python -m benchmarks.products_pagination --products 1000000
+
+Runs against DATABASE_URL (or --database-url). Tables are created if missing
+and products are topped up to --products with generate_series; existing rows
+are left alone, so point it at a scratch database.
+"""
+
+import os
+import json
+import time
+import argparse
+import statistics
+from collections.abc import Callable
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+from src.shopping.catalog import ProductCatalog
+from src.shopping.models import metadata, products_table
+from src.shopping.repository import ProductRepository
+
+
+def seed(session: Session, count: int) -> None:
+    current = session.execute(select(func.count()).select_from(products_table))
+    existing = current.scalar_one()
+    if existing >= count:
+        return
+    print(f"Seeding {count - existing} products...")
+    _ = session.execute(
+        text(
+            "INSERT INTO products (id, stock) "
+            "SELECT g, 100 FROM generate_series("
+            "(SELECT COALESCE(MAX(id), 0) + 1 FROM products), "
+            "(SELECT COALESCE(MAX(id), 0) FROM products) + :n) AS g"
+        ),
+        {"n": count - existing},
+    )
+    session.commit()
+    _ = session.execute(text("ANALYZE products"))
+    session.commit()
+
+
+def median_ms(run: Callable[[], object], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _ = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def offset_page(session: Session, offset: int, limit: int) -> list[tuple[int, int]]:
+    stmt = (
+        select(products_table.c.id, products_table.c.stock)
+        .order_by(products_table.c.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return [(row.id, row.stock) for row in session.execute(stmt)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    _ = parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    _ = parser.add_argument("--products", type=int, default=1_000_000)
+    _ = parser.add_argument("--limit", type=int, default=20)
+    _ = parser.add_argument("--repeats", type=int, default=20)
+    _ = parser.add_argument("--output", help="Write the results as JSON here")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    engine = create_engine(args.database_url)
+    metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    seed(session, args.products)
+
+    max_id = session.execute(select(func.max(products_table.c.id))).scalar_one()
+    repo = ProductRepository(session)
+    catalog = ProductCatalog(max_age=3600.0)
+
+    results = []
+    print(f"{'depth':>8} {'keyset ms':>10} {'offset ms':>10} {'cached ms':>10}")
+    for depth in (0.0, 0.1, 0.5, 0.9, 0.999):
+        position = int(max_id * depth)
+        _ = catalog.get_page(session, position, args.limit)
+        row = {
+            "depth": depth,
+            "after_id": position,
+            "keyset_ms": median_ms(
+                lambda: repo.list_after(position, args.limit + 1), args.repeats
+            ),
+            "offset_ms": median_ms(
+                lambda: offset_page(session, position, args.limit), args.repeats
+            ),
+            "cached_ms": median_ms(
+                lambda: catalog.get_page(session, position, args.limit),
+                args.repeats,
+            ),
+        }
+        results.append(row)
+        print(
+            f"{depth:>8.1%} {row['keyset_ms']:>10.3f} "
+            f"{row['offset_ms']:>10.3f} {row['cached_ms']:>10.4f}"
+        )
+
+    session.close()
+    engine.dispose()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"products": args.products, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Replays recorded request traces (see TRAFFIC_RECORD_FILE) as a load test and
+reports throughput and p50/p95/p99 latency per endpoint.
+
+    # In-process, through ASGI (uses DATABASE_URL and the app's settings)
+    python -m benchmarks.replay traces.jsonl --concurrency 32 --rate 200
+
+    # Against a running server; tokens are minted per recorded user
+    python -m benchmarks.replay traces.jsonl --base-url http://127.0.0.1:8000 \\
+        --private-key key.pem --kid local-dev-key
+
+Arrivals follow --rate (Poisson, requests/second), or the recorded timing
+scaled by --speed, or, with neither, are sent as fast as --concurrency allows.
+Paced latencies count from each request's scheduled arrival, so time spent
+waiting for one of the --concurrency slots is included rather than hidden;
+the wait column shows how much of it that was.
+In-process runs skip the app lifespan (no lease release loop).
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import httpx
+import jwt
+
+REPLAY_USER_HEADER = "X-Replay-User"
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    waits: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    errors: int = 0
+
+
+def load_traces(path: str) -> list[dict[str, object]]:
+    with open(path) as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    return sorted(traces, key=lambda trace: float(trace.get("ts") or 0))
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def token_minter(private_key_path: str, kid: str) -> Callable[[str], str]:
+    with open(private_key_path, "rb") as f:
+        private_key = f.read()
+    tokens: dict[str, str] = {}
+
+    def mint(user: str) -> str:
+        if user not in tokens:
+            tokens[user] = jwt.encode(
+                {
+                    "sub": user,
+                    "role": "authenticated",
+                    "aud": "authenticated",
+                    "exp": int(time.time()) + 3600,
+                },
+                private_key,
+                algorithm="ES256",
+                headers={"kid": kid},
+            )
+        return tokens[user]
+
+    return mint
+
+
+def in_process_client() -> httpx.AsyncClient:
+    """Client driving src.main.app through ASGI, authenticated by header."""
+    from fastapi import Request
+    from src.auth.dependencies import get_current_user
+    from src.auth.domain import User
+    from src.main import app
+
+    def replay_user(request: Request) -> User:
+        return User(id=request.headers.get(REPLAY_USER_HEADER, "replay-anonymous"))
+
+    app.dependency_overrides[get_current_user] = replay_user
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://replay"
+    )
+
+
+def arrival_offsets(
+    traces: list[dict[str, object]], rate: float | None, speed: float | None
+) -> list[float] | None:
+    """Seconds after the start each trace is due, or None for unpaced."""
+    if rate:
+        offsets, now = [], 0.0
+        for _ in traces:
+            now += random.expovariate(rate)
+            offsets.append(now)
+        return offsets
+    if speed:
+        start = float(traces[0].get("ts") or 0)
+        return [(float(trace.get("ts") or 0) - start) / speed for trace in traces]
+    return None
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    traces: list[dict[str, object]],
+    concurrency: int,
+    offsets: list[float] | None,
+    auth: Callable[[str], dict[str, str]],
+) -> tuple[dict[str, EndpointStats], float]:
+    stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+    slots = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def send(trace: dict[str, object], offset: float | None) -> None:
+        if offset is not None:
+            delay = offset - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        endpoint = f"{trace['method']} {trace['path']}"
+        headers = auth(str(trace["user"])) if trace.get("user") else {}
+        async with slots:
+            request_start = time.perf_counter()
+            # A request that waited for a slot was still due at its offset
+            arrival = request_start if offset is None else started + offset
+            try:
+                response = await client.request(
+                    str(trace["method"]),
+                    str(trace["path"]),
+                    params=str(trace.get("query") or "") or None,
+                    json=trace.get("body"),
+                    headers=headers,
+                )
+            except httpx.HTTPError:
+                stats[endpoint].errors += 1
+                return
+            stats[endpoint].latencies.append(time.perf_counter() - arrival)
+            stats[endpoint].waits.append(request_start - arrival)
+            stats[endpoint].statuses[response.status_code] += 1
+
+    _ = await asyncio.gather(
+        *(
+            send(trace, offset)
+            for trace, offset in zip(traces, offsets or [None] * len(traces))
+        )
+    )
+    return stats, time.perf_counter() - started
+
+
+def summarize(stats: dict[str, EndpointStats], elapsed: float) -> dict[str, object]:
+    endpoints: dict[str, object] = {}
+    for endpoint, endpoint_stats in sorted(stats.items()):
+        latencies = sorted(endpoint_stats.latencies)
+        waits = sorted(endpoint_stats.waits)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "errors": endpoint_stats.errors,
+            "statuses": dict(endpoint_stats.statuses),
+            "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "p99_wait_ms": percentile(waits, 0.99) * 1000,
+        }
+    total = sum(len(s.latencies) for s in stats.values())
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict[str, object]) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed_s']:.2f}s "
+        f"({report['throughput_rps']:.1f} req/s)"
+    )
+    print(
+        f"{'endpoint':<28} {'n':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'p99 wait':>8}  statuses"
+    )
+    endpoints = report["endpoints"]
+    assert isinstance(endpoints, dict)
+    for endpoint, row in endpoints.items():
+        print(
+            f"{endpoint:<28} {row['requests']:>7} {row['throughput_rps']:>8.1f} "
+            f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['p99_wait_ms']:>8.2f}  "
+            f"{row['statuses']}{' errors=' + str(row['errors']) if row['errors'] else ''}"
+        )
+
+
+async def run(args: argparse.Namespace) -> dict[str, object]:
+    traces = load_traces(args.traces)
+    if args.requests:
+        # Loop over the recording to reach the requested count
+        traces = [traces[i % len(traces)] for i in range(args.requests)]
+    offsets = arrival_offsets(traces, args.rate, args.speed)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+        mint = token_minter(args.private_key, args.kid) if args.private_key else None
+
+        def auth(user: str) -> dict[str, str]:
+            return {"Authorization": f"Bearer {mint(user)}"} if mint else {}
+
+    else:
+        client = in_process_client()
+
+        def auth(user: str) -> dict[str, str]:
+            return {REPLAY_USER_HEADER: user}
+
+    async with client:
+        stats, elapsed = await replay(client, traces, args.concurrency, offsets, auth)
+    return summarize(stats, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    _ = parser.add_argument("traces", help="JSONL file written by the recorder")
+    _ = parser.add_argument("--base-url", help="Server to target (default: ASGI)")
+    _ = parser.add_argument("--concurrency", type=int, default=16)
+    _ = parser.add_argument("--rate", type=float, help="Poisson arrivals per second")
+    _ = parser.add_argument("--speed", type=float, help="Recorded timing multiplier")
+    _ = parser.add_argument("--requests", type=int, help="Total requests to send")
+    _ = parser.add_argument("--private-key", help="PEM key to mint ES256 tokens")
+    _ = parser.add_argument("--kid", default="local-dev-key")
+    _ = parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,33 @@
 import os
 import jwt
-import json
-from typing import Annotated, cast
+from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jwt import PyJWK
 from src.auth.domain import User
+from src.auth.keys import KeySetProvider
+from src.auth.token_cache import VerifiedTokenCache
 
 # This scheme expects "Authorization: Bearer <token>"
 # We set auto_error=False so we can manually handle missing credentials
 # and return 401 Unauthorized instead of the default 403 Forbidden.
 security = HTTPBearer(auto_error=False)
 
+# Parsed once per process; both are shared by every request in the worker.
+key_set_provider = KeySetProvider(
+    reload_interval=float(os.environ.get("JWT_JWKS_RELOAD_INTERVAL", "5"))
+)
+token_cache = VerifiedTokenCache(
+    max_size=int(os.environ.get("JWT_TOKEN_CACHE_SIZE", "1024")),
+    max_ttl=float(os.environ.get("JWT_TOKEN_CACHE_TTL", "300")),
+)
+
+# Users (token `sub`) allowed on the /admin routes, e.g. "uuid-1,uuid-2"
+ADMIN_USER_IDS = frozenset(
+    user_id.strip()
+    for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",")
+    if user_id.strip()
+)
+
 
 def get_current_user(
     auth: Annotated[HTTPAuthorizationCredentials | None, Depends(security)],
@@ -28,15 +44,22 @@ def get_current_user(
         )
 
     token = auth.credentials
-    secret = os.environ.get("JWT_SIGNING_KEY")
+    key_set = key_set_provider.get()
 
-    if not secret:
+    if key_set is None:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    jwk_data = cast(dict[str, object], json.loads(secret))
-    jwk = PyJWK(jwk_data)
+    cached_user = token_cache.get(token, key_set.version)
+    if cached_user is not None:
+        return cached_user
 
     try:
+        # Select the key by `kid` before doing any signature work
+        kid = jwt.get_unverified_header(token).get("kid")
+        jwk = key_set.select(kid if isinstance(kid, str) else None)
+        if jwk is None:
+            raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+
         # Verify the token using PyJWT
         payload = jwt.decode(
             token,
@@ -51,7 +74,15 @@ def get_current_user(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User ID not found in token",
             )
-        return User(id=user_id)
+        user = User(id=user_id)
+        exp = payload.get("exp")
+        token_cache.put(
+            token,
+            user,
+            exp if isinstance(exp, (int, float)) else None,
+            key_set.version,
+        )
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,3 +95,13 @@ def get_current_user(
             detail=f"Invalid token: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def get_admin_user(user: Annotated[User, Depends(get_current_user)]) -> User:
+    """Lets through only the users listed in ADMIN_USER_IDS."""
+    if user.id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return user
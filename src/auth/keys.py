@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from typing import cast
+from jwt import PyJWK
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class KeySet:
+    """Immutable snapshot of the verification keys, indexed by `kid`."""
+
+    version: int
+    keys: Mapping[str | None, PyJWK] = field(default_factory=dict)
+
+    def select(self, kid: str | None) -> PyJWK | None:
+        """
+        Returns the key for `kid`, or None if the token must be rejected.
+        A token naming a `kid` only matches the key published with that
+        `kid`. A token without one gets the key published without a `kid`,
+        or the only key when there is just one.
+        """
+        if kid is not None:
+            return self.keys.get(kid)
+        key = self.keys.get(None)
+        if key is None and len(self.keys) == 1:
+            key = next(iter(self.keys.values()))
+        return key
+
+
+def parse_key_set(raw: str, version: int) -> KeySet:
+    """Parses either a JWKS document ({"keys": [...]}) or a single JWK."""
+    document = json.loads(raw)
+    if not isinstance(document, dict):
+        raise ValueError("Key set must be a JSON object")
+    document = cast(dict[str, object], document)
+    if "keys" not in document:
+        jwk_list: list[object] = [document]
+    elif isinstance(document["keys"], list):
+        jwk_list = cast(list[object], document["keys"])
+    else:
+        raise ValueError('"keys" must be a list of JWKs')
+
+    keys: dict[str | None, PyJWK] = {}
+    for jwk_data in jwk_list:
+        if not isinstance(jwk_data, dict):
+            logger.warning("Skipping JWK that is not a JSON object")
+            continue
+        jwk_data = cast(dict[str, object], jwk_data)
+        if jwk_data.get("use", "sig") != "sig":
+            continue
+        kid = jwk_data.get("kid")
+        try:
+            keys[kid if isinstance(kid, str) else None] = PyJWK(jwk_data)
+        except Exception as e:
+            logger.warning("Skipping unusable JWK (kid: %s): %s", kid, e)
+
+    if not keys:
+        raise ValueError("No usable signing keys found")
+    return KeySet(version=version, keys=keys)
+
+
+class KeySetProvider:
+    """
+    Loads the verification keys and hot-reloads them when their source changes.
+
+    Sources, in order of precedence:
+      1. JWT_JWKS_FILE: path to a JWKS document, re-checked (via stat) at most
+         every `reload_interval` seconds.
+      2. JWT_JWKS: a JWKS document in the environment.
+      3. JWT_SIGNING_KEY: a single JWK (or JWKS document) in the environment.
+
+    Each reload builds a new `KeySet` and swaps it in with a single assignment,
+    so requests already holding the previous snapshot finish with it. A source
+    that fails to parse keeps the previous snapshot in place.
+    """
+
+    reload_interval: float
+    _key_set: KeySet | None
+    _source: object
+    _next_check: float
+    _version: int
+    _lock: threading.Lock
+    _clock: Callable[[], float]
+
+    def __init__(
+        self,
+        reload_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.reload_interval = reload_interval
+        self._key_set = None
+        self._source = None
+        self._next_check = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def get(self) -> KeySet | None:
+        path = os.environ.get("JWT_JWKS_FILE")
+        if path:
+            return self._get_from_file(path)
+
+        raw = os.environ.get("JWT_JWKS") or os.environ.get("JWT_SIGNING_KEY")
+        if not raw:
+            return None
+        if raw == self._source:
+            return self._key_set
+
+        with self._lock:
+            # Another thread may have loaded the same value while we waited
+            if raw != self._source:
+                self._load(raw, raw)
+            return self._key_set
+
+    def _get_from_file(self, path: str) -> KeySet | None:
+        now = self._clock()
+        if now < self._next_check and self._source is not None:
+            return self._key_set
+
+        with self._lock:
+            if now < self._next_check and self._source is not None:
+                return self._key_set
+            self._next_check = now + self.reload_interval
+
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                logger.error("Cannot stat JWKS file %s: %s", path, e)
+                return self._key_set
+
+            source = (path, stat.st_mtime_ns, stat.st_size)
+            if source != self._source:
+                try:
+                    with open(path) as f:
+                        raw = f.read()
+                except OSError as e:
+                    logger.error("Cannot read JWKS file %s: %s", path, e)
+                    return self._key_set
+                self._load(raw, source)
+            return self._key_set
+
+    def _load(self, raw: str, source: object) -> None:
+        try:
+            key_set = parse_key_set(raw, self._version + 1)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError as well
+            logger.error("Failed to load signing keys, keeping previous set: %s", e)
+            self._source = source
+            return
+
+        self._version = key_set.version
+        self._key_set = key_set
+        self._source = source
+        logger.info(
+            "Loaded %d signing key(s) (version %d)",
+            len(key_set.keys),
+            key_set.version,
+        )
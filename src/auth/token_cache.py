@@ -0,0 +1,78 @@
+import time
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from src.auth.domain import User
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens whose signature has already been verified.
+
+    Entries are tagged with the version of the key that verified them, so a
+    key change invalidates them, and they expire at the token's own `exp`
+    (capped at `max_ttl` seconds for tokens without one).
+    """
+
+    max_size: int
+    max_ttl: float
+    _entries: OrderedDict[str, tuple[User, float, int]]
+    _lock: threading.Lock
+    _clock: Callable[[], float]
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        max_ttl: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def get(self, token: str, key_version: int) -> User | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+
+            user, expires_at, version = entry
+            if version != key_version or self._clock() >= expires_at:
+                del self._entries[token]
+                return None
+
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: User, exp: float | None, key_version: int) -> None:
+        if self.max_size <= 0:
+            return
+
+        now = self._clock()
+        expires_at = now + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if expires_at <= now:
+            return
+
+        with self._lock:
+            self._entries[token] = (user, expires_at, key_version)
+            self._entries.move_to_end(token)
+            if len(self._entries) > self.max_size:
+                self._evict_expired(now)
+            while len(self._entries) > self.max_size:
+                _ = self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [t for t, (_, exp, _) in self._entries.items() if exp <= now]
+        for token in expired:
+            del self._entries[token]
@@ -0,0 +1,71 @@
+import sys
+import logging
+import argparse
+from typing import cast
+from src.database import engine
+from src.shopping.bulk import BulkFormat, BulkLoadError, BulkMode, load_products
+from src.shopping.models import metadata
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.bulk_load",
+        description="Load product stock from a CSV (id,stock header) or "
+        "NDJSON file with COPY and set-based upserts.",
+    )
+    _ = parser.add_argument("path", help="Input file, or - for stdin")
+    _ = parser.add_argument(
+        "--mode",
+        choices=["set", "adjust"],
+        default="set",
+        help="set: upsert products with the given stock; "
+        "adjust: add the given deltas to existing products",
+    )
+    _ = parser.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        help="Input format (default: from the file extension, else csv)",
+    )
+    _ = parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="Products applied per transaction",
+    )
+    return parser.parse_args(argv)
+
+
+def detect_format(path: str) -> BulkFormat:
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    fmt = cast(BulkFormat, args.format or detect_format(args.path))
+    mode = cast(BulkMode, args.mode)
+    metadata.create_all(bind=engine)
+
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        with engine.connect() as connection:
+            result = load_products(connection, source, fmt, mode, args.chunk_size)
+    except BulkLoadError as e:
+        logger.error("Rejected input: %s", e)
+        return 1
+    finally:
+        source.close()
+
+    print(
+        f"{result.rows} rows in {result.seconds:.1f}s "
+        f"({result.rows_per_second:.0f} rows/s): {result.inserted} inserted, "
+        f"{result.updated} updated, {result.skipped} skipped"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,191 @@
 import os
+import logging
+from typing import Any
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.orm import sessionmaker, Session
-from collections.abc import Generator
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from collections.abc import AsyncGenerator, Generator
 from dotenv import load_dotenv
+from src.metrics import DB_READ_SESSIONS
+from src.pool_metrics import PoolMetrics
+from src.replica import ReplicaLagGuard
+from src.shopping.sharding import parse_shard_urls
 
 _ = load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-engine = create_engine(DATABASE_URL)
+# Optional streaming replica for read-only sessions (get_read_db). Reads fall
+# back to the primary while it is unreachable or more than DB_REPLICA_MAX_LAG
+# seconds behind, as checked at most every DB_REPLICA_CHECK_INTERVAL seconds.
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "1"))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "1"))
+
+# Optional cart shards, "name=url,name=url": carts and their lines are spread
+# over these databases by consistent hash of the user id (products stay here).
+# Shard names place the carts, so keep them when a shard's URL changes.
+CART_SHARD_URLS = parse_shard_urls(os.environ.get("CART_SHARD_URLS", ""))
+
+# When enabled, the cart write routes run on the asyncpg engine below, so lock
+# waits park coroutines instead of occupying threadpool slots.
+DATABASE_ASYNC = os.environ.get("DATABASE_ASYNC", "false").lower() in ("1", "true")
+
+
+# libpq connection parameters asyncpg.connect() does not accept. They are
+# dropped from the async URL (with a warning) instead of failing every connect.
+LIBPQ_ONLY_PARAMS = frozenset(
+    [
+        "application_name",
+        "channel_binding",
+        "client_encoding",
+        "connect_timeout",
+        "fallback_application_name",
+        "gssencmode",
+        "keepalives",
+        "keepalives_count",
+        "keepalives_idle",
+        "keepalives_interval",
+        "options",
+        "requiressl",
+        "service",
+        "sslcert",
+        "sslcompression",
+        "sslcrl",
+        "sslkey",
+        "sslpassword",
+        "sslrootcert",
+        "tcp_user_timeout",
+    ]
+)
+
+
+def to_async_url(url: str) -> str:
+    """
+    Rewrites a postgresql:// URL to use the asyncpg driver. libpq's sslmode
+    becomes asyncpg's ssl (same mode names); other libpq-only parameters
+    are dropped.
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    dropped = sorted(LIBPQ_ONLY_PARAMS.intersection(query))
+    if dropped:
+        logger.warning(
+            "Ignoring connection parameters asyncpg does not support: %s",
+            ", ".join(dropped),
+        )
+    return (
+        parsed.set(
+            drivername="postgresql+asyncpg",
+            query={k: v for k, v in query.items() if k not in LIBPQ_ONLY_PARAMS},
+        )
+    ).render_as_string(hide_password=False)
+
+
+# Connection pool settings, per worker process. Size the pool against the
+# threadpool (40 by default) and Postgres max_connections / number of workers.
+POOL_OPTIONS: dict[str, Any] = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "-1")),
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "false").lower()
+    in ("1", "true"),
+}
+
+# Upper bound on any single lock wait, in milliseconds (0: wait forever).
+# A statement that hits it fails with lock_not_available (55P03), which the
+# API answers with 503 instead of letting requests pile up behind a lock.
+DB_LOCK_TIMEOUT_MS = int(os.environ.get("DB_LOCK_TIMEOUT_MS", "0"))
+
+pool_metrics = PoolMetrics()
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=pool_metrics.pool_class(QueuePool),
+    connect_args=(
+        {"options": f"-c lock_timeout={DB_LOCK_TIMEOUT_MS}"}
+        if DB_LOCK_TIMEOUT_MS
+        else {}
+    ),
+    **POOL_OPTIONS,
+)
+pool_metrics.instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_pool_metrics = PoolMetrics()
+replica_engine: Engine | None = None
+ReadSessionLocal: sessionmaker[Session] | None = None
+replica_guard: ReplicaLagGuard | None = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL,
+        poolclass=replica_pool_metrics.pool_class(QueuePool),
+        # Fail the lag check fast when the replica is down
+        connect_args={"connect_timeout": 2},
+        **POOL_OPTIONS,
+    )
+    replica_pool_metrics.instrument(replica_engine)
+    ReadSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+    replica_guard = ReplicaLagGuard(
+        replica_engine,
+        max_lag=DB_REPLICA_MAX_LAG,
+        check_interval=DB_REPLICA_CHECK_INTERVAL,
+    )
+
+cart_shard_pool_metrics: dict[str, PoolMetrics] = {}
+cart_shard_engines: dict[str, Engine] = {}
+for name, url in CART_SHARD_URLS.items():
+    cart_shard_pool_metrics[name] = PoolMetrics()
+    cart_shard_engines[name] = create_engine(
+        url,
+        poolclass=cart_shard_pool_metrics[name].pool_class(QueuePool),
+        connect_args=(
+            {"options": f"-c lock_timeout={DB_LOCK_TIMEOUT_MS}"}
+            if DB_LOCK_TIMEOUT_MS
+            else {}
+        ),
+        **POOL_OPTIONS,
+    )
+    cart_shard_pool_metrics[name].instrument(cart_shard_engines[name])
+
+# Only created with DATABASE_ASYNC, so the sync-only setup does not hold a
+# second pool per worker.
+async_pool_metrics = PoolMetrics()
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+if DATABASE_ASYNC:
+    async_engine = create_async_engine(
+        to_async_url(DATABASE_URL),
+        poolclass=async_pool_metrics.pool_class(AsyncAdaptedQueuePool),
+        connect_args=(
+            {"server_settings": {"lock_timeout": str(DB_LOCK_TIMEOUT_MS)}}
+            if DB_LOCK_TIMEOUT_MS
+            else {}
+        ),
+        **POOL_OPTIONS,
+    )
+    async_pool_metrics.instrument(async_engine.sync_engine)
+    # Attributes are not expired on commit: there is no implicit IO under asyncio
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -21,3 +193,28 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    Session for read-only work that tolerates a little staleness: on the
+    replica when one is configured and fresh enough, on the primary
+    otherwise. Never use it for anything that locks or writes.
+    """
+    if ReadSessionLocal is not None and replica_guard and replica_guard.usable():
+        DB_READ_SESSIONS.labels("replica").inc()
+        db = ReadSessionLocal()
+    else:
+        DB_READ_SESSIONS.labels("primary").inc()
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async sessions need DATABASE_ASYNC enabled")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,20 @@
+import os
+import glob
+from typing import Any
+
+
+def on_starting(_server: Any) -> None:
+    # Values left over from a previous run would be aggregated otherwise
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(_server: Any, worker: Any) -> None:
+    # Drop the live gauges (in-flight requests) of a dead worker
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
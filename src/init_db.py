@@ -1,16 +1,40 @@
 import logging
-from src.database import engine, SessionLocal
-from src.shopping.models import metadata
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from src.database import engine, SessionLocal, cart_shard_engines
+from src.shopping.models import cart_shard_metadata, metadata
 from src.shopping.domain import Product
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns added since the tables were first created. create_all() leaves
+# existing tables alone, so these bring an older database up to date; each
+# is a no-op once applied. The code of this release needs all of them.
+SCHEMA_UPGRADES = [
+    # Cart version, bumped by every cart write (GET /cart cache validation)
+    "ALTER TABLE carts ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 0",
+    # Last write to a cart line, set by every cart write (abandoned-cart sweeper)
+    "ALTER TABLE cart_items "
+    "ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_cart_items_updated_at ON cart_items (updated_at)",
+]
+
+
+def upgrade_schema(connection: Connection) -> None:
+    for statement in SCHEMA_UPGRADES:
+        _ = connection.execute(text(statement))
+
 
 def init_db():
     logger.info("Creating tables...")
     metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    for name, shard_engine in cart_shard_engines.items():
+        logger.info("Creating cart tables on shard %s...", name)
+        cart_shard_metadata.create_all(bind=shard_engine)
     logger.info("Tables created successfully.")
 
     session = SessionLocal()
@@ -1,15 +1,62 @@
-import logging
-import json
+import os
 import sys
+import copy
+import json
+import zlib
+import queue
+import atexit
+import random
+import logging
+from collections.abc import Callable, Mapping
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing_extensions import override
-from contextvars import ContextVar
+from contextvars import ContextVar, Token
+from src.metrics import LOG_RECORDS_DROPPED
 
 # Context variable to store request-specific information (e.g., correlation ID)
 log_context: ContextVar[dict[str, object]] = ContextVar("log_context", default={})
 
+# Records waiting for the writer thread; when full, new records are dropped
+# (and counted) rather than blocking the request that logs them.
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# "orjson", "json", or "auto" (orjson when installed)
+LOG_JSON_ENCODER = os.environ.get("LOG_JSON_ENCODER", "auto").lower()
+
+# Share of records kept below WARNING, per logger (prefix) and optionally per
+# level, e.g. "src.shopping=0.1,src.shopping.service:DEBUG=0,src.main=0.05".
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
+
+# Requests slower than this keep all of their records, sampled or not.
+LOG_SLOW_REQUEST_MS = float(os.environ.get("LOG_SLOW_REQUEST_MS", "500"))
+
+# Records dropped by sampling, held per request in case it turns out slow
+_held_records: ContextVar[list[logging.LogRecord] | None] = ContextVar(
+    "held_log_records", default=None
+)
+MAX_HELD_RECORDS = 200
+
+
+def _json_encoder(name: str) -> Callable[[dict[str, object]], str]:
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+        except ImportError:
+            if name == "orjson":
+                raise
+        else:
+            return lambda data: orjson.dumps(data, default=str).decode()
+    return json.dumps
+
 
 class JSONFormatter(logging.Formatter):
+    dumps: Callable[[dict[str, object]], str]
+
+    def __init__(self, encoder: str = LOG_JSON_ENCODER):
+        super().__init__()
+        self.dumps = _json_encoder(encoder)
+
     @override
     def format(self, record: logging.LogRecord) -> str:
         # Base log record
@@ -25,26 +72,168 @@ class JSONFormatter(logging.Formatter):
             "lineNo": record.lineno,
         }
 
-        # Merge with context-specific data (like correlation_id)
-        context_data = log_context.get()
+        # Merge with context-specific data (like correlation_id). Records
+        # that went through the queue carry the context they were logged in.
+        context_data = getattr(record, "log_context", None) or log_context.get()
         if context_data:
             log_record.update(context_data)
 
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        elif record.exc_text:
+            log_record["exception"] = record.exc_text
+        return self.dumps(log_record)
+
+
+def parse_sample_rates(raw: str) -> dict[tuple[str, int | None], float]:
+    """Parses "logger[:LEVEL]=rate,..." into {(logger, levelno or None): rate}."""
+    rates: dict[tuple[str, int | None], float] = {}
+    for entry in raw.split(","):
+        if not entry.strip():
+            continue
+        target, rate = entry.split("=")
+        name, _, level = target.strip().partition(":")
+        levelno = logging.getLevelName(level.upper()) if level else None
+        if levelno is not None and not isinstance(levelno, int):
+            raise ValueError(f"Unknown log level in LOG_SAMPLE_RATES: {level}")
+        rates[(name, levelno)] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a share of the records below WARNING, as configured per logger and
+    level (the most specific logger prefix wins, a level-specific rate over a
+    general one). Warnings and errors are always kept.
+
+    The decision is made per request (hashed from its correlation_id), so a
+    sampled request keeps all of its lines. Dropped records are held until the
+    request ends and written after all if it was slower than the threshold;
+    see hold_sampled_records. Records are dropped before their message is
+    formatted, so lazy %-style logging calls cost close to nothing.
+    """
+
+    rates: Mapping[tuple[str, int | None], float]
+    _resolved: dict[tuple[str, int], float]
+
+    def __init__(self, rates: Mapping[tuple[str, int | None], float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def rate_for(self, name: str, levelno: int) -> float:
+        key = (name, levelno)
+        rate = self._resolved.get(key)
+        if rate is None:
+            rate = self._resolve(name, levelno)
+            self._resolved[key] = rate
+        return rate
+
+    def _resolve(self, name: str, levelno: int) -> float:
+        prefix = name
+        while True:
+            for key in ((prefix, levelno), (prefix, None)):
+                if key in self.rates:
+                    return self.rates[key]
+            if not prefix:
+                return 1.0
+            prefix = prefix.rpartition(".")[0]
+
+    @override
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name, record.levelno)
+        if rate >= 1.0:
+            return True
+
+        correlation_id = log_context.get().get("correlation_id")
+        if isinstance(correlation_id, str):
+            sample = zlib.crc32(correlation_id.encode()) / 0xFFFFFFFF
+        else:
+            sample = random.random()
+        if sample < rate:
+            return True
+
+        held = _held_records.get()
+        if held is not None and len(held) < MAX_HELD_RECORDS:
+            held.append(record)
+        return False
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Hands records to a QueueListener thread, which does the JSON encoding and
+    the (possibly slow) stdout write. Only the cheap part stays on the
+    logging thread: resolving the message and capturing the log context.
+    """
+
+    @override
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Args and tracebacks may change or go away once the caller moves on
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.log_context = log_context.get()
+        return record
+
+    @override
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener: QueueListener | None = None
+_handler: ContextQueueHandler | None = None
+
+
+def hold_sampled_records() -> Token[list[logging.LogRecord] | None]:
+    """Starts holding the records sampling drops in the current request."""
+    return _held_records.set([])
+
+
+def release_sampled_records(
+    token: Token[list[logging.LogRecord] | None], elapsed: float
+) -> None:
+    """
+    Ends the request: its held records are written if it took longer than
+    LOG_SLOW_REQUEST_MS, and discarded otherwise.
+    """
+    held = _held_records.get()
+    _held_records.reset(token)
+    if held and _handler is not None and elapsed * 1000 > LOG_SLOW_REQUEST_MS:
+        for record in held:
+            _handler.emit(record)
 
 
 def setup_logging():
+    global _listener, _handler
+
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     # Remove existing handlers
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(JSONFormatter())
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(LOG_QUEUE_SIZE)
+    handler = ContextQueueHandler(log_queue)
+    sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    _handler = handler
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
     logger.addHandler(handler)
 
     # Also configure uvicorn/gunicorn loggers
@@ -58,3 +247,16 @@ def setup_logging():
         log = logging.getLogger(name)
         log.handlers = [handler]
         log.propagate = False
+
+
+def stop_logging():
+    """Writes out the records still queued and stops the writer thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Records still queued at interpreter exit would be lost otherwise
+_ = atexit.register(stop_logging)
@@ -1,9 +1,11 @@
 import os
+import asyncio
 import logging
-import uuid
-import time
-from collections.abc import Callable, Awaitable
-from fastapi import FastAPI, Request, Depends, Response
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from fastapi import APIRouter, FastAPI, Request, Depends, Response
+from fastapi.routing import APIRoute
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
@@ -11,49 +13,90 @@ from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from contextvars import Token
 from src.shopping.router import router as cart_router
-from src.logging_config import setup_logging, log_context
-from src.database import get_db
+from src.shopping.async_router import router as async_cart_router
+from src.shopping.product_router import router as product_router
+from src.shopping.admin_router import router as admin_router
+from src.shopping.config import CART_SWEEP_INTERVAL
+from src.shopping.dependencies import cart_sweeper, stock_leases
+from src.shopping.leases import StockLeaseManager
+from src.shopping.sweeper import AbandonedCartSweeper
+from src.shopping.repository import LockUnavailable
+from src.logging_config import setup_logging
+from src.middleware import RequestContextMiddleware
+from src.recording import (
+    TRAFFIC_RECORD_FILE,
+    TRAFFIC_RECORD_SALT,
+    TRAFFIC_RECORD_SAMPLE,
+    TraceWriter,
+    TrafficRecorderMiddleware,
+)
+from src.metrics import render_metrics
+from src.database import (
+    DATABASE_ASYNC,
+    async_engine,
+    async_pool_metrics,
+    cart_shard_engines,
+    cart_shard_pool_metrics,
+    engine,
+    get_db,
+    pool_metrics,
+    replica_engine,
+    replica_guard,
+    replica_pool_metrics,
+)
 
 # Setup structured logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Shopping System API")
 
+async def release_expired_leases(leases: StockLeaseManager) -> None:
+    while True:
+        await asyncio.sleep(leases.ttl)
+        try:
+            await run_in_threadpool(leases.release_expired)
+        except Exception as e:
+            logger.error("Failed to release expired stock leases: %s", e)
 
-@app.middleware("http")
-async def add_process_time_and_correlation_id(
-    request: Request, call_next: Callable[[Request], Awaitable[Response]]
-) -> Response:
-    # Get correlation ID from header or generate a new one
-    correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
 
-    # Set context for logging
-    token: Token[dict[str, object]] = log_context.set(
-        {
-            "correlation_id": correlation_id,
-            "method": request.method,
-            "path": request.url.path,
-            "client_ip": request.client.host if request.client else "unknown",
-        }
-    )
+async def sweep_abandoned_carts(sweeper: AbandonedCartSweeper) -> None:
+    while True:
+        await asyncio.sleep(CART_SWEEP_INTERVAL)
+        try:
+            _ = await run_in_threadpool(sweeper.sweep)
+        except Exception as e:
+            logger.error("Failed to sweep abandoned carts: %s", e)
 
-    start_time = time.time()
-    try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        response.headers["X-Correlation-ID"] = correlation_id
-
-        # Log request completion
-        logger.info(
-            f"Request completed in {process_time:.4f}s with status {response.status_code}"
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    background_tasks: list[asyncio.Task[None]] = []
+    if stock_leases:
+        background_tasks.append(
+            asyncio.create_task(release_expired_leases(stock_leases))
+        )
+    if cart_sweeper:
+        background_tasks.append(
+            asyncio.create_task(sweep_abandoned_carts(cart_sweeper))
         )
-        return response
-    finally:
-        log_context.reset(token)
+
+    yield
+
+    for task in background_tasks:
+        _ = task.cancel()
+    # Let the loops unwind before the leases are released below
+    _ = await asyncio.gather(*background_tasks, return_exceptions=True)
+    if stock_leases:
+        # Hand the unused leased stock back before the worker exits
+        await run_in_threadpool(stock_leases.release_all)
+
+
+app = FastAPI(title="Shopping System API", lifespan=lifespan)
+
+
+# Registered first, so it runs inside the security middlewares below
+app.add_middleware(RequestContextMiddleware)
 
 
 # Security Middlewares
@@ -79,6 +122,25 @@ app.add_middleware(
 # Render uses a proxy/load balancer
 app.add_middleware(ProxyHeadersMiddleware)
 
+if TRAFFIC_RECORD_FILE:
+    # Outermost, so recorded durations cover the whole middleware stack
+    app.add_middleware(
+        TrafficRecorderMiddleware,
+        writer=TraceWriter(TRAFFIC_RECORD_FILE),
+        sample=TRAFFIC_RECORD_SAMPLE,
+        salt=TRAFFIC_RECORD_SALT,
+    )
+
+
+@app.exception_handler(LockUnavailable)
+async def lock_unavailable_handler(_request: Request, exc: LockUnavailable):
+    # Shed load instead of queueing behind a busy row; the client may retry
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={"status": "error", "message": str(exc)},
+    )
+
 
 @app.exception_handler(Exception)
 async def global_exception_handler(_request: Request, exc: Exception):
@@ -102,13 +164,26 @@ from typing import Annotated
 
 @app.get("/health")
 async def health(db: Annotated[Session, Depends(get_db)]) -> Response:
-    """Robust health check that verifies database connectivity."""
+    """
+    Robust health check that verifies primary database connectivity. With a
+    replica configured, also reports whether reads currently go to it; a
+    lagging or unreachable replica does not fail the check, since reads
+    fall back to the primary.
+    """
     try:
         # Perform a simple query to verify DB connection
         _ = db.execute(text("SELECT 1"))
-        return JSONResponse(content={"status": "ok", "database": "connected"})
+        content = {"status": "ok", "database": "connected"}
+        if replica_guard is not None:
+            usable = await run_in_threadpool(replica_guard.usable)
+            content["replica"] = (
+                "in use"
+                if usable
+                else "unreachable" if replica_guard.lag is None else "lagging"
+            )
+        return JSONResponse(content=content)
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return JSONResponse(
             status_code=503,
             content={
@@ -119,4 +194,56 @@ async def health(db: Annotated[Session, Depends(get_db)]) -> Response:
         )
 
 
-app.include_router(cart_router)
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """
+    Prometheus metrics, aggregated across workers in multiprocess mode.
+    Sync, so merging every worker's files runs in the threadpool.
+    """
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/health/pool")
+async def pool_health() -> dict[str, object]:
+    """Connection pool usage and checkout wait times for this worker."""
+    pools: dict[str, object] = {"sync": pool_metrics.snapshot(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = async_pool_metrics.snapshot(async_engine.pool)
+    if replica_engine is not None:
+        pools["replica"] = replica_pool_metrics.snapshot(replica_engine.pool)
+    for name, shard_engine in cart_shard_engines.items():
+        pools[f"cart_shard:{name}"] = cart_shard_pool_metrics[name].snapshot(
+            shard_engine.pool
+        )
+    return {"status": "ok", "pools": pools}
+
+
+def without_routes(router: APIRouter, replaced: APIRouter) -> APIRouter:
+    """`router`, minus the routes `replaced` serves on the same path and method."""
+    taken = {
+        (route.path, method)
+        for route in replaced.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    remaining = APIRouter()
+    remaining.routes.extend(
+        route
+        for route in router.routes
+        if not (
+            isinstance(route, APIRoute)
+            and any((route.path, method) in taken for method in route.methods)
+        )
+    )
+    return remaining
+
+
+if DATABASE_ASYNC:
+    # The async cart routes replace their sync counterparts
+    app.include_router(async_cart_router)
+    app.include_router(without_routes(cart_router, async_cart_router))
+else:
+    app.include_router(cart_router)
+app.include_router(product_router)
+app.include_router(admin_router)
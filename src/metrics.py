@@ -0,0 +1,148 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import Scope
+
+# With PROMETHEUS_MULTIPROC_DIR set (a directory shared by all gunicorn
+# workers, emptied before they start), prometheus_client keeps every value in
+# memory-mapped files there and /metrics aggregates across all workers.
+# It must be set before this module is imported.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+# Time spent in row-locking queries (SELECT ... FOR UPDATE and conditional
+# UPDATEs), which is dominated by waiting for other transactions' locks.
+LOCK_WAIT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    5.0,
+)
+
+DB_LOCK_WAIT = Histogram(
+    "db_lock_wait_seconds",
+    "Duration of row-locking queries by table.",
+    ["table"],
+    buckets=LOCK_WAIT_BUCKETS,
+)
+DB_LOCK_UNAVAILABLE = Counter(
+    "db_lock_unavailable_total",
+    "Row locks not acquired because of NOWAIT or lock_timeout, by table.",
+    ["table"],
+)
+
+DB_TRANSACTION_RETRIES = Counter(
+    "db_transaction_retries_total",
+    "Service transactions re-run after a deadlock or serialization failure.",
+    ["operation", "reason"],
+)
+DB_TRANSACTION_OUTCOMES = Counter(
+    "db_transaction_retry_outcomes_total",
+    "Final outcome of service transactions that needed a retry.",
+    ["operation", "outcome"],
+)
+
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "How far the read replica is behind the primary, as last checked.",
+    multiprocess_mode="max",
+)
+DB_READ_SESSIONS = Counter(
+    "db_read_sessions_total",
+    "Read-only sessions handed out, by the database serving them.",
+    ["target"],
+)
+
+CART_ADD_BATCH_SIZE = Histogram(
+    "cart_add_item_batch_size",
+    "Add-item requests applied per coalesced transaction.",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+
+CART_SHARD_COMPENSATIONS = Counter(
+    "cart_shard_compensations_total",
+    "Stock changes undone because the cart shard failed to commit, by outcome.",
+    ["outcome"],
+)
+
+CART_LINES_SWEPT = Counter(
+    "cart_lines_swept_total",
+    "Abandoned cart lines removed by the sweeper.",
+)
+CART_UNITS_RELEASED = Counter(
+    "cart_units_released_total",
+    "Units returned to stock from abandoned cart lines.",
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+)
+
+
+def route_label(scope: Scope) -> str:
+    """
+    The matched route template (e.g. "/cart/add-item"), never the raw path,
+    so unmatched URLs cannot blow up the label cardinality.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if isinstance(path, str) else "unmatched"
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUESTS.labels(method, route, str(status)).inc()
+    REQUEST_LATENCY.labels(method, route).observe(seconds)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
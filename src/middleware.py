@@ -0,0 +1,88 @@
+import time
+import uuid
+import logging
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.logging_config import (
+    hold_sampled_records,
+    log_context,
+    release_sampled_records,
+)
+from src.metrics import REQUESTS_IN_FLIGHT, observe_request, route_label
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContextMiddleware:
+    """
+    Per-request correlation id, log context, timing headers, metrics and
+    completion log.
+
+    Written as plain ASGI rather than with @app.middleware("http"): Starlette's
+    BaseHTTPMiddleware runs the endpoint in a separate task and streams the
+    response through a memory channel, which costs time on every request.
+    Here the request is passed straight through and only the response start
+    message is touched.
+    """
+
+    app: ASGIApp
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Get correlation ID from header or generate a new one
+        correlation_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-correlation-id":
+                correlation_id = value.decode("latin-1")
+                break
+        if correlation_id is None:
+            correlation_id = str(uuid.uuid4())
+
+        method: str = scope["method"]
+        client = scope.get("client")
+        # Set context for logging
+        token = log_context.set(
+            {
+                "correlation_id": correlation_id,
+                "method": method,
+                "path": scope["path"],
+                "client_ip": client[0] if client else "unknown",
+            }
+        )
+
+        held_records = hold_sampled_records()
+        start_time = time.time()
+        status_code = 500
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+
+        async def send_with_headers(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(time.time() - start_time)
+                headers["X-Correlation-ID"] = correlation_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+            # Log request completion
+            logger.info(
+                "Request completed in %.4fs with status %s",
+                time.time() - start_time,
+                status_code,
+            )
+        finally:
+            elapsed = time.time() - start_time
+            in_flight.dec()
+            observe_request(method, route_label(scope), status_code, elapsed)
+            # Slow requests get the records sampling dropped written after all
+            release_sampled_records(held_records, elapsed)
+            log_context.reset(token)
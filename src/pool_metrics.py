@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, PoolProxiedConnection, QueuePool
+
+
+class PoolMetrics:
+    """
+    Connection pool instrumentation: lifetime counters from SQLAlchemy pool
+    events, checkout wait times from the pool class returned by `pool_class`
+    (timed around the public Pool.connect), and live checked-out/idle/overflow
+    counts read from the pool itself.
+    """
+
+    connections_opened: int
+    connections_closed: int
+    invalidations: int
+    checkouts: int
+    checkout_timeouts: int
+    _waits: deque[float]
+    _lock: threading.Lock
+
+    def __init__(self, max_samples: int = 2048):
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.invalidations = 0
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self._waits = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def pool_class(self, base: type[QueuePool] = QueuePool) -> type[QueuePool]:
+        """
+        Subclass of `base` that times each checkout through the public
+        Pool.connect(), which every engine checkout goes through: queuing for
+        a free connection, opening a new one, and the checkout events (such
+        as pre-ping). Pass it as `poolclass=` to the engine; it survives
+        `engine.dispose()`, which recreates the pool from its class.
+        """
+        metrics = self
+
+        class TimedPool(base):  # type: ignore[valid-type, misc]
+            def connect(self) -> PoolProxiedConnection:
+                start = time.perf_counter()
+                try:
+                    return super().connect()
+                except PoolTimeoutError:
+                    metrics.record_timeout()
+                    raise
+                finally:
+                    metrics.record_wait(time.perf_counter() - start)
+
+        TimedPool.__name__ = f"Timed{base.__name__}"
+        return TimedPool
+
+    def instrument(self, engine: Engine) -> None:
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "checkout", self._on_checkout)
+
+    def record_wait(self, seconds: float) -> None:
+        # deque.append is atomic; snapshot() copies under the lock
+        self._waits.append(seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def snapshot(self, pool: Pool) -> dict[str, object]:
+        with self._lock:
+            waits = sorted(self._waits)
+
+        status: dict[str, object] = {}
+        if isinstance(pool, QueuePool):
+            status = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            }
+
+        return {
+            **status,
+            "connections_opened": self.connections_opened,
+            "connections_closed": self.connections_closed,
+            "invalidations": self.invalidations,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_seconds": {
+                "samples": len(waits),
+                "p50": _percentile(waits, 0.50),
+                "p95": _percentile(waits, 0.95),
+                "p99": _percentile(waits, 0.99),
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+
+    def _on_connect(self, *_args: object) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_close(self, *_args: object) -> None:
+        with self._lock:
+            self.connections_closed += 1
+
+    def _on_invalidate(self, *_args: object) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def _on_checkout(self, *_args: object) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
@@ -0,0 +1,81 @@
+import sys
+import logging
+import argparse
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from src.database import engine
+from src.shopping.dependencies import cart_shards
+from src.shopping.sharding import parse_shard_urls, rebalance
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.rebalance_carts",
+        description="Move every cart to the shard CART_SHARD_URLS now assigns "
+        "it to. Run after adding or removing a shard, or after first setting "
+        "CART_SHARD_URLS, once the API workers use the new shard list; carts "
+        "written meanwhile are merged.",
+    )
+    _ = parser.add_argument(
+        "--source",
+        action="append",
+        default=[],
+        metavar="NAME=URL",
+        help="A database outside CART_SHARD_URLS whose carts all move, "
+        "e.g. a removed shard (repeatable)",
+    )
+    _ = parser.add_argument(
+        "--from-primary",
+        action="store_true",
+        help="Also move the carts stored on DATABASE_URL (first sharding)",
+    )
+    _ = parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Carts read per query while scanning a database",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if cart_shards is None:
+        logger.error("Set CART_SHARD_URLS to the cart shards to rebalance")
+        return 1
+    try:
+        source_urls = parse_shard_urls(",".join(args.source))
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+
+    if args.from_primary and "primary" in source_urls:
+        logger.error("--source primary=... clashes with --from-primary")
+        return 1
+
+    created = {name: create_engine(url) for name, url in source_urls.items()}
+    sources: dict[str, Engine] = dict(created)
+    if args.from_primary:
+        sources["primary"] = engine
+    cart_shards.create_tables()
+    try:
+        result = rebalance(cart_shards, batch_size=args.batch_size, sources=sources)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+    finally:
+        for source in created.values():
+            source.dispose()
+    print(
+        f"{result.scanned} carts scanned, {result.moved} moved "
+        f"({result.merged} merged into an existing cart)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import queue
+import atexit
+import base64
+import hashlib
+import logging
+import threading
+from typing import IO
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: path of the JSONL file request traces are appended to (unset: off)
+TRAFFIC_RECORD_FILE = os.environ.get("TRAFFIC_RECORD_FILE")
+# Share of requests recorded
+TRAFFIC_RECORD_SAMPLE = float(os.environ.get("TRAFFIC_RECORD_SAMPLE", "1"))
+# Mixed into the user hash, so traces cannot be joined back to user ids
+TRAFFIC_RECORD_SALT = os.environ.get("TRAFFIC_RECORD_SALT", "")
+
+MAX_RECORDED_BODY = 4096
+
+
+def user_hash(authorization: str | None, salt: str) -> str | None:
+    """
+    Salted hash of the token's `sub`, read without verifying the token: it
+    only groups a user's requests in the trace, and never authenticates.
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = authorization[7:].split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        subject = str(claims["sub"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+    return hashlib.sha256(f"{salt}:{subject}".encode()).hexdigest()[:16]
+
+
+class TraceWriter:
+    """Appends traces to a JSONL file from a background thread."""
+
+    path: str
+    _queue: queue.SimpleQueue[dict[str, object] | None]
+    _thread: threading.Thread
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="traffic-recorder", daemon=True
+        )
+        self._thread.start()
+        _ = atexit.register(self.close)
+
+    def write(self, trace: dict[str, object]) -> None:
+        self._queue.put(trace)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        with open(self.path, "a") as f:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    return
+                self._write_line(f, trace)
+                # Drain what else is queued before flushing once
+                while True:
+                    try:
+                        trace = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if trace is None:
+                        f.flush()
+                        return
+                    self._write_line(f, trace)
+                f.flush()
+
+    @staticmethod
+    def _write_line(f: IO[str], trace: dict[str, object]) -> None:
+        try:
+            _ = f.write(json.dumps(trace) + "\n")
+        except (TypeError, ValueError, OSError) as e:
+            logger.error("Failed to record request trace: %s", e)
+
+
+class TrafficRecorderMiddleware:
+    """
+    ASGI middleware recording sanitized request traces for
+    `benchmarks/replay.py`: method, path, query, JSON body (truncated), a
+    salted user hash instead of the token, status, arrival time and
+    duration. Headers, cookies and non-JSON bodies are never recorded.
+
+    `ts` is wall-clock time, so traces appended by several workers to the
+    same file share one timeline.
+    """
+
+    app: ASGIApp
+    writer: TraceWriter
+    sample: float
+    salt: str
+    _counter: int
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        writer: TraceWriter,
+        sample: float = 1.0,
+        salt: str = "",
+    ):
+        self.app = app
+        self.writer = writer
+        self.sample = sample
+        self.salt = salt
+        self._counter = 0
+
+    def _should_record(self) -> bool:
+        # Deterministic 1-in-N sampling, so replays keep the original mix
+        self._counter += 1
+        return self.sample >= 1.0 or (self._counter * self.sample) % 1.0 < self.sample
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_record():
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at = time.time()
+        arrived = time.monotonic()
+        body = bytearray()
+        status_code = 500
+
+        async def recording_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and len(body) <= MAX_RECORDED_BODY:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def recording_send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            headers = dict(scope["headers"])
+            self.writer.write(
+                {
+                    "ts": round(arrived_at, 6),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope["query_string"].decode("latin-1"),
+                    "body": self._json_body(bytes(body), headers),
+                    "user": user_hash(
+                        headers.get(b"authorization", b"").decode("latin-1"),
+                        self.salt,
+                    ),
+                    "status": status_code,
+                    "duration_ms": round((time.monotonic() - arrived) * 1000, 3),
+                }
+            )
+
+    @staticmethod
+    def _json_body(body: bytes, headers: dict[bytes, bytes]) -> object:
+        if not body or len(body) > MAX_RECORDED_BODY:
+            return None
+        if not headers.get(b"content-type", b"").startswith(b"application/json"):
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
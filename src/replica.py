@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+from collections.abc import Callable
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from src.metrics import DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary. A replica that has replayed
+# everything it received is not behind, however old its last transaction:
+# pg_last_xact_replay_timestamp() alone would report an idle primary as lag.
+LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class ReplicaLagGuard:
+    """
+    Decides whether reads may go to the replica: it must be reachable and
+    at most `max_lag` seconds behind the primary. The answer is cached for
+    `check_interval` seconds; one request re-checks it while the others
+    keep using the cached answer instead of waiting. Until the first check
+    succeeds, reads stay on the primary.
+    """
+
+    max_lag: float
+    check_interval: float
+    lag: float | None
+    _engine: Engine
+    _usable: bool
+    _unreachable: bool
+    _next_check: float
+    _lock: threading.Lock
+    _clock: Callable[[], float]
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_lag: float = 1.0,
+        check_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self._engine = engine
+        self._usable = False
+        self._unreachable = False
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def usable(self) -> bool:
+        now = self._clock()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return self._usable
+        try:
+            self._next_check = now + self.check_interval
+            self._usable = self._check()
+        finally:
+            self._lock.release()
+        return self._usable
+
+    def _check(self) -> bool:
+        try:
+            lag = self._read_lag()
+        except Exception as e:
+            if not self._unreachable:
+                logger.warning("Replica unreachable, reading from the primary: %s", e)
+            self._unreachable = True
+            self.lag = None
+            return False
+
+        self._unreachable = False
+        self.lag = lag
+        DB_REPLICA_LAG.set(lag)
+        usable = lag <= self.max_lag
+        if usable and not self._usable:
+            logger.info("Replica lag %.3fs, reading from the replica", lag)
+        elif self._usable and not usable:
+            logger.warning("Replica lag %.3fs, reading from the primary", lag)
+        return usable
+
+    def _read_lag(self) -> float:
+        with self._engine.connect() as connection:
+            return float(connection.execute(LAG_QUERY).scalar_one())
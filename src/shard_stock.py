@@ -0,0 +1,46 @@
+import sys
+import logging
+from src.database import engine, SessionLocal
+from src.shopping.models import metadata
+from src.shopping.repository import StockShardRepository
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+USAGE = "Usage: python -m src.shard_stock <product_id> <shard_count | 0 to merge>"
+
+
+def shard_stock(product_id: int, shard_count: int):
+    """
+    Splits a product's stock across `shard_count` rows of product_stock_shards
+    (or merges it back into products.stock when `shard_count` is 0). The cart
+    service only uses the shards when CART_SHARDED_STOCK is enabled.
+    """
+    metadata.create_all(bind=engine)
+
+    session = SessionLocal()
+    try:
+        repo = StockShardRepository(session)
+        if shard_count > 0:
+            logger.info(
+                "Splitting product %s into %s shards...", product_id, shard_count
+            )
+            repo.split(product_id, shard_count)
+        else:
+            logger.info("Merging shards of product %s...", product_id)
+            repo.merge(product_id)
+        session.commit()
+        logger.info("Done.")
+    except Exception as e:
+        logger.error("Error sharding stock: %s", e)
+        session.rollback()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(USAGE)
+        sys.exit(1)
+    shard_stock(int(sys.argv[1]), int(sys.argv[2]))
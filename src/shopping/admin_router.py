@@ -0,0 +1,99 @@
+import logging
+import tempfile
+from typing import Annotated, BinaryIO, cast
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+from src.auth.dependencies import get_admin_user
+from src.auth.domain import User
+from src.database import get_db
+from src.shopping.bulk import (
+    BulkFormat,
+    BulkLoadError,
+    BulkLoadResult,
+    BulkMode,
+    load_products,
+)
+from src.shopping.schemas import BulkLoadReport
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+logger = logging.getLogger(__name__)
+
+# Uploads larger than this are spooled to a temporary file instead of memory
+BULK_SPOOL_BYTES = 8 * 1024 * 1024
+# Upload chunks are collected up to this size, then written to the spool
+# from the threadpool: once spooled to disk, a write can block.
+BULK_WRITE_BYTES = 1024 * 1024
+
+CONTENT_TYPE_FORMATS: dict[str, BulkFormat] = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def _run_load(
+    engine: Engine, source: BinaryIO, fmt: BulkFormat, mode: BulkMode
+) -> BulkLoadResult:
+    # A dedicated connection: the staging tables live as long as it does
+    with engine.connect() as connection:
+        return load_products(connection, source, fmt, mode)
+
+
+@router.post("/products/bulk", response_model=BulkLoadReport)
+async def bulk_load_products(
+    request: Request,
+    db: Annotated[Session, Depends(get_db)],
+    admin: Annotated[User, Depends(get_admin_user)],
+    mode: BulkMode = "set",
+    fmt: Annotated[BulkFormat | None, Query(alias="format")] = None,
+):
+    """
+    Loads (id, stock) rows from the request body, as CSV (with an id,stock
+    header) or NDJSON, into products. See src.shopping.bulk.load_products.
+    """
+    if fmt is None:
+        content_type = request.headers.get("content-type", "").split(";")[0]
+        fmt = CONTENT_TYPE_FORMATS.get(content_type.strip().lower())
+        if fmt is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Send text/csv or application/x-ndjson, or pass ?format=",
+            )
+
+    logger.info("Bulk %s load (%s) started by %s", mode, fmt, admin.id)
+    with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES) as spool:
+        pending: list[bytes] = []
+        pending_bytes = 0
+        async for chunk in request.stream():
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= BULK_WRITE_BYTES:
+                _ = await run_in_threadpool(spool.write, b"".join(pending))
+                pending, pending_bytes = [], 0
+        if pending:
+            _ = await run_in_threadpool(spool.write, b"".join(pending))
+        _ = await run_in_threadpool(spool.seek, 0)
+        try:
+            result = await run_in_threadpool(
+                _run_load,
+                cast(Engine, db.get_bind()),
+                cast(BinaryIO, spool),
+                fmt,
+                mode,
+            )
+        except BulkLoadError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+
+    return BulkLoadReport(
+        rows=result.rows,
+        inserted=result.inserted,
+        updated=result.updated,
+        skipped=result.skipped,
+        seconds=round(result.seconds, 3),
+        rows_per_second=round(result.rows_per_second, 1),
+    )
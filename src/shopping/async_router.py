@@ -0,0 +1,85 @@
+import logging
+from typing import Annotated
+from fastapi import APIRouter, status, Depends, HTTPException
+from src.shopping.schemas import CartItemOperation
+from src.auth.dependencies import get_current_user
+from src.auth.domain import User
+from src.shopping.dependencies import get_async_cart_service
+from src.shopping.service import AsyncCartService, CartNotFound, ProductNotFound
+from src.shopping.domain import InsufficientStock, ItemNotFoundInCart
+
+# Included ahead of the sync cart router when DATABASE_ASYNC is enabled; the
+# routes defined here take precedence over their sync counterparts.
+router = APIRouter(prefix="/cart", tags=["cart"])
+logger = logging.getLogger(__name__)
+
+
+@router.post("/add-item", status_code=status.HTTP_200_OK)
+async def add_item_to_cart_async(
+    operation: CartItemOperation,
+    user: Annotated[User, Depends(get_current_user)],
+    cart_service: Annotated[AsyncCartService, Depends(get_async_cart_service)],
+):
+    logger.info(
+        "User %s adding %s of product %s to cart",
+        user.id,
+        operation.quantity,
+        operation.product_id,
+    )
+    try:
+        await cart_service.add_item(user.id, operation.product_id, operation.quantity)
+        logger.info(
+            "Successfully added product %s to cart for user %s",
+            operation.product_id,
+            user.id,
+        )
+        return {"status": "success", "message": "Item added to cart"}
+    except CartNotFound as e:
+        logger.error("Cart not found for user %s: %s", user.id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    except ProductNotFound as e:
+        logger.warning("Product %s not found: %s", operation.product_id, e)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InsufficientStock as e:
+        logger.warning(
+            "Insufficient stock for product %s (requested %s): %s",
+            operation.product_id,
+            operation.quantity,
+            e,
+        )
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/remove-item", status_code=status.HTTP_200_OK)
+async def remove_item_from_cart_async(
+    operation: CartItemOperation,
+    user: Annotated[User, Depends(get_current_user)],
+    cart_service: Annotated[AsyncCartService, Depends(get_async_cart_service)],
+):
+    logger.info(
+        "User %s removing %s of product %s from cart",
+        user.id,
+        operation.quantity,
+        operation.product_id,
+    )
+    try:
+        await cart_service.remove_item(
+            user.id, operation.product_id, operation.quantity
+        )
+        logger.info(
+            "Successfully removed product %s from cart for user %s",
+            operation.product_id,
+            user.id,
+        )
+        return {"status": "success", "message": "Item removed from cart"}
+    except (CartNotFound, ItemNotFoundInCart) as e:
+        logger.warning("Item/Cart error for user %s: %s", user.id, e)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ProductNotFound as e:
+        logger.warning("Product %s not found: %s", operation.product_id, e)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InsufficientStock as e:
+        logger.warning("Stock error during removal for user %s: %s", user.id, e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -0,0 +1,325 @@
+import csv
+import io
+import json
+import time
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO, Literal, cast
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.elements import TextClause
+from src.shopping.retry import RetryPolicy, retry_reason
+
+logger = logging.getLogger(__name__)
+
+BulkMode = Literal["set", "adjust"]
+BulkFormat = Literal["csv", "ndjson"]
+
+COLUMNS = ("id", "stock")
+NOT_NULL_VIOLATION = "23502"
+
+
+class BulkLoadError(Exception):
+    """Raised when the input cannot be parsed or does not fit the schema."""
+
+    pass
+
+
+@dataclass(frozen=True)
+class BulkLoadResult:
+    rows: int  # rows read from the input
+    inserted: int
+    updated: int
+    skipped: int  # products not applied (see load_products)
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class _LineReader:
+    """Read-only file object over an iterator of lines, as COPY expects."""
+
+    error: BulkLoadError | None
+    _lines: Iterator[bytes]
+    _pending: bytes
+
+    def __init__(self, lines: Iterator[bytes]):
+        self.error = None
+        self._lines = lines
+        self._pending = b""
+
+    def read(self, size: int = -1) -> bytes:
+        parts = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            try:
+                line = next(self._lines, None)
+            except BulkLoadError as e:
+                # psycopg2 only reports that read() failed; keep the reason
+                self.error = e
+                raise
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = b"".join(parts)
+        if size < 0:
+            self._pending = b""
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def _ndjson_lines(source: BinaryIO) -> Iterator[bytes]:
+    for number, raw in enumerate(source, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+            values = [row[column] for column in COLUMNS]
+        except (ValueError, TypeError, KeyError) as e:
+            raise BulkLoadError(f"Line {number}: {e!r}") from e
+        if not all(type(value) is int for value in values):
+            raise BulkLoadError(f"Line {number}: id and stock must be integers")
+        yield b"%d,%d\n" % tuple(values)
+
+
+def _csv_lines(source: BinaryIO, header: list[str]) -> Iterator[bytes]:
+    """Projects CSV rows with extra columns down to id and stock."""
+    indexes = [header.index(column) for column in COLUMNS]
+    text_source = io.TextIOWrapper(cast(io.BufferedIOBase, source), "utf-8", newline="")
+    # The header was line 1
+    for number, row in enumerate(csv.reader(text_source), start=2):
+        if not row:
+            continue
+        if len(row) < len(header):
+            raise BulkLoadError(f"Line {number}: expected {len(header)} columns")
+        yield (",".join(row[i] for i in indexes) + "\n").encode()
+
+
+def _copy_source(source: BinaryIO, fmt: BulkFormat) -> tuple[tuple[str, ...], object]:
+    """
+    Returns the staging columns and a file object for COPY ... FROM STDIN
+    WITH (FORMAT csv). A CSV file whose header names exactly id and stock is
+    passed through untouched; anything else is converted line by line.
+    """
+    if fmt == "ndjson":
+        return COLUMNS, _LineReader(_ndjson_lines(source))
+
+    header = [
+        column.strip().lower()
+        for column in next(csv.reader([source.readline().decode("utf-8-sig")]), [])
+    ]
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise BulkLoadError(f"CSV header is missing column(s): {', '.join(missing)}")
+    if sorted(header) == sorted(COLUMNS):
+        return tuple(header), source
+    return COLUMNS, _LineReader(_csv_lines(source, header))
+
+
+def load_products(
+    connection: Connection,
+    source: BinaryIO,
+    fmt: BulkFormat = "csv",
+    mode: BulkMode = "set",
+    chunk_size: int = 10000,
+    retry_policy: RetryPolicy | None = RetryPolicy(),
+) -> BulkLoadResult:
+    """
+    Streams (id, stock) rows from `source` into a temporary staging table
+    with COPY, then applies them to products with set-based statements.
+
+    mode "set" upserts: new products are inserted and existing ones get the
+    given stock (the last row wins for repeated ids). mode "adjust" adds the
+    rows as deltas to existing products (summed per id), e.g. for stock
+    reconciliation. Products that are sharded, rows that would leave stock
+    negative, and (for "adjust") unknown ids are skipped and counted;
+    products already at the given stock count as neither updated nor skipped.
+
+    Memory stays constant: the file is read in COPY-sized pieces, and the
+    staged rows are applied in id-ordered chunks of `chunk_size`, each in
+    its own short transaction that locks its product rows in id order like
+    CartService does, so live cart traffic only ever waits for one chunk.
+    A chunk aborted by a deadlock is retried as per `retry_policy`; a chunk
+    that fails for good leaves the chunks before it applied. Units held in stock
+    leases are not visible here; "set" overwrites the stock left in the row.
+    """
+    started = time.perf_counter()
+    columns, copy_source = _copy_source(source, fmt)
+
+    _ = connection.execute(text("DROP TABLE IF EXISTS product_staging, product_load"))
+    _ = connection.execute(
+        text(
+            "CREATE TEMP TABLE product_staging "
+            "(seq bigserial, id integer NOT NULL, stock integer NOT NULL)"
+        )
+    )
+    cursor = connection.connection.dbapi_connection.cursor()  # type: ignore[union-attr]
+    try:
+        cursor.copy_expert(
+            f"COPY product_staging ({', '.join(columns)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            copy_source,
+        )
+        rows: int = cursor.rowcount
+    except Exception as e:
+        connection.rollback()
+        if isinstance(copy_source, _LineReader) and copy_source.error:
+            raise copy_source.error from e
+        # Raised by psycopg2 itself: malformed values (class 22) or missing
+        # ones (23502) are the input's fault
+        pgcode = getattr(e, "pgcode", None) or ""
+        if pgcode.startswith("22") or pgcode == NOT_NULL_VIOLATION:
+            raise BulkLoadError(str(e).strip()) from e
+        raise
+    finally:
+        cursor.close()
+
+    # One row per product: the last value for "set", the sum for "adjust"
+    _ = connection.execute(
+        text("CREATE TEMP TABLE product_load (id integer PRIMARY KEY, stock integer)")
+    )
+    _ = connection.execute(
+        text(
+            "INSERT INTO product_load SELECT DISTINCT ON (id) id, stock "
+            "FROM product_staging ORDER BY id, seq DESC"
+            if mode == "set"
+            else "INSERT INTO product_load "
+            "SELECT id, sum(stock)::integer FROM product_staging GROUP BY id"
+        )
+    )
+    _ = connection.execute(text("DROP TABLE product_staging"))
+    # Autovacuum never analyzes temporary tables; without statistics the
+    # per-chunk joins against products fall back to full scans
+    _ = connection.execute(text("ANALYZE product_load"))
+    connection.commit()
+
+    inserted = updated = skipped = 0
+    # Below any integer id
+    after = -(2**31) - 1
+    try:
+        while True:
+            last, count = connection.execute(
+                _CHUNK_BOUNDS, {"after": after, "limit": chunk_size}
+            ).one()
+            if last is None:
+                break
+            eligible, chunk_inserted, chunk_updated = _apply_chunk(
+                connection, mode, {"after": after, "last": last}, retry_policy
+            )
+
+            skipped += count - eligible
+            inserted += chunk_inserted
+            updated += chunk_updated
+            after = last
+    finally:
+        connection.rollback()
+        _ = connection.execute(text("DROP TABLE IF EXISTS product_load"))
+        connection.commit()
+
+    result = BulkLoadResult(
+        rows=rows,
+        inserted=inserted,
+        updated=updated,
+        skipped=skipped,
+        seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        "Bulk %s of %d rows: %d inserted, %d updated, %d skipped (%.0f rows/s)",
+        mode,
+        result.rows,
+        result.inserted,
+        result.updated,
+        result.skipped,
+        result.rows_per_second,
+    )
+    return result
+
+
+def _apply_chunk(
+    connection: Connection,
+    mode: BulkMode,
+    bounds: dict[str, int],
+    retry_policy: RetryPolicy | None,
+) -> tuple[int, int, int]:
+    attempt = 1
+    while True:
+        try:
+            _ = connection.execute(_LOCK_CHUNK[mode], bounds)
+            eligible, inserted, updated = connection.execute(_APPLY[mode], bounds).one()
+            connection.commit()
+            return eligible, inserted, updated
+        except DBAPIError as e:
+            connection.rollback()
+            reason = retry_reason(e)
+            if (
+                retry_policy is None
+                or reason is None
+                or attempt >= retry_policy.max_attempts
+            ):
+                raise
+            logger.warning(
+                "Bulk load chunk after id %d aborted (%s), retrying",
+                bounds["after"],
+                reason,
+            )
+            time.sleep(retry_policy.delay(attempt))
+            attempt += 1
+
+
+_CHUNK_BOUNDS = text(
+    "SELECT max(id), count(*) FROM "
+    "(SELECT id FROM product_load WHERE id > :after ORDER BY id LIMIT :limit) AS c"
+)
+
+_NOT_SHARDED = (
+    "NOT EXISTS (SELECT 1 FROM product_stock_shards s WHERE s.product_id = l.id)"
+)
+
+# Locks, in id order, the rows of the chunk that are about to change; rows
+# already at the given stock are neither locked nor written
+_LOCK_CHUNK: dict[BulkMode, TextClause] = {
+    mode: text(
+        "SELECT count(*) FROM ("
+        "SELECT p.id FROM products p JOIN product_load l ON l.id = p.id "
+        # The range on p.id as well, or the planner scans all of products
+        "WHERE p.id > :after AND p.id <= :last "
+        f"AND l.id > :after AND l.id <= :last AND {changed} "
+        "ORDER BY p.id FOR UPDATE OF p"
+        ") AS locked"
+    )
+    for mode, changed in (("set", "p.stock <> l.stock"), ("adjust", "l.stock <> 0"))
+}
+
+# Each returns (eligible, inserted, updated) for the chunk
+_APPLY: dict[BulkMode, TextClause] = {
+    "set": text(
+        "WITH eligible AS ("
+        "SELECT l.id, l.stock FROM product_load l "
+        f"WHERE l.id > :after AND l.id <= :last AND l.stock >= 0 AND {_NOT_SHARDED}"
+        "), applied AS ("
+        "INSERT INTO products (id, stock) SELECT id, stock FROM eligible ORDER BY id "
+        "ON CONFLICT (id) DO UPDATE SET stock = EXCLUDED.stock "
+        "WHERE products.stock <> EXCLUDED.stock "
+        "RETURNING (xmax = 0) AS inserted"
+        ") SELECT (SELECT count(*) FROM eligible), "
+        "count(*) FILTER (WHERE inserted), "
+        "count(*) FILTER (WHERE NOT inserted) FROM applied"
+    ),
+    "adjust": text(
+        "WITH eligible AS ("
+        "SELECT l.id, l.stock FROM product_load l JOIN products p ON p.id = l.id "
+        "WHERE p.id > :after AND p.id <= :last "
+        "AND l.id > :after AND l.id <= :last "
+        f"AND p.stock + l.stock >= 0 AND {_NOT_SHARDED}"
+        "), applied AS ("
+        "UPDATE products p SET stock = p.stock + e.stock FROM eligible e "
+        "WHERE p.id = e.id AND p.id > :after AND p.id <= :last AND e.stock <> 0 "
+        "RETURNING p.id"
+        ") SELECT (SELECT count(*) FROM eligible), 0, count(*) FROM applied"
+    ),
+}
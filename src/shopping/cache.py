@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CartSnapshot:
+    """The lines of a cart as of one version: (product_id, quantity) pairs."""
+
+    cart_id: int
+    version: int
+    lines: tuple[tuple[int, int], ...]
+
+    @property
+    def etag(self) -> str:
+        # The cart id is part of the tag: a recreated cart restarts at version 0
+        return f'W/"{self.cart_id}-{self.version}"'
+
+
+class CartCache:
+    """
+    Per-worker LRU of cart snapshots keyed by user_id.
+
+    Entries are never trusted on their own: readers compare them with the
+    cart's current (id, version), read from the database, so a write made by
+    any worker invalidates every worker's copy without coordination.
+    """
+
+    max_entries: int
+    _entries: OrderedDict[str, CartSnapshot]
+    _lock: threading.Lock
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, cart_id: int, version: int) -> CartSnapshot | None:
+        """The cached snapshot, if it is still the given version of the cart."""
+        with self._lock:
+            snapshot = self._entries.get(user_id)
+            if snapshot is None:
+                return None
+            if snapshot.cart_id != cart_id or snapshot.version != version:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def put(self, user_id: str, snapshot: CartSnapshot) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            current = self._entries.get(user_id)
+            # A slower reader must not replace a newer snapshot
+            if (
+                current is not None
+                and current.cart_id == snapshot.cart_id
+                and current.version > snapshot.version
+            ):
+                return
+            self._entries[user_id] = snapshot
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                _ = self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,98 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+from src.shopping.repository import ProductRepository, StockShardRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProductPageSnapshot:
+    """One page of the catalog as read at `fetched_at`."""
+
+    products: tuple[tuple[int, int], ...]
+    next_cursor: int | None
+    fetched_at: float
+
+
+class ProductCatalog:
+    """
+    Keyset-paginated product listing with a short-TTL page cache.
+
+    Stock is a snapshot at most `max_age` seconds old: catalog reads are
+    served from memory and only go to the database when a page expires, so
+    browsing adds no load on the rows CartService locks. Plain reads never
+    wait for FOR UPDATE locks anyway; the cache keeps them off the primary.
+    Sharded products report the sum of their shards; units held in
+    worker-local leases are not included.
+    """
+
+    max_age: float
+    max_pages: int
+    _pages: OrderedDict[tuple[int, int], ProductPageSnapshot]
+    _lock: threading.Lock
+    _clock: Callable[[], float]
+
+    def __init__(
+        self,
+        max_age: float = 2.0,
+        max_pages: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_age = max_age
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def get_page(
+        self, session: Session, after: int, limit: int
+    ) -> tuple[ProductPageSnapshot, float]:
+        """The page of products after id `after`, and its age in seconds."""
+        key = (after, limit)
+        now = self._clock()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None and now - page.fetched_at <= self.max_age:
+                self._pages.move_to_end(key)
+                return page, now - page.fetched_at
+
+        logger.debug("Loading product page after id %s (limit %s)", after, limit)
+        page = self._load(session, after, limit)
+        if self.max_pages > 0:
+            with self._lock:
+                self._pages[key] = page
+                self._pages.move_to_end(key)
+                while len(self._pages) > self.max_pages:
+                    _ = self._pages.popitem(last=False)
+        return page, 0.0
+
+    def _load(self, session: Session, after: int, limit: int) -> ProductPageSnapshot:
+        fetched_at = self._clock()
+        # One row more than requested tells whether there is a next page
+        rows = ProductRepository(session).list_after(after, limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        sharded = (
+            StockShardRepository(session).total_stock_by_product(
+                [product_id for product_id, _ in rows]
+            )
+            if rows
+            else {}
+        )
+        # The page is read-only: do not keep the transaction open
+        session.rollback()
+
+        return ProductPageSnapshot(
+            products=tuple(
+                (product_id, stock + sharded.get(product_id, 0))
+                for product_id, stock in rows
+            ),
+            next_cursor=rows[-1][0] if has_more else None,
+            fetched_at=fetched_at,
+        )
@@ -0,0 +1,165 @@
+import time
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from sqlalchemy.orm import Session
+from src.metrics import CART_ADD_BATCH_SIZE
+from src.shopping.domain import InsufficientStock
+from src.shopping.repository import CartRepository, ProductRepository
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescedProductNotFound(Exception):
+    """Raised to every request of a batch whose product does not exist."""
+
+    pass
+
+
+@dataclass
+class _PendingAdd:
+    user_id: str
+    quantity: int
+    future: Future[None] = field(default_factory=Future)
+
+
+@dataclass
+class _Batch:
+    operations: list[_PendingAdd] = field(default_factory=list)
+    full: threading.Event = field(default_factory=threading.Event)
+
+
+class AddItemCoalescer:
+    """
+    Group commit for add-item requests on the same product.
+
+    The first request for a product becomes the batch leader: it waits up to
+    `window` seconds (or until `max_batch` requests have joined), then applies
+    the whole batch in one transaction - carts locked in user_id order, one
+    lock on the products row, one commit - and hands each waiting request its
+    own outcome. Requests that do not fit in the remaining stock fail with
+    InsufficientStock without affecting the rest of the batch.
+
+    Stock is taken from products.stock only: do not use it for leased or
+    sharded products.
+    """
+
+    window: float
+    max_batch: int
+    lock_nowait: bool
+    _session_factory: Callable[[], Session]
+    _pending: dict[int, _Batch]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        window: float = 0.002,
+        max_batch: int = 100,
+        lock_nowait: bool = False,
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.lock_nowait = lock_nowait
+        self._session_factory = session_factory
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add_item(self, user_id: str, product_id: int, quantity: int) -> None:
+        """Blocks until the batch holding this request has been committed."""
+        operation = _PendingAdd(user_id, quantity)
+        with self._lock:
+            batch = self._pending.get(product_id)
+            is_leader = batch is None
+            if batch is None:
+                batch = _Batch()
+                self._pending[product_id] = batch
+            batch.operations.append(operation)
+            if len(batch.operations) >= self.max_batch:
+                # Later arrivals start a new batch
+                del self._pending[product_id]
+                batch.full.set()
+
+        if is_leader:
+            _ = batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(product_id) is batch:
+                    del self._pending[product_id]
+            self._apply(product_id, batch.operations)
+
+        operation.future.result()
+
+    def _apply(self, product_id: int, operations: list[_PendingAdd]) -> None:
+        CART_ADD_BATCH_SIZE.observe(len(operations))
+        start = time.perf_counter()
+        session = self._session_factory()
+        try:
+            errors = self._apply_in_transaction(session, product_id, operations)
+        except BaseException as e:
+            # The transaction failed as a whole: every request gets the error
+            logger.error("Coalesced add_item batch for product %s: %r", product_id, e)
+            for operation in operations:
+                operation.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        finally:
+            session.close()
+
+        logger.info(
+            "Committed %s coalesced add_item request(s) for product %s in %.4fs",
+            len(operations),
+            product_id,
+            time.perf_counter() - start,
+        )
+        for operation, error in zip(operations, errors):
+            if error is None:
+                operation.future.set_result(None)
+            else:
+                operation.future.set_exception(error)
+
+    def _apply_in_transaction(
+        self, session: Session, product_id: int, operations: list[_PendingAdd]
+    ) -> list[Exception | None]:
+        cart_repo = CartRepository(session, lock_nowait=self.lock_nowait)
+        product_repo = ProductRepository(session, lock_nowait=self.lock_nowait)
+
+        # 1. Lock (creating where needed) every cart, in user_id order
+        user_ids = sorted({operation.user_id for operation in operations})
+        cart_ids = cart_repo.get_ids_by_user_ids_with_lock(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in cart_ids]
+        if missing:
+            logger.info("Creating carts for %s user(s) in batch", len(missing))
+            for user_id in missing:
+                cart_repo.create_if_not_exists(user_id)
+            cart_ids.update(cart_repo.get_ids_by_user_ids_with_lock(missing))
+
+        # 2. Lock the product once for the whole batch
+        product = product_repo.get_by_id_with_lock(product_id)
+        if product is None:
+            session.rollback()
+            return [
+                CoalescedProductNotFound(f"Product {product_id} not found")
+                for _ in operations
+            ]
+
+        # 3. Allocate stock in arrival order
+        errors: list[Exception | None] = []
+        changed: set[int] = set()
+        for operation in operations:
+            try:
+                product.decrease_stock(operation.quantity)
+            except InsufficientStock as e:
+                errors.append(e)
+                continue
+            cart_id = cart_ids[operation.user_id]
+            _ = cart_repo.upsert_item(cart_id, product_id, operation.quantity)
+            changed.add(cart_id)
+            errors.append(None)
+
+        if changed:
+            cart_repo.bump_versions(changed)
+        session.commit()
+        return errors
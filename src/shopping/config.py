@@ -0,0 +1,64 @@
+import os
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# Check and decrement stock in a single conditional UPDATE and upsert the cart
+# line with INSERT ... ON CONFLICT, instead of SELECT FOR UPDATE + ORM flush.
+CART_STOCK_FAST_PATH = env_flag("CART_STOCK_FAST_PATH")
+
+# Take stock for sharded products from product_stock_shards (see
+# src/shard_stock.py). Implies the single-statement path for add_item.
+CART_SHARDED_STOCK = env_flag("CART_SHARDED_STOCK")
+
+# Products served from worker-local stock leases, e.g. "101,102" (empty: off).
+STOCK_LEASE_PRODUCTS = {
+    int(product_id)
+    for product_id in os.environ.get("STOCK_LEASE_PRODUCTS", "").split(",")
+    if product_id.strip()
+}
+STOCK_LEASE_BLOCK_SIZE = int(os.environ.get("STOCK_LEASE_BLOCK_SIZE", "50"))
+STOCK_LEASE_TTL = float(os.environ.get("STOCK_LEASE_TTL", "30"))
+
+# Load only the cart lines being changed instead of the whole cart.
+CART_TARGETED_LINES = env_flag("CART_TARGETED_LINES")
+
+# Fail row locks immediately (FOR UPDATE NOWAIT) instead of queueing behind
+# another transaction; the request is answered with 503 + Retry-After.
+DB_LOCK_NOWAIT = env_flag("DB_LOCK_NOWAIT")
+
+# Row-locking queries slower than this are logged with a warning.
+SLOW_LOCK_WAIT_MS = float(os.environ.get("SLOW_LOCK_WAIT_MS", "100"))
+
+# Re-run cart transactions aborted by a deadlock or serialization failure,
+# with full-jitter exponential backoff (1 attempt: no retries).
+CART_RETRY_ATTEMPTS = int(os.environ.get("CART_RETRY_ATTEMPTS", "3"))
+CART_RETRY_BASE_DELAY_MS = float(os.environ.get("CART_RETRY_BASE_DELAY_MS", "10"))
+CART_RETRY_MAX_DELAY_MS = float(os.environ.get("CART_RETRY_MAX_DELAY_MS", "200"))
+
+# Group commit: add-item requests for the same product arriving within this
+# window (milliseconds) are applied in one transaction (0: off). Not used
+# for leased products or together with CART_SHARDED_STOCK.
+CART_COALESCE_WINDOW_MS = float(os.environ.get("CART_COALESCE_WINDOW_MS", "0"))
+CART_COALESCE_MAX_BATCH = int(os.environ.get("CART_COALESCE_MAX_BATCH", "100"))
+
+# Cart snapshots kept per worker for GET /cart (0: no caching).
+CART_CACHE_SIZE = int(os.environ.get("CART_CACHE_SIZE", "10000"))
+
+# GET /products: how stale (seconds) cached stock may be, and how many pages
+# each worker keeps.
+PRODUCTS_STOCK_MAX_AGE = float(os.environ.get("PRODUCTS_STOCK_MAX_AGE", "2"))
+PRODUCTS_CACHE_PAGES = int(os.environ.get("PRODUCTS_CACHE_PAGES", "1000"))
+
+# Abandoned cart lines: a line nobody has written to for CART_LINE_TTL seconds
+# is removed and its units go back to stock (0: never). Each worker sweeps
+# every CART_SWEEP_INTERVAL seconds, CART_SWEEP_BATCH carts per transaction.
+CART_LINE_TTL = float(os.environ.get("CART_LINE_TTL", "0"))
+CART_SWEEP_INTERVAL = float(os.environ.get("CART_SWEEP_INTERVAL", "60"))
+CART_SWEEP_BATCH = int(os.environ.get("CART_SWEEP_BATCH", "100"))
+
+# Points per shard on the cart hash ring (see CART_SHARD_URLS in database.py).
+# Changing it moves carts between shards: run src.rebalance_carts afterwards.
+CART_SHARD_VNODES = int(os.environ.get("CART_SHARD_VNODES", "128"))
@@ -1,9 +1,120 @@
 from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from src.database import get_db
-from src.shopping.service import CartService
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import (
+    DATABASE_ASYNC,
+    SessionLocal,
+    cart_shard_engines,
+    get_db,
+    get_async_db,
+)
+from src.shopping.config import (
+    CART_CACHE_SIZE,
+    CART_LINE_TTL,
+    CART_SWEEP_BATCH,
+    CART_COALESCE_MAX_BATCH,
+    CART_COALESCE_WINDOW_MS,
+    CART_SHARDED_STOCK,
+    CART_SHARD_VNODES,
+    CART_STOCK_FAST_PATH,
+    CART_RETRY_ATTEMPTS,
+    CART_RETRY_BASE_DELAY_MS,
+    CART_RETRY_MAX_DELAY_MS,
+    CART_TARGETED_LINES,
+    DB_LOCK_NOWAIT,
+    PRODUCTS_CACHE_PAGES,
+    PRODUCTS_STOCK_MAX_AGE,
+    STOCK_LEASE_BLOCK_SIZE,
+    STOCK_LEASE_PRODUCTS,
+    STOCK_LEASE_TTL,
+)
+from src.shopping.cache import CartCache
+from src.shopping.catalog import ProductCatalog
+from src.shopping.coalescer import AddItemCoalescer
+from src.shopping.leases import StockLeaseManager
+from src.shopping.retry import RetryPolicy
+from src.shopping.sharding import CartShardRouter, check_cart_shard_settings
+from src.shopping.service import AsyncCartService, CartService
+from src.shopping.sweeper import AbandonedCartSweeper
+
+# Carts live on the shard databases when configured; products stay on the primary.
+cart_shards: CartShardRouter | None = None
+if cart_shard_engines:
+    check_cart_shard_settings(
+        database_async=DATABASE_ASYNC,
+        stock_lease_products=bool(STOCK_LEASE_PRODUCTS),
+        coalesce_window_ms=CART_COALESCE_WINDOW_MS,
+        cart_line_ttl=CART_LINE_TTL,
+    )
+    cart_shards = CartShardRouter(cart_shard_engines, vnodes=CART_SHARD_VNODES)
+
+# One lease pool per worker process; released in the app lifespan.
+stock_leases = (
+    StockLeaseManager(
+        SessionLocal,
+        STOCK_LEASE_PRODUCTS,
+        block_size=STOCK_LEASE_BLOCK_SIZE,
+        ttl=STOCK_LEASE_TTL,
+    )
+    if STOCK_LEASE_PRODUCTS
+    else None
+)
+
+# Per worker process: only requests served by the same worker are coalesced.
+add_item_coalescer = (
+    AddItemCoalescer(
+        SessionLocal,
+        window=CART_COALESCE_WINDOW_MS / 1000,
+        max_batch=CART_COALESCE_MAX_BATCH,
+        lock_nowait=DB_LOCK_NOWAIT,
+    )
+    if CART_COALESCE_WINDOW_MS > 0
+    else None
+)
+
+# Validated against carts.version on every read, so it is safe per worker.
+cart_cache = CartCache(max_entries=CART_CACHE_SIZE)
+
+product_catalog = ProductCatalog(
+    max_age=PRODUCTS_STOCK_MAX_AGE, max_pages=PRODUCTS_CACHE_PAGES
+)
+
+# Run from the app lifespan; workers sweeping concurrently skip each other.
+cart_sweeper = (
+    AbandonedCartSweeper(SessionLocal, CART_LINE_TTL, batch_size=CART_SWEEP_BATCH)
+    if CART_LINE_TTL > 0
+    else None
+)
+
+retry_policy = RetryPolicy(
+    max_attempts=CART_RETRY_ATTEMPTS,
+    base_delay=CART_RETRY_BASE_DELAY_MS / 1000,
+    max_delay=CART_RETRY_MAX_DELAY_MS / 1000,
+)
 
 
 def get_cart_service(db: Annotated[Session, Depends(get_db)]) -> CartService:
-    return CartService(db)
+    return CartService(
+        db,
+        fast_path=CART_STOCK_FAST_PATH,
+        sharded_stock=CART_SHARDED_STOCK,
+        leases=stock_leases,
+        targeted_lines=CART_TARGETED_LINES,
+        lock_nowait=DB_LOCK_NOWAIT,
+        retry_policy=retry_policy,
+        coalescer=add_item_coalescer,
+        cart_cache=cart_cache,
+        cart_shards=cart_shards,
+    )
+
+
+def get_async_cart_service(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> AsyncCartService:
+    return AsyncCartService(
+        db,
+        sharded_stock=CART_SHARDED_STOCK,
+        lock_nowait=DB_LOCK_NOWAIT,
+        retry_policy=retry_policy,
+    )
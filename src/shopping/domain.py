@@ -53,20 +53,30 @@ class Cart:
     user_id: str
     items: list[CartItem]
 
+    # product_id -> position in `items`. Not mapped: built lazily from `items`
+    # and rebuilt whenever it no longer matches (e.g. after a reload).
+    _item_positions: dict[int | None, int] | None = None
+    _indexed_items: list[CartItem] | None = None
+
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.items = []
 
+    def get_item(self, product_id: int | None) -> CartItem | None:
+        position = self._position_of(product_id)
+        return self.items[position] if position is not None else None
+
     def add_item(self, product: Product, quantity: int):
         """Add an item to the cart. Does NOT handle stock."""
         # Update existing item or add new
-        for item in self.items:
-            if item.product_id == product.id:
-                item.quantity += quantity
-                return
+        item = self.get_item(product.id)
+        if item is not None:
+            item.quantity += quantity
+            return
 
         new_item = CartItem(product_id=product.id, quantity=quantity)
         self.items.append(new_item)
+        self._positions()[product.id] = len(self.items) - 1
 
     def remove_item(self, product: Product, quantity: int) -> int:
         """
@@ -74,15 +84,51 @@ class Cart:
         Does NOT handle stock.
         Returns the actual quantity removed/returned.
         """
-        for item in self.items:
-            if item.product_id == product.id:
-                actual_return = min(item.quantity, quantity)
-                item.quantity -= quantity
-                if item.quantity <= 0:
-                    self.items.remove(item)
-                return actual_return
-
-        raise ItemNotFoundInCart()
+        position = self._position_of(product.id)
+        if position is None:
+            raise ItemNotFoundInCart()
+
+        item = self.items[position]
+        actual_return = min(item.quantity, quantity)
+        item.quantity -= quantity
+        if item.quantity <= 0:
+            self._remove_at(position)
+        return actual_return
+
+    def _remove_at(self, position: int):
+        """O(1) removal: the last item takes the removed item's slot."""
+        positions = self._positions()
+        removed = self.items[position]
+        # Pop before re-inserting so the moved item is never left orphaned
+        last = self.items.pop()
+        if last is not removed:
+            self.items[position] = last
+            positions[last.product_id] = position
+        del positions[removed.product_id]
+
+    def _position_of(self, product_id: int | None) -> int | None:
+        position = self._positions().get(product_id)
+        if position is not None and self.items[position].product_id != product_id:
+            position = self._reindex().get(product_id)
+        return position
+
+    def _positions(self) -> dict[int | None, int]:
+        items = self.items
+        positions = self._item_positions
+        if (
+            positions is None
+            or self._indexed_items is not items
+            or len(positions) != len(items)
+        ):
+            positions = self._reindex()
+        return positions
+
+    def _reindex(self) -> dict[int | None, int]:
+        self._indexed_items = self.items
+        self._item_positions = {
+            item.product_id: position for position, item in enumerate(self.items)
+        }
+        return self._item_positions
 
 
 def add_item_to_cart(cart: Cart, product: Product, quantity: int):
@@ -93,9 +139,11 @@ def add_item_to_cart(cart: Cart, product: Product, quantity: int):
     cart.add_item(product, quantity)
 
 
-def remove_item_from_cart(cart: Cart, product: Product, quantity: int):
+def remove_item_from_cart(cart: Cart, product: Product, quantity: int) -> int:
     """
     Domain service to remove an item from the cart and increase product stock.
+    Returns the quantity actually returned to stock.
     """
     actual_return = cart.remove_item(product, quantity)
     product.increase_stock(actual_return)
+    return actual_return
@@ -0,0 +1,171 @@
+import time
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from src.shopping.domain import InsufficientStock
+from src.shopping.models import products_table
+
+logger = logging.getLogger(__name__)
+
+
+class ProductNotLeasable(Exception):
+    """Raised when a lease is requested for a product that does not exist."""
+
+    pass
+
+
+@dataclass
+class StockLease:
+    product_id: int
+    remaining: int
+    expires_at: float
+
+
+class StockLeaseManager:
+    """
+    Worker-local stock leases for flash-sale products.
+
+    Instead of locking the products row for every add, the worker takes a
+    block of stock (e.g. 50 units) from products.stock in one short locked
+    transaction and serves subsequent adds from memory. Unused units go back
+    to products.stock when the lease expires or the worker shuts down.
+
+    While leased, units are invisible to other workers and to stock reads, and
+    a worker that is killed without shutting down loses its leased units, so
+    keep the block size and TTL small. Leasing only touches the products row:
+    do not combine it with sharded stock for the same product.
+    """
+
+    product_ids: frozenset[int]
+    block_size: int
+    ttl: float
+    _session_factory: Callable[[], Session]
+    _leases: dict[int, StockLease]
+    _locks: dict[int, threading.Lock]
+    _clock: Callable[[], float]
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        product_ids: set[int] | frozenset[int],
+        block_size: int = 50,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.product_ids = frozenset(product_ids)
+        self.block_size = block_size
+        self.ttl = ttl
+        self._session_factory = session_factory
+        self._leases = {}
+        # One lock per opted-in product, created up front so no lock is needed
+        # to find it
+        self._locks = {product_id: threading.Lock() for product_id in product_ids}
+        self._clock = clock
+
+    def covers(self, product_id: int) -> bool:
+        return product_id in self.product_ids
+
+    def remaining(self, product_id: int) -> int:
+        lease = self._leases.get(product_id)
+        return lease.remaining if lease else 0
+
+    def take(self, product_id: int, quantity: int) -> None:
+        """
+        Takes `quantity` units from the local lease, leasing a new block from
+        the database first if needed. Raises InsufficientStock if the lease
+        and the products row together cannot cover the request.
+        """
+        with self._locks[product_id]:
+            lease = self._leases.get(product_id)
+            if lease and self._clock() >= lease.expires_at:
+                self._return_to_db(lease)
+                lease = None
+
+            if lease is None or lease.remaining < quantity:
+                lease = self._extend(product_id, lease, quantity)
+
+            if lease.remaining < quantity:
+                raise InsufficientStock()
+            lease.remaining -= quantity
+
+    def give_back(self, product_id: int, quantity: int) -> None:
+        """Returns units to the local lease (cart removal or failed commit)."""
+        if quantity <= 0:
+            return
+        with self._locks[product_id]:
+            lease = self._leases.get(product_id)
+            if lease is None:
+                lease = StockLease(product_id, 0, self._clock() + self.ttl)
+                self._leases[product_id] = lease
+            lease.remaining += quantity
+
+    def release_expired(self) -> None:
+        now = self._clock()
+        for product_id in self.product_ids:
+            with self._locks[product_id]:
+                lease = self._leases.get(product_id)
+                if lease and now >= lease.expires_at:
+                    self._return_to_db(lease)
+
+    def release_all(self) -> None:
+        for product_id in self.product_ids:
+            with self._locks[product_id]:
+                lease = self._leases.get(product_id)
+                if lease:
+                    self._return_to_db(lease)
+
+    def _extend(
+        self, product_id: int, lease: StockLease | None, quantity: int
+    ) -> StockLease:
+        wanted = max(self.block_size, quantity - (lease.remaining if lease else 0))
+
+        session = self._session_factory()
+        try:
+            stock = session.execute(
+                select(products_table.c.stock)
+                .where(products_table.c.id == product_id)
+                .with_for_update()
+            ).scalar_one_or_none()
+            if stock is None:
+                raise ProductNotLeasable(f"Product {product_id} not found")
+
+            granted = min(stock, wanted)
+            if granted > 0:
+                _ = session.execute(
+                    update(products_table)
+                    .where(products_table.c.id == product_id)
+                    .values(stock=products_table.c.stock - granted)
+                )
+                session.commit()
+        finally:
+            session.close()
+
+        logger.info("Leased %s units of product %s", granted, product_id)
+        if lease is None:
+            lease = StockLease(product_id, 0, 0.0)
+            self._leases[product_id] = lease
+        lease.remaining += granted
+        lease.expires_at = self._clock() + self.ttl
+        return lease
+
+    def _return_to_db(self, lease: StockLease) -> None:
+        if lease.remaining > 0:
+            session = self._session_factory()
+            try:
+                _ = session.execute(
+                    update(products_table)
+                    .where(products_table.c.id == lease.product_id)
+                    .values(stock=products_table.c.stock + lease.remaining)
+                )
+                session.commit()
+            finally:
+                session.close()
+            logger.info(
+                "Returned %s leased units of product %s",
+                lease.remaining,
+                lease.product_id,
+            )
+        del self._leases[lease.product_id]
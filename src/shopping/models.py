@@ -1,11 +1,13 @@
 from sqlalchemy import (
     Column,
+    DateTime,
     Integer,
     String,
     ForeignKey,
     UniqueConstraint,
     Table,
     MetaData,
+    func,
 )
 from sqlalchemy.orm import registry, relationship
 
@@ -22,21 +24,66 @@ products_table = Table(
     Column("stock", Integer, nullable=False),
 )
 
-carts_table = Table(
-    "carts",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("user_id", String, unique=True, index=True, nullable=False),
-)
 
-cart_items_table = Table(
-    "cart_items",
+def define_cart_tables(
+    metadata: MetaData, reference_products: bool = True
+) -> tuple[Table, Table]:
+    """
+    carts and cart_items on `metadata`. Cart shard databases (see
+    src/shopping/sharding.py) hold the same tables, but have no products
+    table for cart_items.product_id to reference.
+    """
+    carts = Table(
+        "carts",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", String, unique=True, index=True, nullable=False),
+        # Bumped by every write to the cart's lines; validates cached reads
+        Column("version", Integer, nullable=False, server_default="0"),
+    )
+
+    cart_items = Table(
+        "cart_items",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+        Column("cart_id", Integer, ForeignKey("carts.id"), nullable=False),
+        Column(
+            "product_id",
+            Integer,
+            *([ForeignKey("products.id")] if reference_products else []),
+            nullable=False,
+        ),
+        Column("quantity", Integer, nullable=False),
+        # Last write to the line; lines left alone too long are swept (see
+        # src/shopping/sweeper.py). ORM updates set it through onupdate,
+        # upserts set it explicitly.
+        Column(
+            "updated_at",
+            DateTime(timezone=True),
+            nullable=False,
+            index=True,
+            server_default=func.now(),
+            onupdate=func.now(),
+        ),
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_product"),
+    )
+    return carts, cart_items
+
+
+carts_table, cart_items_table = define_cart_tables(metadata)
+
+# Tables created on each cart shard database
+cart_shard_metadata = MetaData()
+_ = define_cart_tables(cart_shard_metadata, reference_products=False)
+
+# Optional split of a hot product's stock across several rows. For a sharded
+# product the stock lives here and products.stock is kept at 0.
+product_stock_shards_table = Table(
+    "product_stock_shards",
     metadata,
-    Column("id", Integer, primary_key=True, index=True, autoincrement=True),
-    Column("cart_id", Integer, ForeignKey("carts.id"), nullable=False),
-    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
-    Column("quantity", Integer, nullable=False),
-    UniqueConstraint("cart_id", "product_id", name="uq_cart_product"),
+    Column("product_id", Integer, ForeignKey("products.id"), primary_key=True),
+    Column("shard", Integer, primary_key=True),
+    Column("stock", Integer, nullable=False),
 )
 
 
@@ -0,0 +1,31 @@
+import logging
+from typing import Annotated
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+from src.database import get_read_db
+from src.shopping.dependencies import product_catalog
+from src.shopping.schemas import ProductPage, ProductView
+
+router = APIRouter(prefix="/products", tags=["products"])
+logger = logging.getLogger(__name__)
+
+
+@router.get("", response_model=ProductPage)
+def list_products(
+    response: Response,
+    db: Annotated[Session, Depends(get_read_db)],
+    after: Annotated[
+        int, Query(description="Cursor: last id of the previous page")
+    ] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    # On the replica when usable, which adds up to DB_REPLICA_MAX_LAG to `age`
+    page, age = product_catalog.get_page(db, after, limit)
+    # Clients and proxies may reuse the page for what is left of the bound
+    remaining = max(int(product_catalog.max_age - age), 0)
+    response.headers["Cache-Control"] = f"public, max-age={remaining}"
+    return ProductPage(
+        items=[ProductView(id=pid, stock=stock) for pid, stock in page.products],
+        next_cursor=page.next_cursor,
+        stock_age=round(age, 3),
+    )
@@ -1,17 +1,72 @@
+import time
 import logging
-from sqlalchemy.orm import Session
+from datetime import timedelta
+from collections.abc import Collection, Iterator
+from contextlib import contextmanager
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from src.shopping.domain import Cart, Product
-from src.shopping.models import carts_table, products_table
+from src.metrics import DB_LOCK_UNAVAILABLE, DB_LOCK_WAIT
+from src.shopping.cache import CartSnapshot
+from src.shopping.config import SLOW_LOCK_WAIT_MS
+from src.shopping.domain import Cart, CartItem, Product
+from src.shopping.models import (
+    cart_items_table,
+    carts_table,
+    product_stock_shards_table,
+    products_table,
+)
 
 logger = logging.getLogger(__name__)
 
+# SQLSTATE raised by FOR UPDATE NOWAIT and by lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+class LockUnavailable(Exception):
+    """Raised when a row lock could not be acquired (NOWAIT or lock_timeout)."""
+
+    table: str
+
+    def __init__(self, table: str):
+        super().__init__(f"Could not lock {table} row: it is busy")
+        self.table = table
+
+
+@contextmanager
+def timed_lock(table: str, key: object) -> Iterator[None]:
+    """
+    Times the row-locking query run inside the block into the lock wait
+    histogram, logs slow waits, and turns lock_not_available into
+    LockUnavailable. The transaction is aborted in that case and must be
+    rolled back by the caller.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except DBAPIError as e:
+        if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+            raise
+        DB_LOCK_UNAVAILABLE.labels(table).inc()
+        logger.warning("Lock on %s (%s) not available, giving up", table, key)
+        raise LockUnavailable(table) from e
+    finally:
+        waited = time.perf_counter() - start
+        DB_LOCK_WAIT.labels(table).observe(waited)
+        if waited * 1000 >= SLOW_LOCK_WAIT_MS:
+            logger.warning("Slow lock on %s (%s): waited %.3fs", table, key, waited)
+
 
 class ProductRepository:
     session: Session
+    lock_nowait: bool
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, lock_nowait: bool = False):
         self.session = session
+        self.lock_nowait = lock_nowait
 
     def get_by_id(self, product_id: int) -> Product | None:
         return (
@@ -20,34 +75,487 @@ class ProductRepository:
             .first()
         )
 
+    def list_after(self, after_id: int, limit: int) -> list[tuple[int, int]]:
+        """
+        (id, stock) of up to `limit` products with id > `after_id`, in id
+        order. Keyset pagination: an index range scan, however deep the page.
+        """
+        stmt = (
+            select(products_table.c.id, products_table.c.stock)
+            .where(products_table.c.id > after_id)
+            .order_by(products_table.c.id)
+            .limit(limit)
+        )
+        return [(row.id, row.stock) for row in self.session.execute(stmt)]
+
     def get_by_id_with_lock(self, product_id: int) -> Product | None:
-        logger.debug(f"Executing SELECT FOR UPDATE on products for id: {product_id}")
+        logger.debug("Executing SELECT FOR UPDATE on products for id: %s", product_id)
+        with timed_lock("products", product_id):
+            return (
+                self.session.query(Product)
+                .filter(products_table.c.id == product_id)
+                .with_for_update(nowait=self.lock_nowait)
+                .first()
+            )
+
+    def get_by_ids_with_lock(self, product_ids: list[int]) -> list[Product]:
+        """
+        Locks several products at once. Rows are locked in ascending id order,
+        so concurrent callers always acquire them in the same order.
+        """
+        logger.debug("Executing SELECT FOR UPDATE on products for ids: %s", product_ids)
+        with timed_lock("products", product_ids):
+            return (
+                self.session.query(Product)
+                .filter(products_table.c.id.in_(product_ids))
+                .order_by(products_table.c.id)
+                .with_for_update(nowait=self.lock_nowait)
+                .all()
+            )
+
+    def get_by_ids_skip_locked(self, product_ids: Collection[int]) -> list[Product]:
+        """
+        Locks the products among `product_ids` that no other transaction
+        holds (in ascending id order) and returns them; busy ones are left
+        out instead of waited for.
+        """
+        logger.debug(
+            "Executing SELECT FOR UPDATE SKIP LOCKED on products for ids: %s",
+            product_ids,
+        )
         return (
             self.session.query(Product)
-            .filter(products_table.c.id == product_id)
+            .filter(products_table.c.id.in_(product_ids))
+            .order_by(products_table.c.id)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    def decrease_stock_if_available(self, product_id: int, quantity: int) -> int | None:
+        """
+        Checks and decrements stock in one statement. Returns the remaining
+        stock, or None if the product does not exist or has less than
+        `quantity` in stock. The row lock lasts until the transaction ends,
+        so callers should make this the last statement before committing.
+        An UPDATE cannot use NOWAIT; its wait is bounded by lock_timeout.
+        """
+        logger.debug("Executing conditional stock decrement for product %s", product_id)
+        stmt = (
+            update(products_table)
+            .where(products_table.c.id == product_id)
+            .where(products_table.c.stock >= quantity)
+            .values(stock=products_table.c.stock - quantity)
+            .returning(products_table.c.stock)
+        )
+        with timed_lock("products", product_id):
+            return self.session.execute(stmt).scalar_one_or_none()
+
+    def increase_stock(self, product_id: int, quantity: int) -> None:
+        """Returns `quantity` units to the product in one statement."""
+        _ = self.session.execute(
+            update(products_table)
+            .where(products_table.c.id == product_id)
+            .values(stock=products_table.c.stock + quantity)
+        )
+
+
+def _any_shard(product_id: int):
+    return (
+        select(product_stock_shards_table.c.shard)
+        .where(product_stock_shards_table.c.product_id == product_id)
+        .limit(1)
+    )
+
+
+def _take_from_random_shard(product_id: int, quantity: int):
+    """One random shard with enough stock that nobody else holds."""
+    shards = product_stock_shards_table
+    candidate = (
+        select(shards.c.shard)
+        .where(shards.c.product_id == product_id)
+        .where(shards.c.stock >= quantity)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(shards)
+        .where(shards.c.product_id == product_id)
+        .where(shards.c.shard == candidate)
+        .where(shards.c.stock >= quantity)
+        .values(stock=shards.c.stock - quantity)
+        .returning(shards.c.shard)
+    )
+
+
+def _lock_all_shards(product_id: int):
+    """Every shard of the product, locked in shard order."""
+    shards = product_stock_shards_table
+    return (
+        select(shards.c.shard, shards.c.stock)
+        .where(shards.c.product_id == product_id)
+        .order_by(shards.c.shard)
+        .with_for_update()
+    )
+
+
+def _drain_shards(
+    rows: Collection[tuple[int, int]], quantity: int
+) -> list[tuple[int, int]]:
+    """(shard, units) to take so that `quantity` is drained across `rows`."""
+    taken: list[tuple[int, int]] = []
+    remaining = quantity
+    for shard, stock in rows:
+        units = min(stock, remaining)
+        if units > 0:
+            taken.append((shard, units))
+            remaining -= units
+        if remaining == 0:
+            break
+    return taken
+
+
+def _take_from_shard(product_id: int, shard: int, quantity: int):
+    shards = product_stock_shards_table
+    return (
+        update(shards)
+        .where(shards.c.product_id == product_id)
+        .where(shards.c.shard == shard)
+        .values(stock=shards.c.stock - quantity)
+    )
+
+
+def _give_to_random_shard(product_id: int, quantity: int, skip_locked: bool):
+    shards = product_stock_shards_table
+    candidate = (
+        select(shards.c.shard)
+        .where(shards.c.product_id == product_id)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=skip_locked)
+        .scalar_subquery()
+    )
+    return (
+        update(shards)
+        .where(shards.c.product_id == product_id)
+        .where(shards.c.shard == candidate)
+        .values(stock=shards.c.stock + quantity)
+        .returning(shards.c.shard)
+    )
+
+
+class StockShardRepository:
+    """
+    Stock of a hot product split across N rows, so concurrent requests for it
+    lock different rows instead of queueing on one products row.
+    """
+
+    session: Session
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def has_shards(self, product_id: int) -> bool:
+        return self.session.execute(_any_shard(product_id)).first() is not None
+
+    def total_stock(self, product_id: int) -> int | None:
+        """Sum of all shards, or None if the product is not sharded."""
+        stmt = select(func.sum(product_stock_shards_table.c.stock)).where(
+            product_stock_shards_table.c.product_id == product_id
+        )
+        total = self.session.execute(stmt).scalar_one_or_none()
+        return int(total) if total is not None else None
+
+    def total_stock_by_product(self, product_ids: Collection[int]) -> dict[int, int]:
+        """Summed shard stock of the sharded products among `product_ids`."""
+        shards = product_stock_shards_table
+        stmt = (
+            select(shards.c.product_id, func.sum(shards.c.stock).label("stock"))
+            .where(shards.c.product_id.in_(product_ids))
+            .group_by(shards.c.product_id)
+        )
+        return {row.product_id: int(row.stock) for row in self.session.execute(stmt)}
+
+    def try_decrease(self, product_id: int, quantity: int) -> bool | None:
+        """
+        Takes `quantity` from the shards. Returns True on success, False if
+        the shards together hold less than `quantity`, and None if the product
+        is not sharded.
+        """
+        # Fast path: one random shard with enough stock that nobody else holds
+        logger.debug("Executing shard stock decrement for product %s", product_id)
+        stmt = _take_from_random_shard(product_id, quantity)
+        if self.session.execute(stmt).first() is not None:
+            return True
+
+        # Slow path: every shard with enough stock is busy or none has enough
+        # on its own. Lock all shards (in shard order, so concurrent fallbacks
+        # cannot deadlock) and drain across them.
+        logger.debug("Falling back to locking all shards of product %s", product_id)
+        with timed_lock("product_stock_shards", product_id):
+            rows = self._lock_shards(product_id)
+        if not rows:
+            return None
+        if sum(stock for _, stock in rows) < quantity:
+            return False
+        for shard, units in _drain_shards(rows, quantity):
+            _ = self.session.execute(_take_from_shard(product_id, shard, units))
+        return True
+
+    def increase(self, product_id: int, quantity: int, wait: bool = True) -> bool:
+        """
+        Returns stock to a random shard; False if the product is not sharded
+        or, with `wait` off, if every shard is locked by another transaction.
+        """
+        for skip_locked in (True, False) if wait else (True,):
+            stmt = _give_to_random_shard(product_id, quantity, skip_locked)
+            if self.session.execute(stmt).first() is not None:
+                return True
+        return False
+
+    def split(self, product_id: int, shard_count: int) -> None:
+        """
+        (Re)distributes the product's whole stock evenly across `shard_count`
+        shards. The product row is locked for the duration.
+        """
+        product = self.session.execute(
+            select(products_table.c.stock)
+            .where(products_table.c.id == product_id)
+            .with_for_update()
+        ).first()
+        if product is None:
+            raise ValueError(f"Product {product_id} not found")
+
+        total = product.stock + sum(stock for _, stock in self._lock_shards(product_id))
+        self._clear(product_id)
+
+        base, extra = divmod(total, shard_count)
+        _ = self.session.execute(
+            insert(product_stock_shards_table),
+            [
+                {
+                    "product_id": product_id,
+                    "shard": shard,
+                    "stock": base + (1 if shard < extra else 0),
+                }
+                for shard in range(shard_count)
+            ],
+        )
+        _ = self.session.execute(
+            update(products_table)
+            .where(products_table.c.id == product_id)
+            .values(stock=0)
+        )
+
+    def merge(self, product_id: int) -> None:
+        """Moves the shards' stock back into products.stock."""
+        _ = self.session.execute(
+            select(products_table.c.id)
+            .where(products_table.c.id == product_id)
             .with_for_update()
-            .first()
+        )
+        rows = self._lock_shards(product_id)
+        if not rows:
+            return
+        total = sum(stock for _, stock in rows)
+        self._clear(product_id)
+        _ = self.session.execute(
+            update(products_table)
+            .where(products_table.c.id == product_id)
+            .values(stock=products_table.c.stock + total)
+        )
+
+    def _lock_shards(self, product_id: int) -> list[tuple[int, int]]:
+        """Locks every shard of the product in shard order."""
+        rows = self.session.execute(_lock_all_shards(product_id)).all()
+        return [(row.shard, row.stock) for row in rows]
+
+    def _clear(self, product_id: int) -> None:
+        _ = self.session.execute(
+            delete(product_stock_shards_table).where(
+                product_stock_shards_table.c.product_id == product_id
+            )
         )
 
 
 class CartRepository:
     session: Session
+    lock_nowait: bool
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, lock_nowait: bool = False):
         self.session = session
+        self.lock_nowait = lock_nowait
+
+    def get_id_by_user_id_with_lock(self, user_id: str) -> int | None:
+        """Locks the cart row without loading the aggregate or its items."""
+        logger.debug("Executing SELECT id FOR UPDATE on carts for user_id: %s", user_id)
+        stmt = (
+            select(carts_table.c.id)
+            .where(carts_table.c.user_id == user_id)
+            .with_for_update(nowait=self.lock_nowait)
+        )
+        with timed_lock("carts", user_id):
+            return self.session.execute(stmt).scalar_one_or_none()
 
-    def get_by_user_id_with_lock(self, user_id: str) -> Cart | None:
-        logger.debug(f"Executing SELECT FOR UPDATE on carts for user_id: {user_id}")
+    def get_version_by_user_id(self, user_id: str) -> tuple[int, int] | None:
+        """(cart id, version) of the user's cart, without loading any line."""
+        stmt = select(carts_table.c.id, carts_table.c.version).where(
+            carts_table.c.user_id == user_id
+        )
+        row = self.session.execute(stmt).first()
+        return (row.id, row.version) if row else None
+
+    def get_snapshot_by_user_id(self, user_id: str) -> CartSnapshot | None:
+        """The cart's lines and the version they belong to, in one statement."""
+        logger.debug("Loading cart snapshot for user_id: %s", user_id)
+        stmt = (
+            select(
+                carts_table.c.id,
+                carts_table.c.version,
+                cart_items_table.c.product_id,
+                cart_items_table.c.quantity,
+            )
+            .select_from(carts_table.outerjoin(cart_items_table))
+            .where(carts_table.c.user_id == user_id)
+            .order_by(cart_items_table.c.product_id)
+        )
+        rows = self.session.execute(stmt).all()
+        if not rows:
+            return None
+        return CartSnapshot(
+            cart_id=rows[0].id,
+            version=rows[0].version,
+            lines=tuple(
+                (row.product_id, row.quantity)
+                for row in rows
+                if row.product_id is not None
+            ),
+        )
+
+    def bump_versions(self, cart_ids: Collection[int]) -> None:
+        """Marks the carts as changed; call with their rows locked."""
+        _ = self.session.execute(
+            update(carts_table)
+            .where(carts_table.c.id.in_(cart_ids))
+            .values(version=carts_table.c.version + 1)
+        )
+
+    def get_ids_with_lines_older_than(
+        self, max_age: timedelta, after_id: int, limit: int
+    ) -> list[int]:
+        """
+        Ids (> `after_id`, ascending) of up to `limit` carts having a line
+        not written for `max_age`, found through the updated_at index.
+        """
+        stmt = (
+            select(cart_items_table.c.cart_id)
+            .where(cart_items_table.c.updated_at < func.now() - max_age)
+            .where(cart_items_table.c.cart_id > after_id)
+            .group_by(cart_items_table.c.cart_id)
+            .order_by(cart_items_table.c.cart_id)
+            .limit(limit)
+        )
+        return list(self.session.execute(stmt).scalars())
+
+    def get_by_ids_skip_locked(self, cart_ids: Collection[int]) -> list[Cart]:
+        """
+        Locks and returns the carts among `cart_ids` that no request is
+        using right now; carts locked by another transaction are skipped.
+        """
+        logger.debug(
+            "Executing SELECT FOR UPDATE SKIP LOCKED on carts for ids: %s", cart_ids
+        )
         return (
             self.session.query(Cart)
-            .filter(carts_table.c.user_id == user_id)
-            .with_for_update()
-            .first()
+            .filter(carts_table.c.id.in_(cart_ids))
+            .order_by(carts_table.c.id)
+            .with_for_update(skip_locked=True)
+            .options(selectinload(Cart.items))
+            .all()
         )
 
+    def get_lines_older_than(
+        self, cart_ids: Collection[int], max_age: timedelta
+    ) -> list[tuple[int, int]]:
+        """(cart_id, product_id) of the carts' lines not written for `max_age`."""
+        stmt = (
+            select(cart_items_table.c.cart_id, cart_items_table.c.product_id)
+            .where(cart_items_table.c.cart_id.in_(cart_ids))
+            .where(cart_items_table.c.updated_at < func.now() - max_age)
+        )
+        return [(row.cart_id, row.product_id) for row in self.session.execute(stmt)]
+
+    def get_ids_by_user_ids_with_lock(self, user_ids: list[str]) -> dict[str, int]:
+        """
+        Locks several cart rows (in user_id order, so concurrent callers
+        cannot deadlock) and returns their ids by user_id.
+        """
+        logger.debug(
+            "Executing SELECT id FOR UPDATE on carts for %s users", len(user_ids)
+        )
+        stmt = (
+            select(carts_table.c.user_id, carts_table.c.id)
+            .where(carts_table.c.user_id.in_(user_ids))
+            .order_by(carts_table.c.user_id)
+            .with_for_update(nowait=self.lock_nowait)
+        )
+        with timed_lock("carts", user_ids):
+            rows = self.session.execute(stmt).all()
+        return {row.user_id: row.id for row in rows}
+
+    def upsert_item(self, cart_id: int, product_id: int, quantity: int) -> int:
+        """Adds `quantity` to the cart line, creating it if needed."""
+        logger.debug(
+            "Executing ON CONFLICT DO UPDATE upsert for cart %s, product %s",
+            cart_id,
+            product_id,
+        )
+        stmt = pg_insert(cart_items_table).values(
+            cart_id=cart_id, product_id=product_id, quantity=quantity
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_cart_product",
+            set_={
+                "quantity": cart_items_table.c.quantity + stmt.excluded.quantity,
+                "updated_at": func.now(),
+            },
+        ).returning(cart_items_table.c.quantity)
+        return self.session.execute(stmt).scalar_one()
+
+    def get_by_user_id_with_lock(
+        self, user_id: str, product_ids: Collection[int] | None = None
+    ) -> Cart | None:
+        """
+        Locks and returns the cart. With `product_ids`, only the lines for
+        those products are loaded (through the uq_cart_product index) and set
+        as the cart's `items`, instead of lazily loading the whole cart.
+        """
+        logger.debug("Executing SELECT FOR UPDATE on carts for user_id: %s", user_id)
+        with timed_lock("carts", user_id):
+            cart = (
+                self.session.query(Cart)
+                .filter(carts_table.c.user_id == user_id)
+                .with_for_update(nowait=self.lock_nowait)
+                .first()
+            )
+        if cart is None or product_ids is None:
+            return cart
+
+        logger.debug("Loading cart lines for products %s", list(product_ids))
+        items = (
+            self.session.query(CartItem)
+            .filter(cart_items_table.c.cart_id == cart.id)
+            .filter(cart_items_table.c.product_id.in_(product_ids))
+            .all()
+        )
+        # Marked as the loaded state: lines left out are not seen as removed
+        set_committed_value(cart, "items", items)
+        return cart
+
     def create_if_not_exists(self, user_id: str) -> None:
         logger.debug(
-            f"Executing ON CONFLICT DO NOTHING insert for cart (user_id: {user_id})"
+            "Executing ON CONFLICT DO NOTHING insert for cart (user_id: %s)", user_id
         )
         stmt = (
             pg_insert(Cart)
@@ -55,3 +563,109 @@ class CartRepository:
             .on_conflict_do_nothing(index_elements=["user_id"])
         )
         _ = self.session.execute(stmt)
+
+
+class AsyncProductRepository:
+    session: AsyncSession
+    lock_nowait: bool
+
+    def __init__(self, session: AsyncSession, lock_nowait: bool = False):
+        self.session = session
+        self.lock_nowait = lock_nowait
+
+    async def get_by_id(self, product_id: int) -> Product | None:
+        stmt = select(Product).where(products_table.c.id == product_id)
+        return (await self.session.scalars(stmt)).first()
+
+    async def get_by_id_with_lock(self, product_id: int) -> Product | None:
+        logger.debug("Executing SELECT FOR UPDATE on products for id: %s", product_id)
+        stmt = (
+            select(Product)
+            .where(products_table.c.id == product_id)
+            .with_for_update(nowait=self.lock_nowait)
+        )
+        with timed_lock("products", product_id):
+            return (await self.session.scalars(stmt)).first()
+
+
+class AsyncStockShardRepository:
+    """StockShardRepository's cart-path operations on an AsyncSession."""
+
+    session: AsyncSession
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def has_shards(self, product_id: int) -> bool:
+        result = await self.session.execute(_any_shard(product_id))
+        return result.first() is not None
+
+    async def try_decrease(self, product_id: int, quantity: int) -> bool | None:
+        """Same contract and locking order as StockShardRepository.try_decrease."""
+        logger.debug("Executing shard stock decrement for product %s", product_id)
+        result = await self.session.execute(
+            _take_from_random_shard(product_id, quantity)
+        )
+        if result.first() is not None:
+            return True
+
+        logger.debug("Falling back to locking all shards of product %s", product_id)
+        with timed_lock("product_stock_shards", product_id):
+            result = await self.session.execute(_lock_all_shards(product_id))
+        rows = [(row.shard, row.stock) for row in result.all()]
+        if not rows:
+            return None
+        if sum(stock for _, stock in rows) < quantity:
+            return False
+        for shard, units in _drain_shards(rows, quantity):
+            _ = await self.session.execute(_take_from_shard(product_id, shard, units))
+        return True
+
+    async def increase(self, product_id: int, quantity: int) -> bool:
+        """Returns stock to a random shard; False if the product is not sharded."""
+        for skip_locked in (True, False):
+            result = await self.session.execute(
+                _give_to_random_shard(product_id, quantity, skip_locked)
+            )
+            if result.first() is not None:
+                return True
+        return False
+
+
+class AsyncCartRepository:
+    session: AsyncSession
+    lock_nowait: bool
+
+    def __init__(self, session: AsyncSession, lock_nowait: bool = False):
+        self.session = session
+        self.lock_nowait = lock_nowait
+
+    async def get_by_user_id_with_lock(self, user_id: str) -> Cart | None:
+        logger.debug("Executing SELECT FOR UPDATE on carts for user_id: %s", user_id)
+        # Lazy loading would need implicit IO, so the items are loaded up front
+        stmt = (
+            select(Cart)
+            .where(carts_table.c.user_id == user_id)
+            .options(selectinload(Cart.items))
+            .with_for_update(nowait=self.lock_nowait)
+        )
+        with timed_lock("carts", user_id):
+            return (await self.session.scalars(stmt)).first()
+
+    async def bump_versions(self, cart_ids: Collection[int]) -> None:
+        _ = await self.session.execute(
+            update(carts_table)
+            .where(carts_table.c.id.in_(cart_ids))
+            .values(version=carts_table.c.version + 1)
+        )
+
+    async def create_if_not_exists(self, user_id: str) -> None:
+        logger.debug(
+            "Executing ON CONFLICT DO NOTHING insert for cart (user_id: %s)", user_id
+        )
+        stmt = (
+            pg_insert(Cart)
+            .values(user_id=user_id)
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+        _ = await self.session.execute(stmt)
@@ -0,0 +1,122 @@
+import time
+import random
+import asyncio
+import logging
+import functools
+import inspect
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, TypeVar, cast
+from sqlalchemy.exc import DBAPIError
+from src.metrics import DB_TRANSACTION_OUTCOMES, DB_TRANSACTION_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Postgres aborts one of the transactions involved; running it again is safe
+RETRYABLE_SQLSTATES = {
+    "40P01": "deadlock",
+    "40001": "serialization_failure",
+}
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often, and how long apart, an aborted transaction is re-run."""
+
+    max_attempts: int = 3
+    base_delay: float = 0.01
+    max_delay: float = 0.2
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt`."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+def retry_reason(exc: BaseException) -> str | None:
+    """The retryable failure `exc` stands for, or None if it is not one."""
+    if isinstance(exc, DBAPIError):
+        return RETRYABLE_SQLSTATES.get(getattr(exc.orig, "pgcode", None) or "")
+    return None
+
+
+def retry_transaction(operation: str) -> Callable[[F], F]:
+    """
+    Re-runs a service method whose transaction Postgres aborted with a
+    deadlock or serialization failure: the session is rolled back, and the
+    method is called again after a jittered backoff, up to
+    `self.retry_policy.max_attempts` times. Methods must start their
+    transaction from scratch (no state carried over from a failed attempt).
+    Works for both CartService and AsyncCartService methods.
+    """
+
+    def decorator(method: F) -> F:
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+                policy: RetryPolicy | None = self.retry_policy
+                attempt = 1
+                while True:
+                    try:
+                        result = await method(self, *args, **kwargs)
+                    except DBAPIError as e:
+                        reason = retry_reason(e)
+                        if not _should_retry(policy, operation, reason, attempt):
+                            raise
+                        await self.session.rollback()
+                        await asyncio.sleep(cast(RetryPolicy, policy).delay(attempt))
+                        attempt += 1
+                        continue
+                    _record_success(operation, attempt)
+                    return result
+
+            return cast(F, async_wrapper)
+
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            policy: RetryPolicy | None = self.retry_policy
+            attempt = 1
+            while True:
+                try:
+                    result = method(self, *args, **kwargs)
+                except DBAPIError as e:
+                    reason = retry_reason(e)
+                    if not _should_retry(policy, operation, reason, attempt):
+                        raise
+                    self.session.rollback()
+                    time.sleep(cast(RetryPolicy, policy).delay(attempt))
+                    attempt += 1
+                    continue
+                _record_success(operation, attempt)
+                return result
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def _should_retry(
+    policy: RetryPolicy | None, operation: str, reason: str | None, attempt: int
+) -> bool:
+    if reason is None:
+        return False
+    if policy is None or attempt >= policy.max_attempts:
+        DB_TRANSACTION_OUTCOMES.labels(operation, "gave_up").inc()
+        logger.error(
+            "%s failed with %s after %s attempt(s)", operation, reason, attempt
+        )
+        return False
+    DB_TRANSACTION_RETRIES.labels(operation, reason).inc()
+    logger.warning(
+        "%s aborted by %s, retrying (attempt %s)", operation, reason, attempt
+    )
+    return True
+
+
+def _record_success(operation: str, attempt: int) -> None:
+    if attempt > 1:
+        DB_TRANSACTION_OUTCOMES.labels(operation, "committed_after_retry").inc()
+        logger.info("%s committed after %s attempts", operation, attempt)
@@ -1,17 +1,59 @@
 import logging
 from typing import Annotated
-from fastapi import APIRouter, status, Depends, HTTPException
-from src.shopping.schemas import CartItemOperation
+from fastapi import APIRouter, status, Depends, Header, HTTPException, Response
+from src.shopping.schemas import (
+    CartBatchRequest,
+    CartItemOperation,
+    CartLine,
+    CartView,
+)
 from src.auth.dependencies import get_current_user
 from src.auth.domain import User
 from src.shopping.dependencies import get_cart_service
-from src.shopping.service import CartService, CartNotFound, ProductNotFound
+from src.shopping.service import (
+    BatchOperationFailed,
+    CartService,
+    CartNotFound,
+    ProductNotFound,
+)
 from src.shopping.domain import InsufficientStock, ItemNotFoundInCart
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 logger = logging.getLogger(__name__)
 
 
+@router.get("", response_model=CartView)
+def get_cart(
+    response: Response,
+    user: Annotated[User, Depends(get_current_user)],
+    cart_service: Annotated[CartService, Depends(get_cart_service)],
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    # Read on the primary, not a replica: a cart read right after a write to
+    # it must see that write (the version check costs one indexed lookup)
+    snapshot = cart_service.get_cart(user.id)
+    if snapshot is None:
+        return CartView(items=[], version=0)
+
+    # Clients must revalidate, which is answered with 304 while unchanged
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or snapshot.etag in (tag.strip() for tag in if_none_match.split(","))
+    ):
+        logger.debug("Cart of user %s not modified", user.id)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return CartView(
+        items=[
+            CartLine(product_id=product_id, quantity=quantity)
+            for product_id, quantity in snapshot.lines
+        ],
+        version=snapshot.version,
+    )
+
+
 @router.post("/add-item", status_code=status.HTTP_200_OK)
 def add_item_to_cart(
     operation: CartItemOperation,
@@ -19,25 +61,33 @@ def add_item_to_cart(
     cart_service: Annotated[CartService, Depends(get_cart_service)],
 ):
     logger.info(
-        f"User {user.id} adding {operation.quantity} of product {operation.product_id} to cart"
+        "User %s adding %s of product %s to cart",
+        user.id,
+        operation.quantity,
+        operation.product_id,
     )
     try:
         cart_service.add_item(user.id, operation.product_id, operation.quantity)
         logger.info(
-            f"Successfully added product {operation.product_id} to cart for user {user.id}"
+            "Successfully added product %s to cart for user %s",
+            operation.product_id,
+            user.id,
         )
         return {"status": "success", "message": "Item added to cart"}
     except CartNotFound as e:
-        logger.error(f"Cart not found for user {user.id}: {e}")
+        logger.error("Cart not found for user %s: %s", user.id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
     except ProductNotFound as e:
-        logger.warning(f"Product {operation.product_id} not found: {e}")
+        logger.warning("Product %s not found: %s", operation.product_id, e)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except InsufficientStock as e:
         logger.warning(
-            f"Insufficient stock for product {operation.product_id} (requested {operation.quantity}): {e}"
+            "Insufficient stock for product %s (requested %s): %s",
+            operation.product_id,
+            operation.quantity,
+            e,
         )
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -49,20 +99,60 @@ def remove_item_from_cart(
     cart_service: Annotated[CartService, Depends(get_cart_service)],
 ):
     logger.info(
-        f"User {user.id} removing {operation.quantity} of product {operation.product_id} from cart"
+        "User %s removing %s of product %s from cart",
+        user.id,
+        operation.quantity,
+        operation.product_id,
     )
     try:
         cart_service.remove_item(user.id, operation.product_id, operation.quantity)
         logger.info(
-            f"Successfully removed product {operation.product_id} from cart for user {user.id}"
+            "Successfully removed product %s from cart for user %s",
+            operation.product_id,
+            user.id,
         )
         return {"status": "success", "message": "Item removed from cart"}
     except (CartNotFound, ItemNotFoundInCart) as e:
-        logger.warning(f"Item/Cart error for user {user.id}: {e}")
+        logger.warning("Item/Cart error for user %s: %s", user.id, e)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except ProductNotFound as e:
-        logger.warning(f"Product {operation.product_id} not found: {e}")
+        logger.warning("Product %s not found: %s", operation.product_id, e)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except InsufficientStock as e:
-        logger.warning(f"Stock error during removal for user {user.id}: {e}")
+        logger.warning("Stock error during removal for user %s: %s", user.id, e)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/batch", status_code=status.HTTP_200_OK)
+def apply_cart_batch(
+    batch: CartBatchRequest,
+    user: Annotated[User, Depends(get_current_user)],
+    cart_service: Annotated[CartService, Depends(get_cart_service)],
+):
+    logger.info(
+        "User %s applying batch of %s cart operations", user.id, len(batch.operations)
+    )
+    try:
+        results = cart_service.apply_batch(user.id, batch.operations)
+        logger.info("Successfully applied cart batch for user %s", user.id)
+        return {
+            "status": "success",
+            "message": "Batch applied to cart",
+            "results": [result.model_dump() for result in results],
+        }
+    except CartNotFound as e:
+        logger.error("Cart not found for user %s: %s", user.id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    except BatchOperationFailed as e:
+        status_code = (
+            status.HTTP_400_BAD_REQUEST
+            if isinstance(e.error, InsufficientStock)
+            else status.HTTP_404_NOT_FOUND
+        )
+        logger.warning("Cart batch rejected for user %s: %s", user.id, e)
+        raise HTTPException(
+            status_code=status_code,
+            detail={"message": str(e), "failed_operation": e.index},
+        )
@@ -1,7 +1,56 @@
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
+
+
+# Product Schemas
+class ProductView(BaseModel):
+    id: int
+    stock: int
+
+
+class ProductPage(BaseModel):
+    items: list[ProductView]
+    # Pass as `after` to get the next page; None on the last page
+    next_cursor: int | None
+    # How old the stock values are, in seconds (at most the configured bound)
+    stock_age: float
+
+
+class BulkLoadReport(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    skipped: int
+    seconds: float
+    rows_per_second: float
 
 
 # Cart Schemas
 class CartItemOperation(BaseModel):
     product_id: int
     quantity: int = 1
+
+
+class CartBatchOperation(CartItemOperation):
+    action: Literal["add", "remove"]
+
+
+class CartBatchRequest(BaseModel):
+    operations: list[CartBatchOperation] = Field(min_length=1, max_length=100)
+
+
+class CartLine(BaseModel):
+    product_id: int
+    quantity: int
+
+
+class CartView(BaseModel):
+    items: list[CartLine]
+    version: int
+
+
+class CartBatchLineResult(BaseModel):
+    product_id: int
+    action: Literal["add", "remove"]
+    quantity: int
+    cart_quantity: int
@@ -1,10 +1,37 @@
 import logging
+from collections import Counter
+from collections.abc import Collection, Sequence
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from src.shopping.domain import add_item_to_cart, remove_item_from_cart
-from src.shopping.repository import CartRepository, ProductRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.metrics import CART_SHARD_COMPENSATIONS
+from src.shopping.domain import (
+    Cart,
+    InsufficientStock,
+    ItemNotFoundInCart,
+    Product,
+    add_item_to_cart,
+    remove_item_from_cart,
+)
+from src.shopping.cache import CartCache, CartSnapshot
+from src.shopping.coalescer import AddItemCoalescer, CoalescedProductNotFound
+from src.shopping.leases import ProductNotLeasable, StockLeaseManager
+from src.shopping.repository import (
+    AsyncCartRepository,
+    AsyncProductRepository,
+    AsyncStockShardRepository,
+    CartRepository,
+    ProductRepository,
+    StockShardRepository,
+)
+from src.shopping.retry import RetryPolicy, retry_transaction
+from src.shopping.sharding import CartShardRouter
+from src.shopping.schemas import CartBatchLineResult, CartBatchOperation
 
 logger = logging.getLogger(__name__)
 
+FOREIGN_KEY_VIOLATION = "23503"
+
 
 class CartNotFound(Exception):
     pass
@@ -14,71 +41,656 @@ class ProductNotFound(Exception):
     pass
 
 
+class BatchOperationFailed(Exception):
+    """Raised when one line of a batch fails; the whole batch is rolled back."""
+
+    index: int
+    error: Exception
+
+    def __init__(self, index: int, error: Exception):
+        super().__init__(
+            f"Operation {index} failed: {str(error) or type(error).__name__}"
+        )
+        self.index = index
+        self.error = error
+
+
 class CartService:
     session: Session
     cart_repo: CartRepository
     product_repo: ProductRepository
+    shard_repo: StockShardRepository
+    fast_path: bool
+    sharded_stock: bool
+    leases: StockLeaseManager | None
+    targeted_lines: bool
+    retry_policy: RetryPolicy | None
+    coalescer: AddItemCoalescer | None
+    cart_cache: CartCache | None
+    cart_shards: CartShardRouter | None
 
-    def __init__(self, session: Session):
+    def __init__(
+        self,
+        session: Session,
+        fast_path: bool = False,
+        sharded_stock: bool = False,
+        leases: StockLeaseManager | None = None,
+        targeted_lines: bool = False,
+        lock_nowait: bool = False,
+        retry_policy: RetryPolicy | None = None,
+        coalescer: AddItemCoalescer | None = None,
+        cart_cache: CartCache | None = None,
+        cart_shards: CartShardRouter | None = None,
+    ):
         self.session = session
-        self.cart_repo = CartRepository(session)
-        self.product_repo = ProductRepository(session)
+        self.cart_repo = CartRepository(session, lock_nowait=lock_nowait)
+        self.product_repo = ProductRepository(session, lock_nowait=lock_nowait)
+        self.shard_repo = StockShardRepository(session)
+        self.fast_path = fast_path
+        self.sharded_stock = sharded_stock
+        self.leases = leases
+        self.targeted_lines = targeted_lines
+        self.retry_policy = retry_policy
+        self.coalescer = coalescer
+        self.cart_cache = cart_cache
+        self.cart_shards = cart_shards
 
-    def add_item(self, user_id: str, product_id: int, quantity: int):
-        # 1. Optimistic Cart Fetch/Lock
-        logger.debug(f"Attempting to fetch/lock cart for user {user_id}")
-        cart = self.cart_repo.get_by_user_id_with_lock(user_id)
+    def get_cart(self, user_id: str) -> CartSnapshot | None:
+        """
+        The user's cart lines. Served from the cache when its entry is still
+        the cart's current version, which costs one single-row lookup.
+        """
+        if self.cart_shards:
+            session = self.cart_shards.session_for(user_id)
+            try:
+                return self._get_cart(CartRepository(session), user_id)
+            finally:
+                session.close()
+        return self._get_cart(self.cart_repo, user_id)
+
+    def _get_cart(self, cart_repo: CartRepository, user_id: str) -> CartSnapshot | None:
+        current = cart_repo.get_version_by_user_id(user_id)
+        if current is None:
+            return None
+        cart_id, version = current
+
+        if self.cart_cache is not None:
+            snapshot = self.cart_cache.get(user_id, cart_id, version)
+            if snapshot is not None:
+                logger.debug(
+                    "Cart cache hit for user %s (version %s)", user_id, version
+                )
+                return snapshot
+
+        logger.debug("Cart cache miss for user %s, loading lines", user_id)
+        snapshot = cart_repo.get_snapshot_by_user_id(user_id)
+        if snapshot is not None and self.cart_cache is not None:
+            self.cart_cache.put(user_id, snapshot)
+        return snapshot
+
+    def _lock_cart(self, user_id: str, product_ids: Collection[int]) -> Cart | None:
+        # In targeted mode only the lines being changed are loaded
+        if self.targeted_lines:
+            return self.cart_repo.get_by_user_id_with_lock(user_id, product_ids)
+        return self.cart_repo.get_by_user_id_with_lock(user_id)
+
+    def _lock_or_create_cart(self, user_id: str, product_ids: Collection[int]) -> Cart:
+        # Optimistic Cart Fetch/Lock
+        logger.debug("Attempting to fetch/lock cart for user %s", user_id)
+        cart = self._lock_cart(user_id, product_ids)
 
         # If not found, create it (rare case)
         if not cart:
-            logger.info(f"Cart not found for user {user_id}. Creating new cart.")
+            logger.info("Cart not found for user %s. Creating new cart.", user_id)
             self.cart_repo.create_if_not_exists(user_id)
             # Fetch again after creation
-            cart = self.cart_repo.get_by_user_id_with_lock(user_id)
+            cart = self._lock_cart(user_id, product_ids)
 
         if not cart:
-            logger.error(f"Failed to retrieve or create cart for user {user_id}")
+            logger.error("Failed to retrieve or create cart for user %s", user_id)
             raise CartNotFound("Failed to retrieve active cart")
 
+        return cart
+
+    @retry_transaction("add_item")
+    def add_item(self, user_id: str, product_id: int, quantity: int):
+        if self.cart_shards:
+            op = CartBatchOperation(
+                action="add", product_id=product_id, quantity=quantity
+            )
+            return self._apply_single_on_cart_shard(self.cart_shards, user_id, op)
+        if self.leases and self.leases.covers(product_id):
+            return self._add_item_leased(self.leases, user_id, product_id, quantity)
+        if self.coalescer and not self.sharded_stock:
+            return self._add_item_coalesced(
+                self.coalescer, user_id, product_id, quantity
+            )
+        if self.fast_path or self.sharded_stock:
+            return self._add_item_fast(user_id, product_id, quantity)
+
+        # 1. Optimistic Cart Fetch/Lock
+        cart = self._lock_or_create_cart(user_id, [product_id])
+
         # 2. Lock Product first (to ensure stock consistency)
-        logger.debug(f"Locking product {product_id} for stock validation")
+        logger.debug("Locking product %s for stock validation", product_id)
         product = self.product_repo.get_by_id_with_lock(product_id)
 
         if not product:
-            logger.warning(f"Product {product_id} not found during add_item")
+            logger.warning("Product %s not found during add_item", product_id)
             raise ProductNotFound(f"Product {product_id} not found")
 
         # 3. Use domain service
-        logger.info(f"Applying domain logic: adding product {product_id} to cart")
+        logger.info("Applying domain logic: adding product %s to cart", product_id)
         add_item_to_cart(cart, product, quantity)
+        self.cart_repo.bump_versions([cart.id])
 
         logger.debug("Committing transaction for add_item")
         self.session.commit()
-        logger.info(f"Successfully committed add_item for user {user_id}")
+        logger.info("Successfully committed add_item for user %s", user_id)
+
+    def _add_item_fast(self, user_id: str, product_id: int, quantity: int):
+        """
+        Same outcome as the ORM path, but with single statements and the
+        conditional stock decrement issued last: the product row lock is taken
+        right before the commit, so it is held for that statement and the
+        COMMIT round trip instead of for the whole transaction.
+        """
+        # 1. Lock the cart row only (the aggregate is not loaded)
+        cart_id = self._lock_or_create_cart_id(user_id)
+
+        # 2. Upsert the cart line
+        try:
+            _ = self.cart_repo.upsert_item(cart_id, product_id, quantity)
+        except IntegrityError as e:
+            if getattr(e.orig, "pgcode", None) != FOREIGN_KEY_VIOLATION:
+                raise
+            self.session.rollback()
+            logger.warning("Product %s not found during add_item", product_id)
+            raise ProductNotFound(f"Product {product_id} not found") from e
+        self.cart_repo.bump_versions([cart_id])
 
+        # 3. Conditional stock decrement
+        try:
+            self._take_stock(product_id, quantity)
+        except (InsufficientStock, ProductNotFound):
+            # Discard the cart line upserted above
+            self.session.rollback()
+            raise
+
+        logger.debug("Committing transaction for add_item")
+        self.session.commit()
+        logger.info("Successfully committed add_item for user %s", user_id)
+
+    def _add_item_leased(
+        self, leases: StockLeaseManager, user_id: str, product_id: int, quantity: int
+    ):
+        """
+        Serves the stock from this worker's lease, so the products row is not
+        touched at all unless the lease has to be topped up.
+        """
+        cart_id = self._lock_or_create_cart_id(user_id)
+
+        logger.info(
+            "Taking %s of product %s from the local lease", quantity, product_id
+        )
+        try:
+            leases.take(product_id, quantity)
+        except ProductNotLeasable as e:
+            logger.warning("Product %s not found during add_item", product_id)
+            raise ProductNotFound(str(e)) from e
+
+        try:
+            _ = self.cart_repo.upsert_item(cart_id, product_id, quantity)
+            self.cart_repo.bump_versions([cart_id])
+            logger.debug("Committing transaction for add_item")
+            self.session.commit()
+        except BaseException:
+            # The units never reached a cart: put them back into the lease
+            leases.give_back(product_id, quantity)
+            raise
+        logger.info("Successfully committed add_item for user %s", user_id)
+
+    def _add_item_coalesced(
+        self, coalescer: AddItemCoalescer, user_id: str, product_id: int, quantity: int
+    ):
+        """
+        Joins the group commit for the product; the batch runs in its own
+        session, so this request's session is not used.
+        """
+        logger.info("Coalescing add of product %s for user %s", product_id, user_id)
+        try:
+            coalescer.add_item(user_id, product_id, quantity)
+        except CoalescedProductNotFound as e:
+            logger.warning("Product %s not found during add_item", product_id)
+            raise ProductNotFound(str(e)) from e
+        logger.info("Successfully committed add_item for user %s", user_id)
+
+    def _lock_or_create_cart_id(self, user_id: str) -> int:
+        logger.debug("Attempting to lock cart row for user %s", user_id)
+        cart_id = self.cart_repo.get_id_by_user_id_with_lock(user_id)
+        if cart_id is None:
+            logger.info("Cart not found for user %s. Creating new cart.", user_id)
+            self.cart_repo.create_if_not_exists(user_id)
+            cart_id = self.cart_repo.get_id_by_user_id_with_lock(user_id)
+
+        if cart_id is None:
+            logger.error("Failed to retrieve or create cart for user %s", user_id)
+            raise CartNotFound("Failed to retrieve active cart")
+        return cart_id
+
+    def _take_stock(self, product_id: int, quantity: int):
+        if self.sharded_stock:
+            taken = self.shard_repo.try_decrease(product_id, quantity)
+            if taken is not None:
+                logger.info("Took %s of product %s from a shard", quantity, product_id)
+                if not taken:
+                    raise InsufficientStock()
+                return
+
+        logger.info("Applying conditional stock decrement for product %s", product_id)
+        remaining = self.product_repo.decrease_stock_if_available(product_id, quantity)
+        if remaining is None:
+            # Nothing was updated: tell a missing product from a short one
+            if self.product_repo.get_by_id(product_id) is None:
+                logger.warning("Product %s not found during add_item", product_id)
+                raise ProductNotFound(f"Product {product_id} not found")
+            raise InsufficientStock()
+
+    @retry_transaction("remove_item")
     def remove_item(self, user_id: str, product_id: int, quantity: int):
+        if self.cart_shards:
+            op = CartBatchOperation(
+                action="remove", product_id=product_id, quantity=quantity
+            )
+            return self._apply_single_on_cart_shard(self.cart_shards, user_id, op)
+
         # 1. Fetch and Lock Cart
-        logger.debug(f"Fetching/locking cart for user {user_id} during removal")
-        cart = self.cart_repo.get_by_user_id_with_lock(user_id)
+        logger.debug("Fetching/locking cart for user %s during removal", user_id)
+        cart = self._lock_cart(user_id, [product_id])
 
         if not cart:
             logger.warning(
-                f"Attempted to remove item from non-existent cart for user {user_id}"
+                "Attempted to remove item from non-existent cart for user %s", user_id
             )
             raise CartNotFound("Item not found in cart")
 
-        # 2. Lock Product
-        logger.debug(f"Locking product {product_id} during removal")
-        product = self.product_repo.get_by_id_with_lock(product_id)
+        leased = self.leases is not None and self.leases.covers(product_id)
+        returned_to_lease = 0
+        if leased or (self.sharded_stock and self.shard_repo.has_shards(product_id)):
+            # 2. Stock goes back to the lease or a shard; no product row lock
+            product = self.product_repo.get_by_id(product_id)
+            if not product:
+                raise ProductNotFound(f"Product {product_id} not found")
+            logger.info("Removing product %s from cart", product_id)
+            returned = cart.remove_item(product, quantity)
+            if leased:
+                # Only handed back to the lease once the removal is committed
+                returned_to_lease = returned
+            else:
+                _ = self.shard_repo.increase(product_id, returned)
+        else:
+            # 2. Lock Product
+            logger.debug("Locking product %s during removal", product_id)
+            product = self.product_repo.get_by_id_with_lock(product_id)
 
-        if not product:
-            logger.warning(f"Product {product_id} not found during remove_item")
-            raise ProductNotFound(f"Product {product_id} not found")
+            if not product:
+                logger.warning("Product %s not found during remove_item", product_id)
+                raise ProductNotFound(f"Product {product_id} not found")
 
-        # 3. Use domain service
-        logger.info(f"Applying domain logic: removing product {product_id} from cart")
-        remove_item_from_cart(cart, product, quantity)
+            # 3. Use domain service
+            logger.info(
+                "Applying domain logic: removing product %s from cart", product_id
+            )
+            remove_item_from_cart(cart, product, quantity)
 
+        self.cart_repo.bump_versions([cart.id])
         logger.debug("Committing transaction for remove_item")
         self.session.commit()
-        logger.info(f"Successfully committed remove_item for user {user_id}")
+        if self.leases and returned_to_lease:
+            self.leases.give_back(product_id, returned_to_lease)
+        logger.info("Successfully committed remove_item for user %s", user_id)
+
+    @retry_transaction("apply_batch")
+    def apply_batch(
+        self, user_id: str, operations: Sequence[CartBatchOperation]
+    ) -> list[CartBatchLineResult]:
+        """
+        Applies every operation in one transaction: either all lines succeed
+        and are committed together, or BatchOperationFailed is raised and
+        nothing is persisted.
+        """
+        if self.cart_shards:
+            return self._apply_on_cart_shard(self.cart_shards, user_id, operations)
+        product_ids = sorted({op.product_id for op in operations})
+
+        # 1. Lock the cart (created only if the batch adds something)
+        if any(op.action == "add" for op in operations):
+            cart = self._lock_or_create_cart(user_id, product_ids)
+        else:
+            logger.debug("Fetching/locking cart for user %s during batch", user_id)
+            cart = self._lock_cart(user_id, product_ids)
+            if not cart:
+                raise BatchOperationFailed(0, CartNotFound("Item not found in cart"))
+
+        # 2. Lock all products in ascending id order to avoid deadlocks
+        logger.debug("Locking products %s for batch", product_ids)
+        products = {
+            product.id: product
+            for product in self.product_repo.get_by_ids_with_lock(product_ids)
+        }
+
+        # 3. Apply the lines in request order
+        try:
+            results = self._apply_operations(user_id, cart, products, operations)
+        except BatchOperationFailed:
+            # Discard the lines already applied in this transaction
+            self.session.rollback()
+            raise
+
+        self.cart_repo.bump_versions([cart.id])
+        logger.debug("Committing transaction for apply_batch")
+        self.session.commit()
+        logger.info("Successfully committed apply_batch for user %s", user_id)
+        return results
+
+    def _apply_single_on_cart_shard(
+        self, cart_shards: CartShardRouter, user_id: str, op: CartBatchOperation
+    ):
+        try:
+            _ = self._apply_on_cart_shard(cart_shards, user_id, [op])
+        except BatchOperationFailed as e:
+            # Single-item calls raise the same errors as the other paths
+            raise e.error from None
+
+    def _apply_on_cart_shard(
+        self,
+        cart_shards: CartShardRouter,
+        user_id: str,
+        operations: Sequence[CartBatchOperation],
+    ) -> list[CartBatchLineResult]:
+        """
+        apply_batch for a cart stored on a shard database: the cart is
+        locked on its shard first, then the products on the primary, the
+        same order as the single-database paths. There is no transaction
+        spanning both databases, so the stock is committed first and the
+        cart second; if the cart commit fails, a compensating transaction
+        puts the stock back (a saga), and the error is raised.
+        """
+        product_ids = sorted({op.product_id for op in operations})
+        shard_session = cart_shards.session_for(user_id)
+        cart_repo = CartRepository(
+            shard_session, lock_nowait=self.cart_repo.lock_nowait
+        )
+        try:
+            # 1. Lock the cart on its shard (created only if the batch adds)
+            logger.debug("Locking cart of user %s on its shard", user_id)
+            cart = cart_repo.get_by_user_id_with_lock(user_id, product_ids)
+            if cart is None and any(op.action == "add" for op in operations):
+                cart_repo.create_if_not_exists(user_id)
+                cart = cart_repo.get_by_user_id_with_lock(user_id, product_ids)
+            if cart is None:
+                raise BatchOperationFailed(0, CartNotFound("Item not found in cart"))
+
+            # 2. Lock the products on the primary in ascending id order
+            products = {
+                product.id: product
+                for product in self.product_repo.get_by_ids_with_lock(product_ids)
+            }
+
+            # 3. Apply the lines, writing the cart side before committing
+            results = self._apply_operations(user_id, cart, products, operations)
+            cart_repo.bump_versions([cart.id])
+            shard_session.flush()
+        except BaseException:
+            self.session.rollback()
+            shard_session.close()
+            raise
+
+        # 4. Commit the stock, then the cart
+        taken: Counter[int] = Counter()
+        for result in results:
+            sign = 1 if result.action == "add" else -1
+            taken[result.product_id] += sign * result.quantity
+        try:
+            logger.debug("Committing stock for user %s on the primary", user_id)
+            self.session.commit()
+            try:
+                logger.debug("Committing cart of user %s on its shard", user_id)
+                shard_session.commit()
+            except BaseException:
+                self._compensate(taken)
+                raise
+        finally:
+            shard_session.close()
+        logger.info("Successfully committed cart changes for user %s", user_id)
+        return results
+
+    def _compensate(self, taken: Counter[int]) -> None:
+        """
+        Undoes the committed stock changes of a cart write whose shard
+        commit failed: units taken by adds go back to stock, and units
+        returned by removes (the cart still holds them) are taken back if
+        nobody has bought them in the meantime.
+        """
+        logger.warning("Cart shard commit failed, compensating stock: %s", taken)
+        self.session.rollback()
+        short: dict[int, int] = {}
+        try:
+            for product_id in sorted(taken):
+                quantity = taken[product_id]
+                sharded = self.sharded_stock and self.shard_repo.has_shards(product_id)
+                if quantity > 0 and sharded:
+                    _ = self.shard_repo.increase(product_id, quantity)
+                elif quantity > 0:
+                    self.product_repo.increase_stock(product_id, quantity)
+                elif quantity < 0 and sharded:
+                    if not self.shard_repo.try_decrease(product_id, -quantity):
+                        short[product_id] = -quantity
+                elif quantity < 0:
+                    remaining = self.product_repo.decrease_stock_if_available(
+                        product_id, -quantity
+                    )
+                    if remaining is None:
+                        short[product_id] = -quantity
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            CART_SHARD_COMPENSATIONS.labels("failed").inc()
+            logger.error(
+                "Failed to compensate stock after a cart shard failure: %s",
+                taken,
+                exc_info=True,
+            )
+            return
+        if short:
+            CART_SHARD_COMPENSATIONS.labels("short").inc()
+            logger.error(
+                "Cart shard failure: units returned to stock were sold before "
+                "they could be taken back: %s",
+                short,
+            )
+            return
+        CART_SHARD_COMPENSATIONS.labels("applied").inc()
+
+    def _apply_operations(
+        self,
+        user_id: str,
+        cart: Cart,
+        products: dict[int, Product],
+        operations: Sequence[CartBatchOperation],
+    ) -> list[CartBatchLineResult]:
+        """
+        Runs the batch lines through the domain services, in request order,
+        on a locked cart and locked products. Raises BatchOperationFailed at
+        the first failing line; the caller rolls back.
+        """
+        logger.info(
+            "Applying domain logic: %s batch operations for user %s",
+            len(operations),
+            user_id,
+        )
+        sharded = (
+            {pid for pid in products if self.shard_repo.has_shards(pid)}
+            if self.sharded_stock
+            else set()
+        )
+        results: list[CartBatchLineResult] = []
+        for index, op in enumerate(operations):
+            product = products.get(op.product_id)
+            try:
+                if product is None:
+                    raise ProductNotFound(f"Product {op.product_id} not found")
+                if op.product_id in sharded:
+                    applied = self._apply_sharded_line(cart, product, op)
+                elif op.action == "add":
+                    add_item_to_cart(cart, product, op.quantity)
+                    applied = op.quantity
+                else:
+                    applied = remove_item_from_cart(cart, product, op.quantity)
+            except (ProductNotFound, InsufficientStock, ItemNotFoundInCart) as e:
+                logger.warning(
+                    "Batch line %s failed for user %s: %r", index, user_id, e
+                )
+                raise BatchOperationFailed(index, e) from e
+
+            line = cart.get_item(op.product_id)
+            results.append(
+                CartBatchLineResult(
+                    product_id=op.product_id,
+                    action=op.action,
+                    quantity=applied,
+                    cart_quantity=line.quantity if line else 0,
+                )
+            )
+        return results
+
+    def _apply_sharded_line(
+        self, cart: Cart, product: Product, op: CartBatchOperation
+    ) -> int:
+        """Batch line for a sharded product: stock moves to/from its shards."""
+        if op.action == "add":
+            if not self.shard_repo.try_decrease(product.id, op.quantity):
+                raise InsufficientStock()
+            cart.add_item(product, op.quantity)
+            return op.quantity
+
+        applied = cart.remove_item(product, op.quantity)
+        _ = self.shard_repo.increase(product.id, applied)
+        return applied
+
+
+class AsyncCartService:
+    """
+    asyncio counterpart of CartService: same locking order and domain logic,
+    but lock waits suspend the coroutine instead of blocking a worker thread.
+    """
+
+    session: AsyncSession
+    cart_repo: AsyncCartRepository
+    product_repo: AsyncProductRepository
+    shard_repo: AsyncStockShardRepository
+    sharded_stock: bool
+    retry_policy: RetryPolicy | None
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        sharded_stock: bool = False,
+        lock_nowait: bool = False,
+        retry_policy: RetryPolicy | None = None,
+    ):
+        self.session = session
+        self.sharded_stock = sharded_stock
+        self.retry_policy = retry_policy
+        self.cart_repo = AsyncCartRepository(session, lock_nowait=lock_nowait)
+        self.product_repo = AsyncProductRepository(session, lock_nowait=lock_nowait)
+        self.shard_repo = AsyncStockShardRepository(session)
+
+    @retry_transaction("add_item")
+    async def add_item(self, user_id: str, product_id: int, quantity: int):
+        # 1. Optimistic Cart Fetch/Lock
+        logger.debug("Attempting to fetch/lock cart for user %s", user_id)
+        cart = await self.cart_repo.get_by_user_id_with_lock(user_id)
+
+        # If not found, create it (rare case)
+        if not cart:
+            logger.info("Cart not found for user %s. Creating new cart.", user_id)
+            await self.cart_repo.create_if_not_exists(user_id)
+            # Fetch again after creation
+            cart = await self.cart_repo.get_by_user_id_with_lock(user_id)
+
+        if not cart:
+            logger.error("Failed to retrieve or create cart for user %s", user_id)
+            raise CartNotFound("Failed to retrieve active cart")
+
+        taken = (
+            await self.shard_repo.try_decrease(product_id, quantity)
+            if self.sharded_stock
+            else None
+        )
+        if taken is not None:
+            # 2. Stock comes from a shard; the product row is not locked
+            logger.info("Took %s of product %s from a shard", quantity, product_id)
+            if not taken:
+                raise InsufficientStock()
+            product = await self.product_repo.get_by_id(product_id)
+            if not product:
+                raise ProductNotFound(f"Product {product_id} not found")
+            cart.add_item(product, quantity)
+        else:
+            # 2. Lock Product first (to ensure stock consistency)
+            logger.debug("Locking product %s for stock validation", product_id)
+            product = await self.product_repo.get_by_id_with_lock(product_id)
+
+            if not product:
+                logger.warning("Product %s not found during add_item", product_id)
+                raise ProductNotFound(f"Product {product_id} not found")
+
+            # 3. Use domain service
+            logger.info("Applying domain logic: adding product %s to cart", product_id)
+            add_item_to_cart(cart, product, quantity)
+        await self.cart_repo.bump_versions([cart.id])
+
+        logger.debug("Committing transaction for add_item")
+        await self.session.commit()
+        logger.info("Successfully committed add_item for user %s", user_id)
+
+    @retry_transaction("remove_item")
+    async def remove_item(self, user_id: str, product_id: int, quantity: int):
+        # 1. Fetch and Lock Cart
+        logger.debug("Fetching/locking cart for user %s during removal", user_id)
+        cart = await self.cart_repo.get_by_user_id_with_lock(user_id)
+
+        if not cart:
+            logger.warning(
+                "Attempted to remove item from non-existent cart for user %s", user_id
+            )
+            raise CartNotFound("Item not found in cart")
+
+        if self.sharded_stock and await self.shard_repo.has_shards(product_id):
+            # 2. Stock goes back to a shard; no product row lock
+            product = await self.product_repo.get_by_id(product_id)
+            if not product:
+                raise ProductNotFound(f"Product {product_id} not found")
+            logger.info("Removing product %s from cart", product_id)
+            returned = cart.remove_item(product, quantity)
+            _ = await self.shard_repo.increase(product_id, returned)
+        else:
+            # 2. Lock Product
+            logger.debug("Locking product %s during removal", product_id)
+            product = await self.product_repo.get_by_id_with_lock(product_id)
+
+            if not product:
+                logger.warning("Product %s not found during remove_item", product_id)
+                raise ProductNotFound(f"Product {product_id} not found")
+
+            # 3. Use domain service
+            logger.info(
+                "Applying domain logic: removing product %s from cart", product_id
+            )
+            remove_item_from_cart(cart, product, quantity)
+        await self.cart_repo.bump_versions([cart.id])
+
+        logger.debug("Committing transaction for remove_item")
+        await self.session.commit()
+        logger.info("Successfully committed remove_item for user %s", user_id)
@@ -0,0 +1,308 @@
+import bisect
+import hashlib
+import logging
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from src.shopping.models import cart_items_table, cart_shard_metadata, carts_table
+from src.shopping.repository import CartRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of user ids onto shard names. Every shard owns
+    `vnodes` points on the ring, so adding a shard to N others moves about
+    1/(N+1) of the keys, all of them to the new shard. Points depend only on
+    the names, so the mapping survives reordering the shard list.
+    """
+
+    names: tuple[str, ...]
+    _points: list[int]
+    _owners: list[str]
+
+    def __init__(self, names: Iterable[str], vnodes: int = 128):
+        self.names = tuple(sorted(set(names)))
+        if not self.names:
+            raise ValueError("A hash ring needs at least one shard")
+        ring = sorted(
+            (_hash(f"{name}#{vnode}"), name)
+            for name in self.names
+            for vnode in range(vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [name for _, name in ring]
+
+    def owner(self, key: str) -> str:
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+def parse_shard_urls(raw: str) -> dict[str, str]:
+    """Parses "name=url,name=url" into {name: url}."""
+    urls: dict[str, str] = {}
+    for entry in raw.split(","):
+        if not entry.strip():
+            continue
+        name, separator, url = entry.partition("=")
+        if not separator or not name.strip() or not url.strip():
+            raise ValueError(f"Expected name=url in CART_SHARD_URLS, got: {entry}")
+        urls[name.strip()] = url.strip()
+    return urls
+
+
+def check_cart_shard_settings(
+    database_async: bool,
+    stock_lease_products: bool,
+    coalesce_window_ms: float,
+    cart_line_ttl: float,
+) -> None:
+    """
+    Raises ValueError if features that only know the primary's cart tables
+    are enabled together with cart shards: they would split or skip carts.
+    """
+    conflicts = [
+        name
+        for name, enabled in (
+            ("DATABASE_ASYNC", database_async),
+            ("STOCK_LEASE_PRODUCTS", stock_lease_products),
+            ("CART_COALESCE_WINDOW_MS", coalesce_window_ms > 0),
+            ("CART_LINE_TTL", cart_line_ttl > 0),
+        )
+        if enabled
+    ]
+    if conflicts:
+        raise ValueError(
+            f"CART_SHARD_URLS cannot be combined with {', '.join(conflicts)}: "
+            "these only work on the primary's cart tables"
+        )
+
+
+class CartShardRouter:
+    """
+    Routes each user's cart to one of several databases by consistent hash
+    of the user id. Every shard holds the carts and cart_items tables (see
+    cart_shard_metadata); products and their stock stay on the primary.
+    CartRepository works unchanged on a shard session.
+    """
+
+    ring: HashRing
+    engines: dict[str, Engine]
+    _sessions: dict[str, sessionmaker[Session]]
+
+    def __init__(self, engines: Mapping[str, Engine], vnodes: int = 128):
+        self.ring = HashRing(engines, vnodes=vnodes)
+        self.engines = dict(engines)
+        self._sessions = {
+            name: sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for name, engine in self.engines.items()
+        }
+
+    def shard_for(self, user_id: str) -> str:
+        return self.ring.owner(user_id)
+
+    def session(self, name: str) -> Session:
+        return self._sessions[name]()
+
+    def session_for(self, user_id: str) -> Session:
+        return self.session(self.shard_for(user_id))
+
+    def create_tables(self) -> None:
+        for engine in self.engines.values():
+            cart_shard_metadata.create_all(bind=engine)
+
+
+@dataclass
+class RebalanceResult:
+    scanned: int = 0
+    moved: int = 0
+    # Moved carts whose user already had a cart on the target shard
+    merged: int = 0
+
+
+def rebalance(
+    router: CartShardRouter,
+    batch_size: int = 500,
+    sources: Mapping[str, Engine] | None = None,
+) -> RebalanceResult:
+    """
+    Moves every cart stored on a database other than the shard the ring
+    assigns it to. The ring's shards are always scanned; `sources` adds
+    databases outside the ring whose carts all move: shards removed from the
+    list, or the primary when carts are first sharded. Deploy the new shard
+    list first: new writes then go to the new owner, and a cart written
+    there meanwhile is merged with the moved one (quantities added up).
+
+    Each cart's lines move in two transactions, committed target first: if
+    the source commit then fails, the cart is on both databases and the
+    error names the user, so it can be deleted from the source by hand.
+    Stock is not involved: it stays on the primary, held by the moved lines.
+    See _move_cart for what requests see while a cart moves.
+    """
+    sources = dict(sources or {})
+    overlap = set(sources) & set(router.engines)
+    if overlap:
+        raise ValueError(f"Sources already in the shard list: {sorted(overlap)}")
+    engines = {**router.engines, **sources}
+    sessions = {
+        name: sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        for name, engine in engines.items()
+    }
+
+    result = RebalanceResult()
+    # Carts created after the scan starts were placed by the current ring
+    # (written through it, or moved here), so each database is scanned up to
+    # its last cart id at the start.
+    last_ids: dict[str, int] = {}
+    for name, engine in engines.items():
+        with engine.connect() as connection:
+            last_ids[name] = connection.execute(
+                select(func.coalesce(func.max(carts_table.c.id), 0))
+            ).scalar_one()
+
+    for name in engines:
+        after_id = 0
+        while True:
+            session = sessions[name]()
+            try:
+                rows = session.execute(
+                    select(carts_table.c.id, carts_table.c.user_id)
+                    .where(carts_table.c.id > after_id)
+                    .where(carts_table.c.id <= last_ids[name])
+                    .order_by(carts_table.c.id)
+                    .limit(batch_size)
+                ).all()
+            finally:
+                session.close()
+            if not rows:
+                break
+            after_id = rows[-1].id
+            result.scanned += len(rows)
+
+            for row in rows:
+                owner = router.shard_for(row.user_id)
+                if owner != name:
+                    merged = _move_cart(
+                        router, row.user_id, sessions[name](), name, owner
+                    )
+                    result.moved += 1
+                    result.merged += merged
+
+    logger.info(
+        "Rebalanced carts: %s scanned, %s moved (%s merged)",
+        result.scanned,
+        result.moved,
+        result.merged,
+    )
+    return result
+
+
+def _move_cart(
+    router: CartShardRouter, user_id: str, src: Session, source: str, target: str
+) -> bool:
+    """
+    Moves the user's cart from `source` (whose session is `src`, closed
+    here) to `target`; True if merged.
+
+    The target cart row is created and committed first, then locked for the
+    whole move: requests routed by the new ring lock that row before
+    reading the lines, so they wait for the move instead of missing the
+    cart. Only GET /cart, which does not lock, can see the target cart
+    without its lines while a move is in progress.
+    """
+    dst = router.session(target)
+    try:
+        src_repo = CartRepository(src)
+        dst_repo = CartRepository(dst)
+        if src_repo.get_version_by_user_id(user_id) is None:
+            return False
+
+        # 1. Make the cart row exist on the target, then lock it
+        merged = dst_repo.get_version_by_user_id(user_id) is not None
+        if not merged:
+            dst_repo.create_if_not_exists(user_id)
+            dst.commit()
+        dst_cart_id = dst_repo.get_id_by_user_id_with_lock(user_id)
+        if dst_cart_id is None:
+            raise RuntimeError(f"Cart of user {user_id} vanished from shard {target}")
+
+        # 2. Lock the cart on the source and read it whole
+        src_cart = src.execute(
+            select(carts_table.c.id, carts_table.c.version)
+            .where(carts_table.c.user_id == user_id)
+            .with_for_update()
+        ).first()
+        if src_cart is None:
+            return False
+        lines = src.execute(
+            select(
+                cart_items_table.c.product_id,
+                cart_items_table.c.quantity,
+                cart_items_table.c.updated_at,
+            ).where(cart_items_table.c.cart_id == src_cart.id)
+        ).all()
+
+        # 3. Merge the lines into the target cart
+        _copy_lines(dst, dst_cart_id, lines)
+        # Past both versions, so no cached snapshot of either cart validates
+        _ = dst.execute(
+            update(carts_table)
+            .where(carts_table.c.id == dst_cart_id)
+            .values(version=func.greatest(carts_table.c.version, src_cart.version) + 1)
+        )
+
+        # 4. Remove it from the source
+        _ = src.execute(
+            delete(cart_items_table).where(cart_items_table.c.cart_id == src_cart.id)
+        )
+        _ = src.execute(delete(carts_table).where(carts_table.c.id == src_cart.id))
+
+        dst.commit()
+        try:
+            src.commit()
+        except Exception:
+            logger.error(
+                "Cart of user %s was copied to shard %s but not deleted from %s; "
+                "delete it there by hand",
+                user_id,
+                target,
+                source,
+            )
+            raise
+        logger.debug("Moved cart of user %s from %s to %s", user_id, source, target)
+        return merged
+    finally:
+        src.close()
+        dst.close()
+
+
+def _copy_lines(dst: Session, cart_id: int, lines: Sequence[Row[Any]]) -> None:
+    """Adds `lines` to the cart, summing quantities of lines it already has."""
+    for line in lines:
+        stmt = pg_insert(cart_items_table).values(
+            cart_id=cart_id,
+            product_id=line.product_id,
+            quantity=line.quantity,
+            updated_at=line.updated_at,
+        )
+        _ = dst.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_cart_product",
+                set_={
+                    "quantity": cart_items_table.c.quantity + stmt.excluded.quantity,
+                    "updated_at": func.greatest(
+                        cart_items_table.c.updated_at, stmt.excluded.updated_at
+                    ),
+                },
+            )
+        )
@@ -0,0 +1,153 @@
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from sqlalchemy.orm import Session
+from src.metrics import CART_LINES_SWEPT, CART_UNITS_RELEASED
+from src.shopping.domain import Cart, Product, remove_item_from_cart
+from src.shopping.repository import (
+    CartRepository,
+    ProductRepository,
+    StockShardRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepResult:
+    lines: int = 0
+    units: int = 0
+    carts: int = 0
+    # Lines whose product or shards were busy; left for the next sweep
+    deferred_lines: int = 0
+
+    def add(self, other: "SweepResult") -> None:
+        self.lines += other.lines
+        self.units += other.units
+        self.carts += other.carts
+        self.deferred_lines += other.deferred_lines
+
+
+class AbandonedCartSweeper:
+    """
+    Releases the stock held by cart lines nobody has written to for
+    `max_age` seconds: the line is removed and its quantity goes back to the
+    product (or one of its shards) through the same domain logic as
+    CartService.remove_item.
+
+    The sweeper never waits for a lock held by live traffic. Carts are
+    locked with FOR UPDATE SKIP LOCKED (every cart write locks the cart row
+    first, so a cart in use is simply skipped), and so are the product rows
+    and shards the stock goes back to; lines whose stock row is busy are
+    left for the next sweep. Several workers may sweep at the same time.
+    Units of leased products go back to products.stock, where the leases
+    take them from.
+    """
+
+    max_age: timedelta
+    batch_size: int
+    _session_factory: Callable[[], Session]
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_age: float,
+        batch_size: int = 100,
+    ):
+        self.max_age = timedelta(seconds=max_age)
+        self.batch_size = batch_size
+        self._session_factory = session_factory
+
+    def sweep(self) -> SweepResult:
+        """One pass over every cart with expired lines, a batch per transaction."""
+        result = SweepResult()
+        after_id = 0
+        while True:
+            session = self._session_factory()
+            try:
+                cart_ids = CartRepository(session).get_ids_with_lines_older_than(
+                    self.max_age, after_id, self.batch_size
+                )
+                if not cart_ids:
+                    break
+                batch = self._sweep_batch(session, cart_ids)
+                session.commit()
+            except BaseException:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+            result.add(batch)
+            CART_LINES_SWEPT.inc(batch.lines)
+            CART_UNITS_RELEASED.inc(batch.units)
+            if len(cart_ids) < self.batch_size:
+                break
+            after_id = cart_ids[-1]
+
+        if result.lines or result.deferred_lines:
+            logger.info(
+                "Swept %s abandoned lines from %s carts (%s units released, "
+                "%s lines deferred)",
+                result.lines,
+                result.carts,
+                result.units,
+                result.deferred_lines,
+            )
+        return result
+
+    def _sweep_batch(self, session: Session, cart_ids: list[int]) -> SweepResult:
+        cart_repo = CartRepository(session)
+        product_repo = ProductRepository(session)
+        shard_repo = StockShardRepository(session)
+
+        # 1. Lock the carts nobody is using; the others are skipped
+        carts = {cart.id: cart for cart in cart_repo.get_by_ids_skip_locked(cart_ids)}
+        result = SweepResult()
+        if not carts:
+            return result
+        # Re-read under the cart locks: a request may have touched a line
+        expired = cart_repo.get_lines_older_than(list(carts), self.max_age)
+        product_ids = sorted({product_id for _, product_id in expired})
+
+        # 2. Lock the products the stock goes back to, skipping busy ones.
+        # Sharded products take it on a shard instead of the product row.
+        sharded = shard_repo.total_stock_by_product(product_ids)
+        products: dict[int, Product] = {
+            product.id: product
+            for product in product_repo.get_by_ids_skip_locked(
+                [pid for pid in product_ids if pid not in sharded]
+            )
+        }
+
+        # 3. Remove the lines and return their quantity
+        changed: set[int] = set()
+        for cart_id, product_id in expired:
+            cart: Cart = carts[cart_id]
+            item = cart.get_item(product_id)
+            if item is None:
+                continue
+            quantity = item.quantity
+            if product_id in sharded:
+                product = product_repo.get_by_id(product_id)
+                if product is None or not shard_repo.increase(
+                    product_id, quantity, wait=False
+                ):
+                    result.deferred_lines += 1
+                    continue
+                _ = cart.remove_item(product, quantity)
+            elif product_id in products:
+                quantity = remove_item_from_cart(cart, products[product_id], quantity)
+            else:
+                result.deferred_lines += 1
+                continue
+
+            changed.add(cart_id)
+            result.lines += 1
+            result.units += quantity
+
+        if changed:
+            cart_repo.bump_versions(changed)
+            result.carts = len(changed)
+        return result
@@ -0,0 +1,64 @@
+import sys
+import time
+import logging
+import argparse
+from src.database import SessionLocal
+from src.shopping.config import CART_LINE_TTL, CART_SWEEP_BATCH, CART_SWEEP_INTERVAL
+from src.shopping.sweeper import AbandonedCartSweeper
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.sweep_carts",
+        description="Remove abandoned cart lines and return their stock. "
+        "Safe to run next to the API workers: busy carts and products are "
+        "skipped, never waited for.",
+    )
+    _ = parser.add_argument(
+        "--max-age",
+        type=float,
+        default=CART_LINE_TTL,
+        help="Seconds since a line was last written (default: CART_LINE_TTL)",
+    )
+    _ = parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=CART_SWEEP_BATCH,
+        help="Carts per transaction",
+    )
+    _ = parser.add_argument(
+        "--interval",
+        type=float,
+        default=0,
+        help=f"Sweep every this many seconds instead of once "
+        f"(e.g. {CART_SWEEP_INTERVAL:g})",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.max_age <= 0:
+        logger.error("Set --max-age or CART_LINE_TTL to a positive number of seconds")
+        return 1
+
+    sweeper = AbandonedCartSweeper(
+        SessionLocal, args.max_age, batch_size=args.batch_size
+    )
+    while True:
+        result = sweeper.sweep()
+        print(
+            f"{result.lines} lines removed from {result.carts} carts, "
+            f"{result.units} units released, {result.deferred_lines} deferred"
+        )
+        if args.interval <= 0:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import threading
+import concurrent.futures
+import pytest
+from prometheus_client import REGISTRY
+from src.shopping.coalescer import AddItemCoalescer
+from src.shopping.domain import CartItem, InsufficientStock, Product
+from src.shopping.service import CartService, ProductNotFound
+
+
+def batch_count() -> float:
+    return REGISTRY.get_sample_value("cart_add_item_batch_size_count") or 0
+
+
+def run_concurrently(job, count: int) -> list[concurrent.futures.Future[None]]:
+    start = threading.Barrier(count)
+
+    def synchronized(index: int) -> None:
+        _ = start.wait()
+        job(index)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(synchronized, index) for index in range(count)]
+        concurrent.futures.wait(futures)
+    return futures
+
+
+def test_concurrent_adds_are_committed_in_few_transactions(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    coalescer = AddItemCoalescer(session_factory, window=0.05)
+    batches_before = batch_count()
+
+    futures = run_concurrently(
+        lambda index: coalescer.add_item(f"user-{index}", 1, 2), 20
+    )
+
+    for future in futures:
+        future.result()
+    assert product_stock(1) == 60
+    assert db_session.query(CartItem).count() == 20
+    assert batch_count() - batches_before < 20
+
+
+def test_insufficient_stock_fails_only_requests_that_do_not_fit(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=5))
+    db_session.commit()
+    coalescer = AddItemCoalescer(session_factory, window=0.05)
+
+    futures = run_concurrently(
+        lambda index: coalescer.add_item(f"user-{index}", 1, 1), 8
+    )
+
+    failures = [f for f in futures if isinstance(f.exception(), InsufficientStock)]
+    assert len(failures) == 3
+    assert product_stock(1) == 0
+    assert db_session.query(CartItem).count() == 5
+
+
+def test_same_user_twice_in_one_batch_accumulates(db_session, session_factory):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    coalescer = AddItemCoalescer(session_factory, window=0.05)
+
+    futures = run_concurrently(lambda _index: coalescer.add_item("user-1", 1, 2), 3)
+
+    for future in futures:
+        future.result()
+    item = db_session.query(CartItem).one()
+    assert item.quantity == 6
+
+
+def test_full_batch_is_applied_without_waiting_for_the_window(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    coalescer = AddItemCoalescer(session_factory, window=60.0, max_batch=1)
+
+    coalescer.add_item("user-1", 1, 1)
+
+    assert product_stock(1) == 9
+
+
+def test_service_maps_missing_product_to_product_not_found(db_session, session_factory):
+    coalescer = AddItemCoalescer(session_factory, window=0.001)
+    service = CartService(db_session, coalescer=coalescer)
+
+    with pytest.raises(ProductNotFound):
+        service.add_item("user-1", 404, 1)
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from src.shopping.repository import StockShardRepository
+from src.shopping.service import AsyncCartService, ProductNotFound
+from src.shopping.domain import Cart, InsufficientStock, Product
+
+
+@pytest.mark.asyncio
+async def test_async_cart_service_add_item_concurrency(
+    db_session, async_session_factory, mock_user
+):
+    """
+    Concurrent coroutines on one event loop serialize on the row locks without
+    losing updates.
+    """
+    product_id = 888
+    initial_stock = 100
+    num_requests = 20
+    db_session.add(Product(id=product_id, stock=initial_stock))
+    db_session.commit()
+
+    async def add_item_job():
+        async with async_session_factory() as session:
+            await AsyncCartService(session).add_item(mock_user.id, product_id, 1)
+
+    await asyncio.gather(*(add_item_job() for _ in range(num_requests)))
+
+    product = db_session.query(Product).filter(Product.id == product_id).one()
+    db_session.refresh(product)
+    assert product.stock == initial_stock - num_requests
+
+    cart = db_session.query(Cart).filter(Cart.user_id == mock_user.id).one()
+    cart_item = next(item for item in cart.items if item.product_id == product_id)
+    assert cart_item.quantity == num_requests
+
+
+@pytest.mark.asyncio
+async def test_async_cart_service_add_then_remove(
+    db_session, async_session_factory, mock_user
+):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+
+    async with async_session_factory() as session:
+        service = AsyncCartService(session)
+        await service.add_item(mock_user.id, 1, 4)
+        await service.remove_item(mock_user.id, 1, 3)
+
+    product = db_session.query(Product).filter(Product.id == 1).one()
+    assert product.stock == 9
+    cart = db_session.query(Cart).filter(Cart.user_id == mock_user.id).one()
+    assert cart.items[0].quantity == 1
+
+
+@pytest.mark.asyncio
+async def test_async_cart_service_errors_roll_back(
+    db_session, async_session_factory, mock_user
+):
+    db_session.add(Product(id=1, stock=1))
+    db_session.commit()
+
+    async with async_session_factory() as session:
+        service = AsyncCartService(session)
+        with pytest.raises(InsufficientStock):
+            await service.add_item(mock_user.id, 1, 5)
+        await session.rollback()
+        with pytest.raises(ProductNotFound):
+            await service.add_item(mock_user.id, 999, 1)
+
+    assert db_session.query(Cart).filter(Cart.user_id == mock_user.id).first() is None
+
+
+@pytest.mark.asyncio
+async def test_async_cart_service_sharded_stock(
+    db_session, async_session_factory, mock_user
+):
+    """Adds take from the shards and removes give back to them, not products.stock."""
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    StockShardRepository(db_session).split(1, 4)
+    db_session.commit()
+
+    async with async_session_factory() as session:
+        service = AsyncCartService(session, sharded_stock=True)
+        await service.add_item(mock_user.id, 1, 6)
+        await service.remove_item(mock_user.id, 1, 2)
+        with pytest.raises(InsufficientStock):
+            await service.add_item(mock_user.id, 1, 7)
+        await session.rollback()
+
+    db_session.expire_all()
+    assert StockShardRepository(db_session).total_stock(1) == 6
+    product = db_session.query(Product).filter(Product.id == 1).one()
+    assert product.stock == 0
+    cart = db_session.query(Cart).filter(Cart.user_id == mock_user.id).one()
+    assert cart.items[0].quantity == 4
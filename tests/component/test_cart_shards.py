@@ -0,0 +1,361 @@
+import threading
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.engine import make_url
+from src.shopping.cache import CartCache
+from src.shopping.domain import InsufficientStock, Product
+from src.shopping.models import cart_items_table, cart_shard_metadata, carts_table
+from src.shopping.schemas import CartBatchOperation
+from src.shopping.service import CartNotFound, CartService
+from src.shopping import sharding
+from src.shopping.sharding import CartShardRouter, rebalance
+
+SHARD_NAMES = ["shard-a", "shard-b", "shard-c"]
+
+
+@pytest.fixture(scope="module")
+def shard_engines(test_engine):
+    """One scratch database per cart shard, next to the test database."""
+    databases = {
+        name: f"{test_engine.url.database}_{name.replace('-', '_')}"
+        for name in SHARD_NAMES
+    }
+    with test_engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        for database in databases.values():
+            _ = connection.execute(text(f"DROP DATABASE IF EXISTS {database}"))
+            _ = connection.execute(text(f"CREATE DATABASE {database}"))
+    engines = {
+        name: create_engine(make_url(test_engine.url).set(database=database))
+        for name, database in databases.items()
+    }
+    for engine in engines.values():
+        cart_shard_metadata.create_all(bind=engine)
+
+    yield engines
+
+    for engine in engines.values():
+        engine.dispose()
+    with test_engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        for database in databases.values():
+            _ = connection.execute(text(f"DROP DATABASE IF EXISTS {database}"))
+
+
+@pytest.fixture
+def shard_engines_clean(shard_engines, db_session):
+    yield shard_engines
+    for engine in shard_engines.values():
+        with engine.begin() as connection:
+            for table in reversed(cart_shard_metadata.sorted_tables):
+                _ = connection.execute(table.delete())
+
+
+@pytest.fixture
+def router(shard_engines_clean):
+    return CartShardRouter(
+        {name: shard_engines_clean[name] for name in SHARD_NAMES[:2]}
+    )
+
+
+def stored_carts(engines, user_id: str) -> dict[str, dict[int, int]]:
+    """The user's cart lines on every shard that has a cart for them."""
+    found = {}
+    for name, engine in engines.items():
+        with engine.connect() as connection:
+            cart_id = connection.execute(
+                select(carts_table.c.id).where(carts_table.c.user_id == user_id)
+            ).scalar_one_or_none()
+            if cart_id is None:
+                continue
+            rows = connection.execute(
+                select(
+                    cart_items_table.c.product_id, cart_items_table.c.quantity
+                ).where(cart_items_table.c.cart_id == cart_id)
+            ).all()
+        found[name] = {row.product_id: row.quantity for row in rows}
+    return found
+
+
+def test_carts_are_written_to_their_shard(
+    db_session, router, shard_engines_clean, product_stock
+):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=10)])
+    db_session.commit()
+    service = CartService(db_session, cart_shards=router)
+
+    service.add_item("user-1", 1, 3)
+    service.add_item("user-1", 2, 2)
+    service.remove_item("user-1", 1, 1)
+
+    owner = router.shard_for("user-1")
+    assert stored_carts(shard_engines_clean, "user-1") == {owner: {1: 2, 2: 2}}
+    assert product_stock(1) == 8
+    assert product_stock(2) == 8
+    # Nothing is written to the cart tables of the primary
+    assert db_session.execute(select(carts_table.c.id)).first() is None
+
+
+def test_users_are_spread_over_the_shards(db_session, router, shard_engines_clean):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    service = CartService(db_session, cart_shards=router)
+
+    for index in range(20):
+        service.add_item(f"user-{index}", 1, 1)
+
+    owners = {router.shard_for(f"user-{index}") for index in range(20)}
+    assert owners == set(router.ring.names)
+    for index in range(20):
+        user_id = f"user-{index}"
+        assert list(stored_carts(shard_engines_clean, user_id)) == [
+            router.shard_for(user_id)
+        ]
+
+
+def test_get_cart_reads_from_the_shard(db_session, router):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    service = CartService(db_session, cart_cache=CartCache(), cart_shards=router)
+    assert service.get_cart("user-1") is None
+
+    service.add_item("user-1", 1, 2)
+    first = service.get_cart("user-1")
+    service.add_item("user-1", 1, 1)
+    second = service.get_cart("user-1")
+
+    assert first is not None and first.lines == ((1, 2),)
+    assert second is not None and second.lines == ((1, 3),)
+    assert second.version > first.version
+
+
+def test_failed_lines_roll_back_both_databases(
+    db_session, router, shard_engines_clean, product_stock
+):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=1)])
+    db_session.commit()
+    service = CartService(db_session, cart_shards=router)
+    service.add_item("user-1", 1, 1)
+
+    with pytest.raises(InsufficientStock):
+        service.add_item("user-1", 2, 5)
+    with pytest.raises(CartNotFound):
+        service.remove_item("user-2", 1, 1)
+
+    assert stored_carts(shard_engines_clean, "user-1") == {
+        router.shard_for("user-1"): {1: 1}
+    }
+    assert stored_carts(shard_engines_clean, "user-2") == {}
+    assert product_stock(2) == 1
+
+
+def test_batches_apply_on_the_shard(
+    db_session, router, shard_engines_clean, product_stock
+):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=10)])
+    db_session.commit()
+    service = CartService(db_session, cart_shards=router)
+
+    results = service.apply_batch(
+        "user-1",
+        [
+            CartBatchOperation(action="add", product_id=2, quantity=4),
+            CartBatchOperation(action="add", product_id=1, quantity=3),
+            CartBatchOperation(action="remove", product_id=2, quantity=1),
+        ],
+    )
+
+    assert [result.cart_quantity for result in results] == [4, 3, 3]
+    assert stored_carts(shard_engines_clean, "user-1") == {
+        router.shard_for("user-1"): {1: 3, 2: 3}
+    }
+    assert product_stock(1) == 7
+    assert product_stock(2) == 7
+
+
+def test_stock_is_compensated_when_the_shard_commit_fails(
+    db_session, router, shard_engines_clean, monkeypatch, product_stock
+):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=10)])
+    db_session.commit()
+    service = CartService(db_session, cart_shards=router)
+    service.add_item("user-1", 2, 4)
+
+    session_for = router.session_for
+
+    def failing_session_for(user_id: str):
+        session = session_for(user_id)
+
+        def commit():
+            raise RuntimeError("shard went away")
+
+        session.commit = commit  # type: ignore[method-assign]
+        return session
+
+    monkeypatch.setattr(router, "session_for", failing_session_for)
+    with pytest.raises(RuntimeError):
+        _ = service.apply_batch(
+            "user-1",
+            [
+                CartBatchOperation(action="add", product_id=1, quantity=3),
+                CartBatchOperation(action="remove", product_id=2, quantity=1),
+            ],
+        )
+
+    # The cart is unchanged, and so is the stock
+    assert stored_carts(shard_engines_clean, "user-1") == {
+        router.shard_for("user-1"): {2: 4}
+    }
+    assert product_stock(1) == 10
+    assert product_stock(2) == 6
+
+
+def test_rebalance_moves_carts_to_a_new_shard(
+    db_session, shard_engines_clean, product_stock
+):
+    db_session.add_all([Product(id=1, stock=1000), Product(id=2, stock=1000)])
+    db_session.commit()
+    before = CartShardRouter(
+        {name: shard_engines_clean[name] for name in SHARD_NAMES[:2]}
+    )
+    after = CartShardRouter(shard_engines_clean)
+    users = [f"user-{index}" for index in range(30)]
+    for user_id in users:
+        CartService(db_session, cart_shards=before).add_item(user_id, 1, 1)
+    moving = [u for u in users if after.shard_for(u) != before.shard_for(u)]
+    assert moving and all(after.shard_for(u) == "shard-c" for u in moving)
+    # Written through the new shard list before the rebalance ran
+    CartService(db_session, cart_shards=after).add_item(moving[0], 2, 2)
+
+    result = rebalance(after, batch_size=7)
+
+    # Every cart, plus the one written to shard-c, is looked at once
+    assert (result.scanned, result.moved, result.merged) == (
+        len(users) + 1,
+        len(moving),
+        1,
+    )
+    for user_id in users:
+        expected = {1: 1, 2: 2} if user_id == moving[0] else {1: 1}
+        assert stored_carts(shard_engines_clean, user_id) == {
+            after.shard_for(user_id): expected
+        }
+    assert rebalance(after).moved == 0
+    # The moved carts keep working on their new shard
+    CartService(db_session, cart_shards=after).remove_item(moving[1], 1, 1)
+    assert stored_carts(shard_engines_clean, moving[1]) == {"shard-c": {}}
+    assert product_stock(1) == 1000 - len(users) + 1
+
+
+def test_rebalance_drains_a_removed_shard(
+    db_session, shard_engines_clean, product_stock
+):
+    db_session.add(Product(id=1, stock=1000))
+    db_session.commit()
+    before = CartShardRouter(shard_engines_clean)
+    after = CartShardRouter(
+        {name: shard_engines_clean[name] for name in SHARD_NAMES[:2]}
+    )
+    users = [f"user-{index}" for index in range(30)]
+    for user_id in users:
+        CartService(db_session, cart_shards=before).add_item(user_id, 1, 2)
+    removed = [u for u in users if before.shard_for(u) == "shard-c"]
+    assert removed
+
+    result = rebalance(
+        after, batch_size=7, sources={"shard-c": shard_engines_clean["shard-c"]}
+    )
+
+    assert (result.scanned, result.moved) == (len(users), len(removed))
+    for user_id in users:
+        assert stored_carts(shard_engines_clean, user_id) == {
+            after.shard_for(user_id): {1: 2}
+        }
+    # The moved lines still hold their stock, and can give it back
+    CartService(db_session, cart_shards=after).remove_item(removed[0], 1, 2)
+    assert product_stock(1) == 1000 - 2 * len(users) + 2
+
+
+def test_rebalance_moves_carts_off_the_primary(
+    db_session, test_engine, router, shard_engines_clean, product_stock
+):
+    db_session.add_all([Product(id=1, stock=100), Product(id=2, stock=100)])
+    db_session.commit()
+    users = [f"user-{index}" for index in range(10)]
+    for user_id in users:
+        CartService(db_session).add_item(user_id, 1, 1)
+    CartService(db_session).add_item(users[0], 2, 3)
+
+    result = rebalance(router, sources={"primary": test_engine})
+
+    assert result.moved == len(users)
+    for user_id in users:
+        expected = {1: 1, 2: 3} if user_id == users[0] else {1: 1}
+        assert stored_carts(shard_engines_clean, user_id) == {
+            router.shard_for(user_id): expected
+        }
+    assert db_session.execute(select(carts_table.c.id)).first() is None
+    assert db_session.execute(select(cart_items_table.c.id)).first() is None
+    assert (product_stock(1), product_stock(2)) == (90, 97)
+
+
+def test_rebalance_sources_must_be_outside_the_ring(router, shard_engines_clean):
+    with pytest.raises(ValueError):
+        _ = rebalance(router, sources={"shard-a": shard_engines_clean["shard-a"]})
+
+
+def test_requests_wait_for_a_cart_being_moved(
+    db_session, shard_engines_clean, monkeypatch, product_stock, session_factory
+):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    before = CartShardRouter(
+        {name: shard_engines_clean[name] for name in SHARD_NAMES[:2]}
+    )
+    after = CartShardRouter(shard_engines_clean)
+    user_id = next(
+        f"user-{index}"
+        for index in range(100)
+        if after.shard_for(f"user-{index}") != before.shard_for(f"user-{index}")
+    )
+    CartService(db_session, cart_shards=before).add_item(user_id, 1, 3)
+
+    copied, finish = threading.Event(), threading.Event()
+    copy_lines = sharding._copy_lines
+
+    def paused_copy_lines(*args):
+        copy_lines(*args)
+        copied.set()
+        assert finish.wait(5)
+
+    monkeypatch.setattr(sharding, "_copy_lines", paused_copy_lines)
+    mover = threading.Thread(target=rebalance, args=(after,))
+    mover.start()
+    assert copied.wait(5)
+
+    # Routed by the new ring while the move holds the target cart
+    outcome: list[object] = []
+
+    def remove():
+        session = session_factory()
+        try:
+            CartService(session, cart_shards=after).remove_item(user_id, 1, 1)
+            outcome.append("removed")
+        except Exception as e:
+            outcome.append(e)
+        finally:
+            session.close()
+
+    remover = threading.Thread(target=remove)
+    remover.start()
+    remover.join(0.3)
+    assert remover.is_alive() and not outcome
+
+    finish.set()
+    mover.join(5)
+    remover.join(5)
+    assert outcome == ["removed"]
+    assert stored_carts(shard_engines_clean, user_id) == {"shard-c": {1: 2}}
+    assert product_stock(1) == 98
@@ -0,0 +1,161 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import func, select, text, update
+from src import main
+from src.shopping.domain import Cart, Product
+from src.shopping.models import cart_items_table, carts_table
+from src.shopping.repository import StockShardRepository
+from src.shopping.service import CartService
+from src.shopping.sweeper import AbandonedCartSweeper
+
+
+def cart_lines(db_session, user_id: str) -> dict[int, int]:
+    db_session.expire_all()
+    cart = db_session.query(Cart).filter(Cart.user_id == user_id).one()
+    return {item.product_id: item.quantity for item in cart.items}
+
+
+def age_lines(db_session, user_id: str, seconds: int, product_id: int | None = None):
+    """Backdates the user's cart lines (or one of them) by `seconds`."""
+    cart_id = select(carts_table.c.id).where(carts_table.c.user_id == user_id)
+    stmt = (
+        update(cart_items_table)
+        .where(cart_items_table.c.cart_id == cart_id.scalar_subquery())
+        .values(updated_at=func.now() - text(f"interval '{seconds} seconds'"))
+    )
+    if product_id is not None:
+        stmt = stmt.where(cart_items_table.c.product_id == product_id)
+    _ = db_session.execute(stmt)
+    db_session.commit()
+
+
+def test_expired_lines_go_back_to_stock(db_session, session_factory, product_stock):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=10)])
+    db_session.commit()
+    service = CartService(db_session)
+    service.add_item("user-1", 1, 3)
+    service.add_item("user-1", 2, 4)
+    version = db_session.query(Cart).filter(Cart.user_id == "user-1").one().version
+    age_lines(db_session, "user-1", 3600, product_id=1)
+
+    result = AbandonedCartSweeper(session_factory, max_age=600).sweep()
+
+    assert (result.lines, result.units, result.carts) == (1, 3, 1)
+    assert cart_lines(db_session, "user-1") == {2: 4}
+    assert product_stock(1) == 10
+    assert product_stock(2) == 6
+    cart = db_session.query(Cart).filter(Cart.user_id == "user-1").one()
+    assert cart.version == version + 1
+
+
+def test_writes_to_a_line_keep_it_alive(db_session, session_factory):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    orm = CartService(db_session)
+    fast = CartService(db_session, fast_path=True)
+    orm.add_item("orm-user", 1, 1)
+    fast.add_item("fast-user", 1, 1)
+    age_lines(db_session, "orm-user", 3600)
+    age_lines(db_session, "fast-user", 3600)
+
+    # ORM updates touch the line through onupdate, upserts explicitly
+    orm.add_item("orm-user", 1, 1)
+    fast.add_item("fast-user", 1, 1)
+    result = AbandonedCartSweeper(session_factory, max_age=600).sweep()
+
+    assert result.lines == 0
+    assert cart_lines(db_session, "orm-user") == {1: 2}
+    assert cart_lines(db_session, "fast-user") == {1: 2}
+
+
+def test_carts_in_use_are_skipped_not_waited_for(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    CartService(db_session).add_item("user-1", 1, 2)
+    age_lines(db_session, "user-1", 3600)
+    sweeper = AbandonedCartSweeper(session_factory, max_age=600)
+
+    live = session_factory()
+    try:
+        _ = live.execute(
+            select(carts_table.c.id)
+            .where(carts_table.c.user_id == "user-1")
+            .with_for_update()
+        )
+        start = time.perf_counter()
+        busy = sweeper.sweep()
+        elapsed = time.perf_counter() - start
+    finally:
+        live.rollback()
+        live.close()
+    idle = sweeper.sweep()
+
+    assert busy.lines == 0
+    assert elapsed < 1.0
+    assert idle.lines == 1
+    assert product_stock(1) == 10
+
+
+def test_lines_of_busy_products_are_deferred(db_session, session_factory):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    CartService(db_session).add_item("user-1", 1, 2)
+    age_lines(db_session, "user-1", 3600)
+    sweeper = AbandonedCartSweeper(session_factory, max_age=600)
+
+    live = session_factory()
+    try:
+        _ = live.execute(text("SELECT id FROM products WHERE id = 1 FOR UPDATE"))
+        busy = sweeper.sweep()
+    finally:
+        live.rollback()
+        live.close()
+
+    assert (busy.lines, busy.deferred_lines) == (0, 1)
+    assert cart_lines(db_session, "user-1") == {1: 2}
+    assert sweeper.sweep().lines == 1
+
+
+def test_sharded_stock_goes_back_to_a_shard(db_session, session_factory, product_stock):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    StockShardRepository(db_session).split(1, 2)
+    db_session.commit()
+    CartService(db_session, sharded_stock=True).add_item("user-1", 1, 3)
+    age_lines(db_session, "user-1", 3600)
+
+    result = AbandonedCartSweeper(session_factory, max_age=600).sweep()
+
+    assert result.units == 3
+    assert StockShardRepository(db_session).total_stock(1) == 10
+    assert product_stock(1) == 0
+
+
+def test_sweeps_in_batches(db_session, session_factory, product_stock):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    service = CartService(db_session)
+    for index in range(5):
+        service.add_item(f"user-{index}", 1, 1)
+        age_lines(db_session, f"user-{index}", 3600)
+
+    result = AbandonedCartSweeper(session_factory, max_age=600, batch_size=2).sweep()
+
+    assert (result.lines, result.carts) == (5, 5)
+    assert product_stock(1) == 10
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_the_sweeper_loop_to_stop():
+    with (
+        patch.object(main, "cart_sweeper", MagicMock()),
+        patch.object(main, "stock_leases", None),
+    ):
+        async with main.lifespan(main.app):
+            loops = asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert loops and all(task.done() for task in loops)
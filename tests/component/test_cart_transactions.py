@@ -1,8 +1,15 @@
+import time
+import pytest
 import concurrent.futures
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from src.shopping.service import CartService
-from src.shopping.domain import Product, Cart
+from prometheus_client import REGISTRY
+from src.shopping.retry import RetryPolicy
+from src.shopping.service import CartService, ProductNotFound
+from src.shopping.repository import StockShardRepository
+from src.shopping.domain import Product, Cart, CartItem
 from src.shopping.domain import InsufficientStock
+from src.shopping.schemas import CartBatchOperation
 
 
 def test_cart_service_add_item_concurrency(test_engine, mock_user):
@@ -148,3 +155,255 @@ def test_cart_service_rollback_on_failure(test_engine):
     cart = db.query(Cart).filter(Cart.user_id == user_id).first()
     assert cart is None
     db.close()
+
+
+def test_cart_service_batches_in_opposite_orders_do_not_deadlock(test_engine):
+    """
+    Batches touching the same products in opposite request order must not
+    deadlock, because products are always locked in ascending id order.
+    """
+    TestingSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=test_engine
+    )
+
+    db = TestingSessionLocal()
+    db.add_all([Product(id=551, stock=100), Product(id=552, stock=100)])
+    db.commit()
+    db.close()
+
+    forward = [
+        CartBatchOperation(action="add", product_id=551, quantity=1),
+        CartBatchOperation(action="add", product_id=552, quantity=1),
+    ]
+    backward = list(reversed(forward))
+    num_requests = 20
+
+    def batch_job(index: int):
+        session = TestingSessionLocal()
+        try:
+            service = CartService(session)
+            operations = forward if index % 2 else backward
+            _ = service.apply_batch(f"batch_user_{index}", operations)
+        finally:
+            session.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(batch_job, i) for i in range(num_requests)]
+        concurrent.futures.wait(futures)
+
+    for future in futures:
+        future.result()
+
+    db = TestingSessionLocal()
+    stock = {
+        p.id: p.stock
+        for p in db.query(Product).filter(Product.id.in_([551, 552])).all()
+    }
+    assert stock == {551: 100 - num_requests, 552: 100 - num_requests}
+    db.close()
+
+
+def test_cart_service_fast_path_add_item_concurrency(test_engine):
+    """
+    The single-statement fast path must give the same result as the locking
+    ORM path under concurrency, including rejecting requests past zero stock.
+    """
+    TestingSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=test_engine
+    )
+
+    db = TestingSessionLocal()
+    product_id = 333
+    initial_stock = 15
+    num_requests = 20
+    db.add(Product(id=product_id, stock=initial_stock))
+    db.commit()
+    db.close()
+
+    def add_item_job():
+        session = TestingSessionLocal()
+        try:
+            CartService(session, fast_path=True).add_item(
+                "fast_path_user", product_id, 1
+            )
+            return True
+        except InsufficientStock:
+            return False
+        finally:
+            session.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(add_item_job) for _ in range(num_requests)]
+        outcomes = [future.result() for future in futures]
+
+    assert outcomes.count(True) == initial_stock
+
+    db = TestingSessionLocal()
+    product = db.query(Product).filter(Product.id == product_id).one()
+    assert product.stock == 0
+
+    cart = db.query(Cart).filter(Cart.user_id == "fast_path_user").one()
+    cart_item = next(item for item in cart.items if item.product_id == product_id)
+    assert cart_item.quantity == initial_stock
+    db.close()
+
+
+def test_cart_service_fast_path_unknown_product_leaves_no_cart_line(db_session):
+    with pytest.raises(ProductNotFound):
+        CartService(db_session, fast_path=True).add_item("unknown_product_user", 404, 1)
+
+    assert db_session.query(CartItem).filter(CartItem.product_id == 404).count() == 0
+
+
+def test_cart_service_sharded_stock_concurrency(test_engine):
+    """
+    With sharded stock, concurrent adds and removes spread over the shards but
+    the total stock stays exact and never goes negative.
+    """
+    TestingSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=test_engine
+    )
+
+    db = TestingSessionLocal()
+    product_id = 222
+    initial_stock = 30
+    db.add(Product(id=product_id, stock=initial_stock))
+    db.commit()
+    StockShardRepository(db).split(product_id, 4)
+    db.commit()
+    db.close()
+
+    num_users = 40
+
+    def add_remove_job(index: int):
+        session = TestingSessionLocal()
+        try:
+            service = CartService(session, sharded_stock=True)
+            try:
+                service.add_item(f"shard_user_{index}", product_id, 1)
+            except InsufficientStock:
+                return False
+            if index % 4 == 0:
+                service.remove_item(f"shard_user_{index}", product_id, 1)
+            return True
+        finally:
+            session.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(add_remove_job, i) for i in range(num_users)]
+        outcomes = [future.result() for future in futures]
+
+    db = TestingSessionLocal()
+    in_carts = sum(
+        item.quantity
+        for cart in db.query(Cart).filter(Cart.user_id.like("shard_user_%")).all()
+        for item in cart.items
+    )
+    remaining = StockShardRepository(db).total_stock(product_id)
+    assert remaining is not None and remaining >= 0
+    assert remaining + in_carts == initial_stock
+    assert outcomes.count(True) >= initial_stock
+    db.close()
+
+
+def test_cart_service_targeted_lines_concurrency(test_engine):
+    """
+    Loading only the target line keeps concurrent adds/removes on a large cart
+    correct and never touches the other lines.
+    """
+    TestingSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=test_engine
+    )
+
+    db = TestingSessionLocal()
+    user_id = "targeted_user"
+    product_ids = list(range(1001, 1051))
+    db.add_all([Product(id=pid, stock=100) for pid in product_ids])
+    db.commit()
+    CartService(db).apply_batch(
+        user_id,
+        [
+            CartBatchOperation(action="add", product_id=pid, quantity=1)
+            for pid in product_ids
+        ],
+    )
+    db.close()
+
+    hot_product = product_ids[0]
+
+    def alternating_job():
+        session = TestingSessionLocal()
+        try:
+            service = CartService(session, targeted_lines=True)
+            service.add_item(user_id, hot_product, 2)
+            service.remove_item(user_id, hot_product, 1)
+        finally:
+            session.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(alternating_job) for _ in range(10)]
+        for future in futures:
+            future.result()
+
+    db = TestingSessionLocal()
+    cart = db.query(Cart).filter(Cart.user_id == user_id).one()
+    quantities = {item.product_id: item.quantity for item in cart.items}
+    assert len(quantities) == len(product_ids)
+    assert quantities[hot_product] == 11
+    assert all(quantities[pid] == 1 for pid in product_ids[1:])
+    product = db.query(Product).filter(Product.id == hot_product).one()
+    assert product.stock == 100 - 11
+    db.close()
+
+
+def test_cart_service_retries_transaction_aborted_by_deadlock(test_engine):
+    """
+    A concurrent transaction locks the product and then the cart, the reverse
+    of add_item. Postgres aborts add_item (it waited first); the retry runs
+    it again once the other transaction has committed.
+    """
+    TestingSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=test_engine
+    )
+    product_id = 1400
+    user_id = "deadlock-user"
+
+    db = TestingSessionLocal()
+    db.add(Product(id=product_id, stock=10))
+    db.add(Cart(user_id=user_id))
+    db.commit()
+    db.close()
+
+    holder = TestingSessionLocal()
+    _ = holder.execute(
+        text("SELECT id FROM products WHERE id = :id FOR UPDATE"), {"id": product_id}
+    )
+
+    def add_item_job():
+        session = TestingSessionLocal()
+        try:
+            service = CartService(session, retry_policy=RetryPolicy(base_delay=0.01))
+            service.add_item(user_id, product_id, 1)
+        finally:
+            session.close()
+
+    labels = {"operation": "add_item", "reason": "deadlock"}
+    before = REGISTRY.get_sample_value("db_transaction_retries_total", labels) or 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(add_item_job)
+        # Let add_item lock the cart and start waiting for the product
+        time.sleep(0.3)
+        _ = holder.execute(
+            text("SELECT id FROM carts WHERE user_id = :user_id FOR UPDATE"),
+            {"user_id": user_id},
+        )
+        holder.commit()
+        holder.close()
+        future.result()
+
+    assert (
+        REGISTRY.get_sample_value("db_transaction_retries_total", labels) == before + 1
+    )
+    db = TestingSessionLocal()
+    assert db.query(Product).filter(Product.id == product_id).one().stock == 9
+    db.close()
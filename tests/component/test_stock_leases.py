@@ -0,0 +1,117 @@
+import concurrent.futures
+import pytest
+from src.shopping.domain import Cart, InsufficientStock, Product
+from src.shopping.leases import ProductNotLeasable, StockLeaseManager
+from src.shopping.service import CartService
+
+
+def test_lease_takes_a_block_and_serves_from_memory(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    leases = StockLeaseManager(session_factory, {1}, block_size=10)
+
+    leases.take(1, 2)
+    leases.take(1, 3)
+
+    assert product_stock(1) == 90
+    assert leases.remaining(1) == 5
+
+
+def test_lease_extends_when_request_exceeds_remaining(
+    db_session, session_factory, product_stock
+):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    leases = StockLeaseManager(session_factory, {1}, block_size=10)
+
+    leases.take(1, 8)
+    leases.take(1, 25)  # needs 23 more than the 2 left
+
+    assert product_stock(1) == 100 - 10 - 23
+    assert leases.remaining(1) == 0
+
+
+def test_lease_insufficient_stock(db_session, session_factory, product_stock):
+    db_session.add(Product(id=1, stock=3))
+    db_session.commit()
+    leases = StockLeaseManager(session_factory, {1}, block_size=10)
+
+    leases.take(1, 2)
+    with pytest.raises(InsufficientStock):
+        leases.take(1, 2)
+
+    assert leases.remaining(1) == 1
+    assert product_stock(1) == 0
+
+
+def test_lease_unknown_product(db_session, session_factory):
+    leases = StockLeaseManager(session_factory, {999})
+
+    with pytest.raises(ProductNotLeasable):
+        leases.take(999, 1)
+
+
+def test_lease_returns_stock_on_expiry_and_release(
+    db_session, session_factory, product_stock, clock
+):
+    db_session.add(Product(id=1, stock=100))
+    db_session.commit()
+    leases = StockLeaseManager(session_factory, {1}, block_size=10, ttl=5, clock=clock)
+    leases.take(1, 4)
+
+    leases.release_expired()
+    assert product_stock(1) == 90
+
+    clock.now += 5
+    leases.release_expired()
+    assert product_stock(1) == 96
+    assert leases.remaining(1) == 0
+
+    leases.take(1, 1)
+    leases.release_all()
+    assert product_stock(1) == 95
+
+
+def test_cart_service_with_leases_concurrency(
+    db_session, session_factory, product_stock
+):
+    """
+    Concurrent adds served from a lease give the same final state as the
+    locking path once the lease is released.
+    """
+    product_id = 1
+    initial_stock = 100
+    num_requests = 20
+    db_session.add(Product(id=product_id, stock=initial_stock))
+    db_session.commit()
+    leases = StockLeaseManager(session_factory, {product_id}, block_size=7)
+
+    def add_item_job(index: int):
+        session = session_factory()
+        try:
+            service = CartService(session, leases=leases)
+            service.add_item(f"lease_user_{index % 3}", product_id, 1)
+        finally:
+            session.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(add_item_job, i) for i in range(num_requests)]
+        for future in futures:
+            future.result()
+
+    session = session_factory()
+    CartService(session, leases=leases).remove_item("lease_user_0", product_id, 2)
+    session.close()
+
+    leases.release_all()
+
+    in_carts = sum(
+        item.quantity
+        for cart in db_session.query(Cart).all()
+        for item in cart.items
+        if item.product_id == product_id
+    )
+    assert in_carts == num_requests - 2
+    assert product_stock(product_id) == initial_stock - in_carts
@@ -0,0 +1,49 @@
+import pytest
+from src.shopping.repository import AsyncCartRepository, AsyncProductRepository
+from src.shopping.domain import Cart, CartItem, Product
+
+
+@pytest.mark.asyncio
+async def test_async_product_repo_get_by_id_with_lock(
+    db_session, async_session_factory
+):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+
+    async with async_session_factory() as session:
+        repo = AsyncProductRepository(session)
+        fetched = await repo.get_by_id_with_lock(1)
+
+        assert fetched is not None
+        assert fetched.stock == 10
+        assert await repo.get_by_id(999) is None
+
+
+@pytest.mark.asyncio
+async def test_async_cart_repo_loads_items_with_cart(db_session, async_session_factory):
+    db_session.add(Product(id=1, stock=10))
+    cart = Cart(user_id="async_user")
+    db_session.add(cart)
+    db_session.commit()
+    db_session.add(CartItem(cart_id=cart.id, product_id=1, quantity=2))
+    db_session.commit()
+
+    async with async_session_factory() as session:
+        repo = AsyncCartRepository(session)
+        fetched = await repo.get_by_user_id_with_lock("async_user")
+
+        assert fetched is not None
+        # Items are already loaded: no lazy load (and no implicit IO) needed
+        assert [(i.product_id, i.quantity) for i in fetched.items] == [(1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_async_cart_repo_create_if_not_exists(db_session, async_session_factory):
+    async with async_session_factory() as session:
+        repo = AsyncCartRepository(session)
+        await repo.create_if_not_exists("async_user")
+        await repo.create_if_not_exists("async_user")
+        await session.commit()
+
+    carts = db_session.query(Cart).filter(Cart.user_id == "async_user").all()
+    assert len(carts) == 1
@@ -1,5 +1,5 @@
 from src.shopping.repository import CartRepository
-from src.shopping.domain import Cart
+from src.shopping.domain import Cart, CartItem, Product
 
 
 def test_cart_repo_create_if_not_exists(db_session):
@@ -36,3 +36,70 @@ def test_cart_repo_get_by_user_id_with_lock(db_session):
 def test_cart_repo_returns_none_if_not_found(db_session):
     repo = CartRepository(db_session)
     assert repo.get_by_user_id_with_lock("none") is None
+
+
+def test_cart_repo_get_id_by_user_id_with_lock(db_session):
+    repo = CartRepository(db_session)
+    cart = Cart(user_id="test_user")
+    db_session.add(cart)
+    db_session.commit()
+
+    assert repo.get_id_by_user_id_with_lock("test_user") == cart.id
+    assert repo.get_id_by_user_id_with_lock("none") is None
+
+
+def test_cart_repo_upsert_item_creates_then_increments(db_session):
+    repo = CartRepository(db_session)
+    db_session.add(Product(id=1, stock=10))
+    cart = Cart(user_id="test_user")
+    db_session.add(cart)
+    db_session.commit()
+
+    assert repo.upsert_item(cart.id, 1, 2) == 2
+    assert repo.upsert_item(cart.id, 1, 3) == 5
+    db_session.commit()
+
+    items = db_session.query(CartItem).filter(CartItem.cart_id == cart.id).all()
+    assert [(i.product_id, i.quantity) for i in items] == [(1, 5)]
+
+
+def test_cart_repo_targeted_lock_loads_only_requested_lines(db_session):
+    repo = CartRepository(db_session)
+    db_session.add_all([Product(id=i, stock=10) for i in range(1, 6)])
+    cart = Cart(user_id="test_user")
+    db_session.add(cart)
+    db_session.commit()
+    db_session.add_all(
+        [CartItem(cart_id=cart.id, product_id=i, quantity=i) for i in range(1, 6)]
+    )
+    db_session.commit()
+    db_session.expunge_all()
+
+    fetched = repo.get_by_user_id_with_lock("test_user", [2, 99])
+
+    assert fetched is not None
+    assert [(i.product_id, i.quantity) for i in fetched.items] == [(2, 2)]
+
+
+def test_cart_repo_targeted_changes_leave_other_lines_alone(db_session):
+    repo = CartRepository(db_session)
+    products = [Product(id=i, stock=10) for i in range(1, 4)]
+    db_session.add_all(products)
+    cart = Cart(user_id="test_user")
+    db_session.add(cart)
+    db_session.commit()
+    db_session.add_all(
+        [CartItem(cart_id=cart.id, product_id=i, quantity=1) for i in range(1, 3)]
+    )
+    db_session.commit()
+    cart_id = cart.id
+    db_session.expunge_all()
+
+    # Remove line 1 completely and add a new line 3, seeing only those lines
+    fetched = repo.get_by_user_id_with_lock("test_user", [1, 3])
+    _ = fetched.remove_item(Product(id=1, stock=0), 1)
+    fetched.add_item(Product(id=3, stock=0), 4)
+    db_session.commit()
+
+    items = db_session.query(CartItem).filter(CartItem.cart_id == cart_id).all()
+    assert sorted((i.product_id, i.quantity) for i in items) == [(2, 1), (3, 4)]
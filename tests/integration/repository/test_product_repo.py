@@ -1,4 +1,6 @@
-from src.shopping.repository import ProductRepository
+import pytest
+from sqlalchemy import text
+from src.shopping.repository import LockUnavailable, ProductRepository
 from src.shopping.domain import Product
 
 
@@ -29,3 +31,43 @@ def test_product_repo_get_by_id_with_lock(db_session):
 def test_product_repo_returns_none_if_not_found(db_session):
     repo = ProductRepository(db_session)
     assert repo.get_by_id(999) is None
+
+
+def test_product_repo_decrease_stock_if_available(db_session):
+    repo = ProductRepository(db_session)
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+
+    assert repo.decrease_stock_if_available(1, 4) == 6
+    assert repo.decrease_stock_if_available(1, 7) is None
+    assert repo.decrease_stock_if_available(999, 1) is None
+    db_session.commit()
+
+    assert repo.get_by_id(1).stock == 6
+
+
+def test_product_repo_lock_nowait_fails_fast_on_busy_row(db_session, test_engine):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+
+    with test_engine.connect() as holder:
+        _ = holder.execute(text("SELECT id FROM products WHERE id = 1 FOR UPDATE"))
+
+        repo = ProductRepository(db_session, lock_nowait=True)
+        with pytest.raises(LockUnavailable):
+            _ = repo.get_by_id_with_lock(1)
+        db_session.rollback()
+
+
+def test_product_repo_lock_timeout_bounds_the_wait(db_session, test_engine):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+
+    with test_engine.connect() as holder:
+        _ = holder.execute(text("SELECT id FROM products WHERE id = 1 FOR UPDATE"))
+
+        _ = db_session.execute(text("SET LOCAL lock_timeout = '50ms'"))
+        repo = ProductRepository(db_session)
+        with pytest.raises(LockUnavailable):
+            _ = repo.decrease_stock_if_available(1, 1)
+        db_session.rollback()
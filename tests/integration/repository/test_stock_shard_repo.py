@@ -0,0 +1,82 @@
+import pytest
+from src.shopping.repository import StockShardRepository
+from src.shopping.domain import Product
+from src.shopping.models import product_stock_shards_table
+
+
+def shard_stocks(db_session, product_id: int) -> list[int]:
+    rows = db_session.execute(
+        product_stock_shards_table.select()
+        .where(product_stock_shards_table.c.product_id == product_id)
+        .order_by(product_stock_shards_table.c.shard)
+    ).all()
+    return [row.stock for row in rows]
+
+
+def test_stock_shard_repo_split_distributes_stock(db_session):
+    repo = StockShardRepository(db_session)
+    product = Product(id=1, stock=10)
+    db_session.add(product)
+    db_session.commit()
+
+    repo.split(1, 4)
+    db_session.commit()
+
+    assert shard_stocks(db_session, 1) == [3, 3, 2, 2]
+    assert repo.total_stock(1) == 10
+    db_session.refresh(product)
+    assert product.stock == 0
+
+
+def test_stock_shard_repo_merge_restores_product_stock(db_session):
+    repo = StockShardRepository(db_session)
+    product = Product(id=1, stock=10)
+    db_session.add(product)
+    db_session.commit()
+    repo.split(1, 3)
+
+    repo.merge(1)
+    db_session.commit()
+
+    assert repo.total_stock(1) is None
+    db_session.refresh(product)
+    assert product.stock == 10
+
+
+def test_stock_shard_repo_try_decrease(db_session):
+    repo = StockShardRepository(db_session)
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=5)])
+    db_session.commit()
+    repo.split(1, 2)
+
+    assert repo.try_decrease(1, 4) is True
+    assert repo.total_stock(1) == 6
+    assert repo.try_decrease(2, 1) is None  # not sharded
+
+
+def test_stock_shard_repo_try_decrease_drains_across_shards(db_session):
+    repo = StockShardRepository(db_session)
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    repo.split(1, 2)  # 5 + 5: no single shard can serve 8
+
+    assert repo.try_decrease(1, 8) is True
+    assert repo.total_stock(1) == 2
+    assert repo.try_decrease(1, 3) is False
+    assert repo.total_stock(1) == 2
+
+
+def test_stock_shard_repo_increase(db_session):
+    repo = StockShardRepository(db_session)
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=5)])
+    db_session.commit()
+    repo.split(1, 2)
+
+    assert repo.increase(1, 3) is True
+    assert repo.total_stock(1) == 13
+    assert repo.increase(2, 1) is False
+
+
+def test_stock_shard_repo_split_unknown_product(db_session):
+    with pytest.raises(ValueError):
+        StockShardRepository(db_session).split(999, 2)
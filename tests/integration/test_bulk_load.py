@@ -0,0 +1,99 @@
+import io
+import pytest
+from sqlalchemy import select
+from src.shopping.bulk import BulkLoadError, load_products
+from src.shopping.domain import Product
+from src.shopping.models import products_table
+from src.shopping.repository import StockShardRepository
+
+
+def stock_by_id(db_session) -> dict[int, int]:
+    db_session.rollback()
+    return dict(db_session.execute(select(products_table)).tuples().all())
+
+
+def test_set_mode_upserts_in_chunks_and_last_row_wins(db_session, test_engine):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=5)])
+    db_session.commit()
+    source = io.BytesIO(b"stock,id\n7,1\n5,2\n3,3\n4,3\n9,4\n")
+
+    with test_engine.connect() as connection:
+        result = load_products(connection, source, "csv", "set", chunk_size=2)
+
+    assert stock_by_id(db_session) == {1: 7, 2: 5, 3: 4, 4: 9}
+    # Product 2 already had 5 units: neither written nor skipped
+    assert (result.rows, result.inserted, result.updated, result.skipped) == (
+        5,
+        2,
+        1,
+        0,
+    )
+
+
+def test_csv_columns_other_than_id_and_stock_are_ignored(db_session, test_engine):
+    source = io.BytesIO(b'name,id,stock\n"Mug, blue",1,3\n')
+
+    with test_engine.connect() as connection:
+        result = load_products(connection, source, "csv")
+
+    assert stock_by_id(db_session) == {1: 3}
+    assert result.inserted == 1
+
+
+def test_csv_rows_with_missing_columns_are_rejected(db_session, test_engine):
+    source = io.BytesIO(b"name,id,stock\nMug,1,3\nPlate,2\n")
+
+    with test_engine.connect() as connection:
+        with pytest.raises(BulkLoadError, match="Line 3: expected 3 columns"):
+            _ = load_products(connection, source, "csv")
+
+    assert stock_by_id(db_session) == {}
+
+
+def test_adjust_mode_adds_summed_deltas_to_existing_products(db_session, test_engine):
+    db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=1)])
+    db_session.commit()
+    source = io.BytesIO(
+        b'{"id": 1, "stock": -4}\n{"id": 1, "stock": 1}\n'
+        b'{"id": 2, "stock": -2}\n{"id": 3, "stock": 5}\n'
+    )
+
+    with test_engine.connect() as connection:
+        result = load_products(connection, source, "ndjson", "adjust")
+
+    # 2 would go negative and 3 does not exist: both skipped
+    assert stock_by_id(db_session) == {1: 7, 2: 1}
+    assert (result.updated, result.skipped) == (1, 2)
+
+
+def test_sharded_products_are_skipped(db_session, test_engine):
+    db_session.add(Product(id=1, stock=8))
+    db_session.commit()
+    StockShardRepository(db_session).split(1, 2)
+    db_session.commit()
+
+    with test_engine.connect() as connection:
+        result = load_products(connection, io.BytesIO(b"id,stock\n1,100\n"))
+
+    assert stock_by_id(db_session) == {1: 0}
+    assert result.skipped == 1
+
+
+@pytest.mark.parametrize(
+    "data, fmt",
+    [
+        (b"id,stock\n1,many\n", "csv"),
+        (b"id,stock\n1,\n", "csv"),
+        (b"id,quantity\n1,2\n", "csv"),
+        (b'{"id": 1}\n', "ndjson"),
+        (b'{"id": 1, "stock": "2"}\n', "ndjson"),
+    ],
+)
+def test_malformed_input_is_rejected_without_changes(
+    db_session, test_engine, data, fmt
+):
+    with test_engine.connect() as connection:
+        with pytest.raises(BulkLoadError):
+            _ = load_products(connection, io.BytesIO(data), fmt)
+
+    assert stock_by_id(db_session) == {}
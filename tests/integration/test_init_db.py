@@ -0,0 +1,29 @@
+from sqlalchemy import inspect, text
+from src.init_db import upgrade_schema
+
+
+def columns(connection, table: str) -> set[str]:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def test_upgrade_adds_missing_columns_to_old_tables(test_engine):
+    # DDL is transactional in Postgres: the rollback restores the tables
+    with test_engine.connect() as connection:
+        _ = connection.execute(text("ALTER TABLE carts DROP COLUMN version"))
+        _ = connection.execute(text("ALTER TABLE cart_items DROP COLUMN updated_at"))
+        _ = connection.execute(
+            text("INSERT INTO carts (user_id) VALUES ('user-before-upgrade')")
+        )
+
+        upgrade_schema(connection)
+        upgrade_schema(connection)
+
+        assert "version" in columns(connection, "carts")
+        assert "updated_at" in columns(connection, "cart_items")
+        indexes = inspect(connection).get_indexes("cart_items")
+        assert "ix_cart_items_updated_at" in {index["name"] for index in indexes}
+        version = connection.execute(
+            text("SELECT version FROM carts WHERE user_id = 'user-before-upgrade'")
+        ).scalar_one()
+        assert version == 0
+        connection.rollback()
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from src.pool_metrics import PoolMetrics
+
+
+@pytest.fixture
+def instrumented_engine(test_engine):
+    metrics = PoolMetrics()
+    engine = create_engine(
+        test_engine.url,
+        poolclass=metrics.pool_class(QueuePool),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    metrics.instrument(engine)
+
+    yield engine, metrics
+
+    engine.dispose()
+
+
+def test_pool_metrics_tracks_checkouts(instrumented_engine):
+    engine, metrics = instrumented_engine
+
+    with engine.connect() as conn:
+        _ = conn.execute(text("SELECT 1"))
+        during = metrics.snapshot(engine.pool)
+    after = metrics.snapshot(engine.pool)
+
+    assert during["checked_out"] == 1
+    assert after["checked_out"] == 0
+    assert after["idle"] == 1
+    assert after["connections_opened"] == 1
+    assert after["checkouts"] == 1
+    assert after["checkout_wait_seconds"]["samples"] == 1
+
+
+def test_pool_metrics_counts_checkout_timeouts(instrumented_engine):
+    engine, metrics = instrumented_engine
+
+    with engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            _ = engine.connect()
+
+    snapshot = metrics.snapshot(engine.pool)
+    assert snapshot["checkout_timeouts"] == 1
+    # The timed-out checkout waited for the full pool_timeout
+    assert snapshot["checkout_wait_seconds"]["max"] >= 0.1
+
+
+def test_pool_metrics_survive_engine_dispose(instrumented_engine):
+    engine, metrics = instrumented_engine
+
+    engine.dispose()
+    with engine.connect():
+        pass
+
+    assert metrics.snapshot(engine.pool)["checkout_wait_seconds"]["samples"] == 1
+
+
+def test_pool_metrics_time_orm_session_checkouts(instrumented_engine):
+    engine, metrics = instrumented_engine
+
+    with Session(engine) as session:
+        _ = session.execute(text("SELECT 1"))
+
+    snapshot = metrics.snapshot(engine.pool)
+    assert snapshot["checkouts"] == 1
+    assert snapshot["checkout_wait_seconds"]["samples"] == 1
+
+
+def test_pool_health_endpoint(client):
+    response = client.get("/health/pool")
+
+    assert response.status_code == 200
+    assert "checkout_wait_seconds" in response.json()["pools"]["sync"]
@@ -0,0 +1,33 @@
+from src.shopping.catalog import ProductCatalog
+from src.shopping.domain import Product
+from src.shopping.repository import StockShardRepository
+
+
+def test_page_is_reloaded_once_older_than_max_age(db_session, clock):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    catalog = ProductCatalog(max_age=2.0, clock=clock)
+    _ = catalog.get_page(db_session, 0, 10)
+
+    db_session.get(Product, 1).stock = 4
+    db_session.commit()
+    clock.now = 1.5
+    cached, age = catalog.get_page(db_session, 0, 10)
+    clock.now = 2.5
+    reloaded, reloaded_age = catalog.get_page(db_session, 0, 10)
+
+    assert cached.products == ((1, 10),)
+    assert age == 1.5
+    assert reloaded.products == ((1, 4),)
+    assert reloaded_age == 0.0
+
+
+def test_sharded_products_report_the_sum_of_their_shards(db_session):
+    db_session.add_all([Product(id=1, stock=30), Product(id=2, stock=5)])
+    db_session.commit()
+    StockShardRepository(db_session).split(1, 4)
+    db_session.commit()
+
+    page, _ = ProductCatalog().get_page(db_session, 0, 10)
+
+    assert page.products == ((1, 30), (2, 5))
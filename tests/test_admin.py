@@ -0,0 +1,122 @@
+"""
+Component tests for the admin router.
+"""
+
+import pytest
+from unittest.mock import patch
+from fastapi.concurrency import run_in_threadpool
+from src.shopping.domain import Product
+
+
+@pytest.fixture
+def admin(mock_user):
+    with patch("src.auth.dependencies.ADMIN_USER_IDS", frozenset({mock_user.id})):
+        yield mock_user
+
+
+class TestBulkLoadProducts:
+    """Tests for the POST /admin/products/bulk endpoint."""
+
+    def test_loads_csv_and_reports_throughput(self, client, db_session, admin):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+
+        response = client.post(
+            "/admin/products/bulk",
+            content=b"id,stock\n1,4\n2,6\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["rows"], body["inserted"], body["updated"]) == (2, 1, 1)
+        assert body["rows_per_second"] > 0
+        db_session.expire_all()
+        assert db_session.get(Product, 1).stock == 4
+        assert db_session.get(Product, 2).stock == 6
+
+    def test_large_upload_is_spooled_off_the_event_loop(
+        self, client, db_session, admin
+    ):
+        rows = [f"{product_id},{product_id}\n" for product_id in range(1, 201)]
+
+        def upload():
+            yield b"id,stock\n"
+            for row in rows:
+                yield row.encode()
+
+        with (
+            patch("src.shopping.admin_router.BULK_SPOOL_BYTES", 256),
+            patch("src.shopping.admin_router.BULK_WRITE_BYTES", 100),
+            patch(
+                "src.shopping.admin_router.run_in_threadpool",
+                wraps=run_in_threadpool,
+            ) as threadpool,
+        ):
+            response = client.post(
+                "/admin/products/bulk",
+                content=upload(),
+                headers={"Content-Type": "text/csv"},
+            )
+
+        assert response.status_code == 200
+        assert response.json()["inserted"] == 200
+        db_session.expire_all()
+        assert db_session.get(Product, 200).stock == 200
+        writes = [
+            call
+            for call in threadpool.call_args_list
+            if call.args[0].__name__ == "write"
+        ]
+        assert len(writes) > 1
+
+    def test_adjusts_stock_from_ndjson(self, client, db_session, admin):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+
+        response = client.post(
+            "/admin/products/bulk",
+            params={"mode": "adjust", "format": "ndjson"},
+            content=b'{"id": 1, "stock": -3}\n',
+        )
+
+        assert response.status_code == 200
+        db_session.expire_all()
+        assert db_session.get(Product, 1).stock == 7
+
+    def test_malformed_input_is_a_bad_request(self, client, admin):
+        response = client.post(
+            "/admin/products/bulk",
+            content=b"id,stock\n1,lots\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 400
+
+    def test_short_csv_row_is_a_bad_request(self, client, admin):
+        response = client.post(
+            "/admin/products/bulk",
+            content=b"name,id,stock\nMug,1,3\nPlate,2\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 400
+        assert "Line 3" in response.json()["detail"]
+
+    def test_unknown_content_type_is_rejected(self, client, admin):
+        response = client.post(
+            "/admin/products/bulk",
+            content=b"1,2",
+            headers={"Content-Type": "application/octet-stream"},
+        )
+
+        assert response.status_code == 415
+
+    def test_non_admin_users_are_forbidden(self, client):
+        response = client.post(
+            "/admin/products/bulk",
+            content=b"id,stock\n1,4\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 403
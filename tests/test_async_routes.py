@@ -0,0 +1,28 @@
+from collections import Counter
+from fastapi import FastAPI
+from src.main import without_routes
+from src.shopping.async_router import router as async_cart_router
+from src.shopping.router import router as cart_router
+
+
+def test_async_routes_replace_their_sync_counterparts():
+    app = FastAPI()
+    app.include_router(async_cart_router)
+    app.include_router(without_routes(cart_router, async_cart_router))
+
+    operations = Counter(
+        (path, method)
+        for path, item in app.openapi()["paths"].items()
+        for method in item
+    )
+
+    assert set(operations.values()) == {1}
+    assert {
+        ("/cart", "get"),
+        ("/cart/add-item", "post"),
+        ("/cart/remove-item", "post"),
+        ("/cart/batch", "post"),
+    } <= set(operations)
+    add_item = app.openapi()["paths"]["/cart/add-item"]["post"]
+    assert add_item["operationId"].startswith("add_item_to_cart_async")
+    assert app.openapi()["paths"]["/cart"]["get"]["tags"] == ["cart"]
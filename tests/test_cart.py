@@ -5,6 +5,8 @@ These tests use a real Postgres database running in Docker to verify
 the cart endpoints work correctly with actual database operations.
 """
 
+from unittest.mock import patch
+from sqlalchemy import text
 from src.shopping.domain import Product, Cart, CartItem
 
 
@@ -133,3 +135,197 @@ class TestRemoveItemFromCart:
         )
 
         assert response.status_code == 401
+
+
+class TestCartBatch:
+    """Tests for the /cart/batch endpoint."""
+
+    def test_batch_applies_all_operations(self, client, db_session, mock_user):
+        """Test applying several add/remove lines in one request."""
+        db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=5)])
+        db_session.commit()
+
+        response = client.post(
+            "/cart/batch",
+            json={
+                "operations": [
+                    {"action": "add", "product_id": 2, "quantity": 3},
+                    {"action": "add", "product_id": 1, "quantity": 4},
+                    {"action": "remove", "product_id": 2, "quantity": 1},
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"product_id": 2, "action": "add", "quantity": 3, "cart_quantity": 3},
+            {"product_id": 1, "action": "add", "quantity": 4, "cart_quantity": 4},
+            {"product_id": 2, "action": "remove", "quantity": 1, "cart_quantity": 2},
+        ]
+
+        cart = db_session.query(Cart).filter(Cart.user_id == mock_user.id).one()
+        assert {i.product_id: i.quantity for i in cart.items} == {1: 4, 2: 2}
+        stock = {p.id: p.stock for p in db_session.query(Product).all()}
+        assert stock == {1: 6, 2: 3}
+
+    def test_batch_is_atomic_when_a_line_fails(self, client, db_session, mock_user):
+        """Test that a failing line rolls back the lines before it."""
+        db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=1)])
+        db_session.commit()
+
+        response = client.post(
+            "/cart/batch",
+            json={
+                "operations": [
+                    {"action": "add", "product_id": 1, "quantity": 2},
+                    {"action": "add", "product_id": 2, "quantity": 5},
+                ]
+            },
+        )
+
+        assert response.status_code == 400
+        assert response.json()["detail"]["failed_operation"] == 1
+
+        db_session.expire_all()
+        assert (
+            db_session.query(Cart).filter(Cart.user_id == mock_user.id).first() is None
+        )
+        stock = {p.id: p.stock for p in db_session.query(Product).all()}
+        assert stock == {1: 10, 2: 1}
+
+    def test_batch_unknown_product(self, client, db_session):
+        """Test that an unknown product fails the batch with 404."""
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+
+        response = client.post(
+            "/cart/batch",
+            json={
+                "operations": [
+                    {"action": "add", "product_id": 1, "quantity": 1},
+                    {"action": "add", "product_id": 999, "quantity": 1},
+                ]
+            },
+        )
+
+        assert response.status_code == 404
+        assert response.json()["detail"]["failed_operation"] == 1
+
+    def test_batch_rejects_empty_operations(self, client):
+        """Test that an empty batch is a validation error."""
+        response = client.post("/cart/batch", json={"operations": []})
+
+        assert response.status_code == 422
+
+
+class TestLargeCart:
+    """Tests for carts with many lines."""
+
+    def test_remove_line_from_middle_of_cart(self, client, db_session, mock_user):
+        """Removing one line of many leaves every other line persisted."""
+        db_session.add_all([Product(id=i, stock=10) for i in range(1, 6)])
+        cart = Cart(user_id=mock_user.id)
+        db_session.add(cart)
+        db_session.commit()
+        db_session.add_all(
+            [CartItem(cart_id=cart.id, product_id=i, quantity=i) for i in range(1, 6)]
+        )
+        db_session.commit()
+
+        response = client.post(
+            "/cart/remove-item", json={"product_id": 2, "quantity": 2}
+        )
+
+        assert response.status_code == 200
+        db_session.expire_all()
+        items = db_session.query(CartItem).filter(CartItem.cart_id == cart.id).all()
+        assert sorted((i.product_id, i.quantity) for i in items) == [
+            (1, 1),
+            (3, 3),
+            (4, 4),
+            (5, 5),
+        ]
+
+
+class TestLockTimeouts:
+    """Busy rows are answered with 503 instead of queueing the request."""
+
+    def test_add_item_returns_503_when_product_row_is_busy(
+        self, client, db_session, test_engine
+    ):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+
+        with (
+            patch("src.shopping.dependencies.DB_LOCK_NOWAIT", True),
+            test_engine.connect() as holder,
+        ):
+            _ = holder.execute(text("SELECT id FROM products WHERE id = 1 FOR UPDATE"))
+            response = client.post(
+                "/cart/add-item", json={"product_id": 1, "quantity": 1}
+            )
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        db_session.rollback()
+        assert db_session.get(Product, 1).stock == 10
+
+
+class TestGetCart:
+    """Tests for the GET /cart endpoint."""
+
+    def test_get_cart_without_cart_is_empty(self, client):
+        response = client.get("/cart")
+
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "version": 0}
+
+    def test_get_cart_returns_lines_and_etag(self, client, db_session):
+        db_session.add_all([Product(id=1, stock=10), Product(id=2, stock=10)])
+        db_session.commit()
+        _ = client.post("/cart/add-item", json={"product_id": 2, "quantity": 1})
+        _ = client.post("/cart/add-item", json={"product_id": 1, "quantity": 3})
+
+        response = client.get("/cart")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "items": [
+                {"product_id": 1, "quantity": 3},
+                {"product_id": 2, "quantity": 1},
+            ],
+            "version": 2,
+        }
+        assert response.headers["ETag"].startswith('W/"')
+
+    def test_get_cart_not_modified_until_cart_changes(self, client, db_session):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+        _ = client.post("/cart/add-item", json={"product_id": 1, "quantity": 1})
+        etag = client.get("/cart").headers["ETag"]
+
+        not_modified = client.get("/cart", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["ETag"] == etag
+
+        _ = client.post("/cart/remove-item", json={"product_id": 1, "quantity": 1})
+        changed = client.get("/cart", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert changed.json()["items"] == []
+
+    def test_get_cart_serves_cached_lines_while_version_is_unchanged(
+        self, client, db_session
+    ):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+        _ = client.post("/cart/add-item", json={"product_id": 1, "quantity": 1})
+        _ = client.get("/cart")
+
+        with patch(
+            "src.shopping.repository.CartRepository.get_snapshot_by_user_id"
+        ) as load_lines:
+            response = client.get("/cart")
+
+        load_lines.assert_not_called()
+        assert response.json()["items"] == [{"product_id": 1, "quantity": 1}]
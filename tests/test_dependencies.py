@@ -3,7 +3,7 @@ import jwt
 import json
 import base64
 from collections.abc import Mapping
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from fastapi import HTTPException
 from fastapi.security import HTTPAuthorizationCredentials
 from cryptography.hazmat.primitives.asymmetric import ec
@@ -106,3 +106,119 @@ def test_get_current_user_invalid_token() -> None:
 
     assert excinfo.value.status_code == 401
     assert "Invalid token" in excinfo.value.detail
+
+
+@pytest.mark.usefixtures("mock_env_signing_key")
+def test_get_current_user_verifies_signature_once_per_token(
+    test_key_pair: tuple[ec.EllipticCurvePrivateKey, Mapping[str, object]],
+) -> None:
+    private_key, _ = test_key_pair
+    payload = {"sub": "cached-user", "aud": "authenticated"}
+    token = jwt.encode(payload, private_key, algorithm="ES256")
+
+    auth = MagicMock(spec=HTTPAuthorizationCredentials)
+    auth.credentials = token
+
+    with patch("src.auth.dependencies.jwt.decode", wraps=jwt.decode) as decode:
+        first = get_current_user(auth)
+        second = get_current_user(auth)
+
+    assert first.id == second.id == "cached-user"
+    assert decode.call_count == 1
+
+
+def test_get_current_user_rejects_cached_token_after_key_change(
+    monkeypatch: pytest.MonkeyPatch,
+    test_key_pair: tuple[ec.EllipticCurvePrivateKey, Mapping[str, object]],
+) -> None:
+    private_key, jwk = test_key_pair
+    monkeypatch.setenv("JWT_SIGNING_KEY", json.dumps(jwk))
+    payload = {"sub": "rotated-user", "aud": "authenticated"}
+    token = jwt.encode(payload, private_key, algorithm="ES256")
+
+    auth = MagicMock(spec=HTTPAuthorizationCredentials)
+    auth.credentials = token
+    assert get_current_user(auth).id == "rotated-user"
+
+    # Rotate to a different key: the cached verification must not be reused
+    other_public = ec.generate_private_key(ec.SECP256R1()).public_key().public_numbers()
+    rotated_jwk = dict(jwk)
+    rotated_jwk["x"] = bytes_to_base64url(other_public.x.to_bytes(32, "big"))
+    rotated_jwk["y"] = bytes_to_base64url(other_public.y.to_bytes(32, "big"))
+    monkeypatch.setenv("JWT_SIGNING_KEY", json.dumps(rotated_jwk))
+
+    with pytest.raises(HTTPException) as excinfo:
+        _ = get_current_user(auth)
+
+    assert excinfo.value.status_code == 401
+
+
+def test_get_current_user_selects_key_by_kid(
+    monkeypatch: pytest.MonkeyPatch,
+    test_key_pair: tuple[ec.EllipticCurvePrivateKey, Mapping[str, object]],
+) -> None:
+    private_key, jwk = test_key_pair
+    other_public = ec.generate_private_key(ec.SECP256R1()).public_key().public_numbers()
+    other_jwk = dict(jwk)
+    other_jwk["x"] = bytes_to_base64url(other_public.x.to_bytes(32, "big"))
+    other_jwk["y"] = bytes_to_base64url(other_public.y.to_bytes(32, "big"))
+    jwks = {"keys": [{**other_jwk, "kid": "other"}, {**jwk, "kid": "current"}]}
+    monkeypatch.setenv("JWT_JWKS", json.dumps(jwks))
+
+    payload = {"sub": "kid-user", "aud": "authenticated"}
+    token = jwt.encode(
+        payload, private_key, algorithm="ES256", headers={"kid": "current"}
+    )
+
+    auth = MagicMock(spec=HTTPAuthorizationCredentials)
+    auth.credentials = token
+
+    assert get_current_user(auth).id == "kid-user"
+
+
+def test_get_current_user_rejects_unknown_kid_without_verifying(
+    monkeypatch: pytest.MonkeyPatch,
+    test_key_pair: tuple[ec.EllipticCurvePrivateKey, Mapping[str, object]],
+) -> None:
+    private_key, jwk = test_key_pair
+    monkeypatch.setenv("JWT_JWKS", json.dumps({"keys": [{**jwk, "kid": "current"}]}))
+
+    payload = {"sub": "kid-user", "aud": "authenticated"}
+    token = jwt.encode(
+        payload, private_key, algorithm="ES256", headers={"kid": "retired"}
+    )
+
+    auth = MagicMock(spec=HTTPAuthorizationCredentials)
+    auth.credentials = token
+
+    with patch("src.auth.dependencies.jwt.decode") as decode:
+        with pytest.raises(HTTPException) as excinfo:
+            _ = get_current_user(auth)
+
+    assert excinfo.value.status_code == 401
+    assert "Unknown key id" in excinfo.value.detail
+    decode.assert_not_called()
+
+
+def test_get_current_user_rejects_unknown_kid_despite_a_default_key(
+    monkeypatch: pytest.MonkeyPatch,
+    test_key_pair: tuple[ec.EllipticCurvePrivateKey, Mapping[str, object]],
+) -> None:
+    private_key, jwk = test_key_pair
+    # The same key published without a kid: only kid-less tokens may use it
+    monkeypatch.setenv("JWT_SIGNING_KEY", json.dumps(jwk))
+
+    payload = {"sub": "kid-user", "aud": "authenticated"}
+    auth = MagicMock(spec=HTTPAuthorizationCredentials)
+    auth.credentials = jwt.encode(
+        payload, private_key, algorithm="ES256", headers={"kid": "retired"}
+    )
+
+    with pytest.raises(HTTPException) as excinfo:
+        _ = get_current_user(auth)
+
+    assert excinfo.value.status_code == 401
+    assert "Unknown key id" in excinfo.value.detail
+
+    auth.credentials = jwt.encode(payload, private_key, algorithm="ES256")
+    assert get_current_user(auth).id == "kid-user"
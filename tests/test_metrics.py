@@ -0,0 +1,59 @@
+import os
+import sys
+import subprocess
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+from src.shopping.domain import Product
+
+
+def metric_value(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_count_requests_by_route_template(client, db_session):
+    """Requests are labelled with the route template and status code."""
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    counter = 'http_requests_total{method="POST",route="/cart/add-item",status="200"}'
+    before = metric_value(client.get("/metrics").text, counter)
+
+    for _ in range(3):
+        _ = client.post("/cart/add-item", json={"product_id": 1, "quantity": 1})
+    _ = client.get("/no-such-page/123")
+
+    body = client.get("/metrics").text
+    assert metric_value(body, counter) == before + 3
+    assert 'route="/no-such-page/123"' not in body
+    assert 'route="unmatched",status="404"' in body
+    assert (
+        'http_request_duration_seconds_count{method="POST",route="/cart/add-item"}'
+        in body
+    )
+
+
+def test_metrics_aggregate_across_worker_processes(tmp_path):
+    """Values written by separate worker processes are summed by /metrics."""
+    worker_code = (
+        "from src.metrics import observe_request\n"
+        "for _ in range(5):\n"
+        "    observe_request('GET', '/cart', 200, 0.01)\n"
+    )
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for _ in range(2):
+        _ = subprocess.run(
+            [sys.executable, "-c", worker_code], env=env, cwd=root, check=True
+        )
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    body = generate_latest(registry).decode()
+
+    assert (
+        metric_value(
+            body, 'http_requests_total{method="GET",route="/cart",status="200"}'
+        )
+        == 10
+    )
@@ -0,0 +1,46 @@
+import uuid
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.logging_config import log_context
+from src.middleware import RequestContextMiddleware
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/context")
+    def context() -> dict[str, object]:
+        # Sync endpoints run in the threadpool with a copy of the context
+        return dict(log_context.get())
+
+    return app
+
+
+def test_correlation_id_is_echoed_and_set_in_log_context():
+    client = TestClient(make_app())
+
+    response = client.get("/context", headers={"X-Correlation-ID": "abc-123"})
+
+    assert response.headers["X-Correlation-ID"] == "abc-123"
+    assert float(response.headers["X-Process-Time"]) >= 0
+    assert response.json()["correlation_id"] == "abc-123"
+    assert response.json()["method"] == "GET"
+    assert response.json()["path"] == "/context"
+
+
+def test_correlation_id_is_generated_when_missing():
+    response = TestClient(make_app()).get("/context")
+
+    correlation_id = response.headers["X-Correlation-ID"]
+    assert uuid.UUID(correlation_id)
+    assert response.json()["correlation_id"] == correlation_id
+    # The context does not leak out of the request
+    assert log_context.get() == {}
+
+
+def test_unmatched_routes_get_headers_too(client):
+    response = client.get("/no-such-route")
+
+    assert response.status_code == 404
+    assert "X-Process-Time" in response.headers
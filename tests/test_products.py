@@ -0,0 +1,56 @@
+"""
+Component tests for the product catalog router.
+"""
+
+import pytest
+from unittest.mock import patch
+from src.shopping.catalog import ProductCatalog
+from src.shopping.domain import Product
+
+
+@pytest.fixture
+def catalog():
+    """A fresh page cache per test, so pages cached by other tests never leak."""
+    catalog = ProductCatalog(max_age=60.0)
+    with patch("src.shopping.product_router.product_catalog", catalog):
+        yield catalog
+
+
+class TestListProducts:
+    """Tests for the GET /products endpoint."""
+
+    def test_pages_follow_the_cursor(self, client, db_session, catalog):
+        db_session.add_all([Product(id=i, stock=i * 10) for i in range(1, 6)])
+        db_session.commit()
+
+        first = client.get("/products", params={"limit": 2}).json()
+        second = client.get(
+            "/products", params={"limit": 2, "after": first["next_cursor"]}
+        ).json()
+        last = client.get(
+            "/products", params={"limit": 2, "after": second["next_cursor"]}
+        ).json()
+
+        assert first["items"] == [{"id": 1, "stock": 10}, {"id": 2, "stock": 20}]
+        assert first["next_cursor"] == 2
+        assert [item["id"] for item in second["items"]] == [3, 4]
+        assert last["items"] == [{"id": 5, "stock": 50}]
+        assert last["next_cursor"] is None
+
+    def test_stock_is_served_from_cache_within_the_bound(
+        self, client, db_session, catalog
+    ):
+        db_session.add(Product(id=1, stock=10))
+        db_session.commit()
+        _ = client.get("/products")
+
+        db_session.get(Product, 1).stock = 3
+        db_session.commit()
+        response = client.get("/products")
+
+        assert response.json()["items"] == [{"id": 1, "stock": 10}]
+        assert response.json()["stock_age"] <= catalog.max_age
+        assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    def test_limit_is_bounded(self, client, catalog):
+        assert client.get("/products", params={"limit": 1000}).status_code == 422
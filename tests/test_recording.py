@@ -0,0 +1,98 @@
+import json
+import time
+import base64
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.replay import replay, summarize
+from src.recording import TraceWriter, TrafficRecorderMiddleware, user_hash
+from src.shopping.domain import Product
+
+
+def bearer(claims: dict[str, object]) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=")
+    return f"Bearer e30.{payload.decode()}.signature"
+
+
+def test_user_hash_is_salted_and_hides_the_subject():
+    header = bearer({"sub": "user-123"})
+
+    hashed = user_hash(header, "salt-a")
+
+    assert hashed is not None and "user-123" not in hashed
+    assert hashed == user_hash(header, "salt-a")
+    assert hashed != user_hash(header, "salt-b")
+    assert user_hash("Bearer not-a-jwt", "salt-a") is None
+    assert user_hash(None, "salt-a") is None
+
+
+def test_recorder_writes_sanitized_traces(client, db_session, tmp_path):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    path = tmp_path / "traces.jsonl"
+    writer = TraceWriter(str(path))
+    recorded = TestClient(TrafficRecorderMiddleware(client.app, writer, salt="s"))
+    before = time.time()
+
+    _ = recorded.post(
+        "/cart/add-item",
+        json={"product_id": 1, "quantity": 2},
+        headers={"Authorization": bearer({"sub": "user-123"})},
+    )
+    _ = recorded.get("/products", params={"limit": 5})
+    writer.close()
+
+    traces = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(t["method"], t["path"], t["status"]) for t in traces] == [
+        ("POST", "/cart/add-item", 200),
+        ("GET", "/products", 200),
+    ]
+    assert traces[0]["body"] == {"product_id": 1, "quantity": 2}
+    assert traces[0]["user"] == user_hash(bearer({"sub": "user-123"}), "s")
+    assert traces[1]["query"] == "limit=5"
+    assert "Bearer" not in path.read_text()
+    assert all(t["duration_ms"] >= 0 for t in traces)
+    # Wall-clock arrivals, comparable across workers writing the same file
+    assert before <= traces[0]["ts"] <= traces[1]["ts"] <= time.time()
+
+
+@pytest.mark.asyncio
+async def test_replay_reports_latency_per_endpoint(client, db_session):
+    db_session.add(Product(id=1, stock=10))
+    db_session.commit()
+    traces = [
+        {"method": "POST", "path": "/cart/add-item", "body": {"product_id": 1}},
+        {"method": "POST", "path": "/cart/add-item", "body": {"product_id": 1}},
+        {"method": "GET", "path": "/products", "query": "limit=5"},
+    ]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=client.app), base_url="http://replay"
+    ) as replay_client:
+        stats, elapsed = await replay(replay_client, traces, 1, None, lambda _user: {})
+    report = summarize(stats, elapsed)
+
+    assert report["requests"] == 3
+    add_item = report["endpoints"]["POST /cart/add-item"]
+    assert add_item["requests"] == 2
+    assert add_item["statuses"] == {200: 2}
+    assert add_item["p50_ms"] <= add_item["p99_ms"]
+
+
+@pytest.mark.asyncio
+async def test_paced_replay_counts_slot_waits_in_latency(client):
+    traces = [{"method": "GET", "path": "/products"} for _ in range(3)]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=client.app), base_url="http://replay"
+    ) as replay_client:
+        # All due at once through one slot: the later ones queue
+        stats, _ = await replay(
+            replay_client, traces, 1, [0.0] * len(traces), lambda _user: {}
+        )
+
+    products = stats["GET /products"]
+    assert max(products.waits) > 0
+    assert all(
+        latency >= wait for latency, wait in zip(products.latencies, products.waits)
+    )
@@ -0,0 +1,142 @@
+import json
+import base64
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from src.auth.keys import KeySetProvider, parse_key_set
+
+
+def make_jwk(kid: str | None = None) -> dict[str, object]:
+    numbers = ec.generate_private_key(ec.SECP256R1()).public_key().public_numbers()
+
+    def b64(value: int) -> str:
+        raw = value.to_bytes(32, "big")
+        return base64.urlsafe_b64encode(raw).decode("utf-8").rstrip("=")
+
+    jwk: dict[str, object] = {
+        "kty": "EC",
+        "crv": "P-256",
+        "x": b64(numbers.x),
+        "y": b64(numbers.y),
+        "alg": "ES256",
+        "use": "sig",
+    }
+    if kid:
+        jwk["kid"] = kid
+    return jwk
+
+
+@pytest.fixture(autouse=True)
+def clear_key_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    for name in ["JWT_JWKS_FILE", "JWT_JWKS", "JWT_SIGNING_KEY"]:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_parse_key_set_indexes_keys_by_kid():
+    key_set = parse_key_set(json.dumps({"keys": [make_jwk("a"), make_jwk("b")]}), 1)
+
+    assert set(key_set.keys) == {"a", "b"}
+    assert key_set.select("a") is key_set.keys["a"]
+    assert key_set.select("unknown") is None
+    assert key_set.select(None) is None
+
+
+def test_parse_key_set_accepts_single_jwk_as_default_key():
+    key_set = parse_key_set(json.dumps(make_jwk()), 1)
+
+    assert key_set.select(None) is not None
+    assert key_set.select("any-kid") is None
+
+
+def test_default_key_only_serves_tokens_without_kid():
+    key_set = parse_key_set(json.dumps({"keys": [make_jwk(), make_jwk("a")]}), 1)
+
+    assert key_set.select(None) is key_set.keys[None]
+    assert key_set.select("a") is key_set.keys["a"]
+    assert key_set.select("retired") is None
+
+
+def test_parse_key_set_rejects_document_without_usable_keys():
+    with pytest.raises(ValueError):
+        _ = parse_key_set(json.dumps({"keys": []}), 1)
+
+
+@pytest.mark.parametrize(
+    "raw", ["[]", '"key"', "null", '{"keys": {}}', '{"keys": [1]}']
+)
+def test_parse_key_set_rejects_documents_of_the_wrong_shape(raw):
+    with pytest.raises(ValueError):
+        _ = parse_key_set(raw, 1)
+
+
+def test_provider_keeps_previous_keys_when_file_is_not_an_object(
+    monkeypatch: pytest.MonkeyPatch, tmp_path, clock
+):
+    jwks_file = tmp_path / "jwks.json"
+    _ = jwks_file.write_text(json.dumps({"keys": [make_jwk("a")]}))
+    monkeypatch.setenv("JWT_JWKS_FILE", str(jwks_file))
+    provider = KeySetProvider(reload_interval=1, clock=clock)
+    previous = provider.get()
+
+    _ = jwks_file.write_text("[]")
+    clock.now += 1
+
+    assert provider.get() is previous
+
+
+def test_provider_returns_none_without_configured_keys():
+    assert KeySetProvider().get() is None
+
+
+def test_provider_reuses_parsed_keys_until_env_changes(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    provider = KeySetProvider()
+    monkeypatch.setenv("JWT_JWKS", json.dumps({"keys": [make_jwk("a")]}))
+
+    first = provider.get()
+    assert provider.get() is first
+
+    monkeypatch.setenv("JWT_JWKS", json.dumps({"keys": [make_jwk("b")]}))
+    second = provider.get()
+
+    assert second is not None and first is not None
+    assert second.version > first.version
+    assert set(second.keys) == {"b"}
+
+
+def test_provider_hot_reloads_jwks_file(
+    monkeypatch: pytest.MonkeyPatch, tmp_path, clock
+):
+    jwks_file = tmp_path / "jwks.json"
+    _ = jwks_file.write_text(json.dumps({"keys": [make_jwk("old")]}))
+    monkeypatch.setenv("JWT_JWKS_FILE", str(jwks_file))
+    provider = KeySetProvider(reload_interval=5, clock=clock)
+
+    old = provider.get()
+    assert old is not None and set(old.keys) == {"old"}
+
+    _ = jwks_file.write_text(json.dumps({"keys": [make_jwk("old"), make_jwk("new")]}))
+
+    # Within the reload interval the file is not even stat'ed
+    assert provider.get() is old
+
+    clock.now += 5
+    new = provider.get()
+    assert new is not None and set(new.keys) == {"old", "new"}
+    # The previous snapshot is untouched for requests still holding it
+    assert set(old.keys) == {"old"}
+
+
+def test_provider_keeps_previous_keys_when_file_is_malformed(
+    monkeypatch: pytest.MonkeyPatch, tmp_path, clock
+):
+    jwks_file = tmp_path / "jwks.json"
+    _ = jwks_file.write_text(json.dumps({"keys": [make_jwk("a")]}))
+    monkeypatch.setenv("JWT_JWKS_FILE", str(jwks_file))
+    provider = KeySetProvider(reload_interval=1, clock=clock)
+    previous = provider.get()
+
+    _ = jwks_file.write_text("{not json")
+    clock.now += 1
+
+    assert provider.get() is previous
@@ -0,0 +1,55 @@
+from src.auth.domain import User
+from src.auth.token_cache import VerifiedTokenCache
+
+
+def test_token_cache_returns_cached_user(clock):
+    cache = VerifiedTokenCache(max_size=10, clock=clock)
+    cache.put("token", User(id="u1"), exp=None, key_version=1)
+
+    assert cache.get("token", key_version=1) == User(id="u1")
+
+
+def test_token_cache_evicts_entry_after_exp(clock):
+    cache = VerifiedTokenCache(max_size=10, clock=clock)
+    cache.put("token", User(id="u1"), exp=clock.now + 5, key_version=1)
+
+    clock.now += 5
+
+    assert cache.get("token", key_version=1) is None
+    assert len(cache) == 0
+
+
+def test_token_cache_caps_ttl_for_tokens_without_exp(clock):
+    cache = VerifiedTokenCache(max_size=10, max_ttl=60, clock=clock)
+    cache.put("token", User(id="u1"), exp=None, key_version=1)
+
+    clock.now += 61
+
+    assert cache.get("token", key_version=1) is None
+
+
+def test_token_cache_ignores_already_expired_tokens(clock):
+    cache = VerifiedTokenCache(max_size=10, clock=clock)
+    cache.put("token", User(id="u1"), exp=clock.now - 1, key_version=1)
+
+    assert len(cache) == 0
+
+
+def test_token_cache_invalidates_on_key_version_change(clock):
+    cache = VerifiedTokenCache(max_size=10, clock=clock)
+    cache.put("token", User(id="u1"), exp=None, key_version=1)
+
+    assert cache.get("token", key_version=2) is None
+
+
+def test_token_cache_evicts_least_recently_used(clock):
+    cache = VerifiedTokenCache(max_size=2, clock=clock)
+    cache.put("a", User(id="a"), exp=None, key_version=1)
+    cache.put("b", User(id="b"), exp=None, key_version=1)
+    _ = cache.get("a", key_version=1)  # "b" is now least recently used
+
+    cache.put("c", User(id="c"), exp=None, key_version=1)
+
+    assert cache.get("b", key_version=1) is None
+    assert cache.get("a", key_version=1) is not None
+    assert cache.get("c", key_version=1) is not None
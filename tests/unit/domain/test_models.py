@@ -2,6 +2,7 @@ import pytest
 from src.shopping.domain import Product, InsufficientStock
 from src.shopping.domain import (
     Cart,
+    CartItem,
     ItemNotFoundInCart,
     add_item_to_cart,
     remove_item_from_cart,
@@ -106,3 +107,43 @@ def test_remove_item_from_cart_service():
 
     assert product.stock == 8
     assert cart.items[0].quantity == 2
+
+
+def test_cart_get_item_by_product_id():
+    cart = Cart(user_id="user1")
+    for product_id in range(1, 4):
+        cart.add_item(Product(id=product_id, stock=10), product_id)
+
+    item = cart.get_item(2)
+
+    assert item is not None
+    assert item.quantity == 2
+    assert cart.get_item(99) is None
+
+
+def test_cart_remove_middle_item_keeps_other_lines_indexed():
+    cart = Cart(user_id="user1")
+    products = [Product(id=product_id, stock=10) for product_id in range(1, 5)]
+    for product in products:
+        cart.add_item(product, product.id)
+
+    _ = cart.remove_item(products[1], 2)
+
+    assert sorted(item.product_id for item in cart.items) == [1, 3, 4]
+    for product in [products[0], products[2], products[3]]:
+        assert cart.get_item(product.id).quantity == product.id
+    with pytest.raises(ItemNotFoundInCart):
+        _ = cart.remove_item(products[1], 1)
+
+
+def test_cart_index_follows_items_changed_outside_the_aggregate():
+    cart = Cart(user_id="user1")
+    cart.add_item(Product(id=1, stock=10), 1)
+
+    # e.g. lines loaded or replaced by the ORM
+    cart.items = [CartItem(product_id=2, quantity=5)]
+
+    assert cart.get_item(1) is None
+    cart.add_item(Product(id=2, stock=10), 1)
+    assert len(cart.items) == 1
+    assert cart.items[0].quantity == 6
@@ -0,0 +1,46 @@
+from src.shopping.cache import CartCache, CartSnapshot
+
+
+def snapshot(cart_id: int = 1, version: int = 1) -> CartSnapshot:
+    return CartSnapshot(cart_id=cart_id, version=version, lines=((1, 2),))
+
+
+def test_hit_only_for_the_current_version():
+    cache = CartCache()
+    cache.put("user-1", snapshot(version=3))
+
+    assert cache.get("user-1", 1, 3) == snapshot(version=3)
+    assert cache.get("user-1", 1, 4) is None
+    # The stale entry was dropped
+    assert len(cache) == 0
+
+
+def test_recreated_cart_does_not_match_old_entry():
+    cache = CartCache()
+    cache.put("user-1", snapshot(cart_id=1, version=0))
+
+    assert cache.get("user-1", 2, 0) is None
+
+
+def test_older_snapshot_does_not_replace_newer_one():
+    cache = CartCache()
+    cache.put("user-1", snapshot(version=5))
+    cache.put("user-1", snapshot(version=4))
+
+    assert cache.get("user-1", 1, 5) is not None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CartCache(max_entries=2)
+    cache.put("user-1", snapshot())
+    cache.put("user-2", snapshot())
+    _ = cache.get("user-1", 1, 1)
+    cache.put("user-3", snapshot())
+
+    assert cache.get("user-2", 1, 1) is None
+    assert cache.get("user-1", 1, 1) is not None
+    assert cache.get("user-3", 1, 1) is not None
+
+
+def test_etag_includes_cart_id_and_version():
+    assert snapshot(cart_id=7, version=3).etag == 'W/"7-3"'
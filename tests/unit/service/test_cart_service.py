@@ -1,7 +1,15 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from src.shopping.service import CartService, CartNotFound, ProductNotFound
-from src.shopping.domain import Cart, Product
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.shopping.retry import RetryPolicy
+from src.shopping.service import (
+    BatchOperationFailed,
+    CartService,
+    CartNotFound,
+    ProductNotFound,
+)
+from src.shopping.domain import Cart, InsufficientStock, Product
+from src.shopping.schemas import CartBatchOperation
 
 
 @pytest.fixture
@@ -102,3 +110,167 @@ def test_remove_item_cart_not_found_raises_error(cart_service):
     # Act & Assert
     with pytest.raises(CartNotFound):
         cart_service.remove_item("user1", 1, 1)
+
+
+def test_apply_batch_locks_products_in_id_order(cart_service, mock_session):
+    # Setup
+    cart = Cart(user_id="user1")
+    products = [Product(id=1, stock=10), Product(id=3, stock=10)]
+    cart_service.cart_repo.get_by_user_id_with_lock.return_value = cart
+    cart_service.product_repo.get_by_ids_with_lock = MagicMock(return_value=products)
+    operations = [
+        CartBatchOperation(action="add", product_id=3, quantity=2),
+        CartBatchOperation(action="add", product_id=1, quantity=1),
+        CartBatchOperation(action="remove", product_id=3, quantity=1),
+    ]
+
+    # Act
+    results = cart_service.apply_batch("user1", operations)
+
+    # Assert
+    cart_service.product_repo.get_by_ids_with_lock.assert_called_once_with([1, 3])
+    assert [(r.product_id, r.quantity, r.cart_quantity) for r in results] == [
+        (3, 2, 2),
+        (1, 1, 1),
+        (3, 1, 1),
+    ]
+    mock_session.commit.assert_called_once()
+
+
+def test_apply_batch_failure_reports_line_and_skips_commit(cart_service, mock_session):
+    # Setup
+    cart_service.cart_repo.get_by_user_id_with_lock.return_value = Cart(user_id="user1")
+    cart_service.product_repo.get_by_ids_with_lock = MagicMock(
+        return_value=[Product(id=1, stock=1)]
+    )
+    operations = [
+        CartBatchOperation(action="add", product_id=1, quantity=1),
+        CartBatchOperation(action="add", product_id=1, quantity=1),
+    ]
+
+    # Act & Assert
+    with pytest.raises(BatchOperationFailed) as excinfo:
+        _ = cart_service.apply_batch("user1", operations)
+
+    assert excinfo.value.index == 1
+    assert isinstance(excinfo.value.error, InsufficientStock)
+    mock_session.commit.assert_not_called()
+    mock_session.rollback.assert_called_once()
+
+
+@pytest.fixture
+def fast_cart_service(mock_session):
+    service = CartService(mock_session, fast_path=True)
+    service.cart_repo = MagicMock()
+    service.product_repo = MagicMock()
+    return service
+
+
+def test_add_item_fast_path_uses_single_statements(fast_cart_service, mock_session):
+    # Setup
+    calls = []
+    fast_cart_service.cart_repo.get_id_by_user_id_with_lock.return_value = 7
+    fast_cart_service.cart_repo.upsert_item.side_effect = lambda *a: calls.append(
+        "upsert"
+    )
+    fast_cart_service.product_repo.decrease_stock_if_available.side_effect = (
+        lambda *a: calls.append("decrement") or 3
+    )
+    mock_session.commit.side_effect = lambda: calls.append("commit")
+
+    # Act
+    fast_cart_service.add_item("user1", 1, 2)
+
+    # Assert
+    fast_cart_service.product_repo.decrease_stock_if_available.assert_called_once_with(
+        1, 2
+    )
+    fast_cart_service.cart_repo.upsert_item.assert_called_once_with(7, 1, 2)
+    fast_cart_service.product_repo.get_by_id_with_lock.assert_not_called()
+    # The product row is locked only right before the commit
+    assert calls == ["upsert", "decrement", "commit"]
+
+
+def test_add_item_fast_path_insufficient_stock(fast_cart_service, mock_session):
+    # Setup
+    fast_cart_service.cart_repo.get_id_by_user_id_with_lock.return_value = 7
+    fast_cart_service.product_repo.decrease_stock_if_available.return_value = None
+    fast_cart_service.product_repo.get_by_id.return_value = Product(id=1, stock=1)
+
+    # Act & Assert
+    with pytest.raises(InsufficientStock):
+        fast_cart_service.add_item("user1", 1, 2)
+
+    mock_session.commit.assert_not_called()
+    mock_session.rollback.assert_called_once()
+
+
+def test_add_item_fast_path_product_not_found(fast_cart_service, mock_session):
+    # Setup
+    fast_cart_service.cart_repo.get_id_by_user_id_with_lock.return_value = 7
+    orig = Exception("violates foreign key constraint")
+    orig.pgcode = "23503"
+    fast_cart_service.cart_repo.upsert_item.side_effect = IntegrityError(
+        "INSERT", {}, orig
+    )
+
+    # Act & Assert
+    with pytest.raises(ProductNotFound):
+        fast_cart_service.add_item("user1", 999, 1)
+
+    fast_cart_service.product_repo.decrease_stock_if_available.assert_not_called()
+    mock_session.commit.assert_not_called()
+    mock_session.rollback.assert_called_once()
+
+
+def _db_error(pgcode):
+    orig = Exception("aborted")
+    orig.pgcode = pgcode
+    return OperationalError("SELECT 1", {}, orig)
+
+
+@patch("src.shopping.service.add_item_to_cart")
+def test_add_item_retries_after_deadlock(mock_add_item, cart_service, mock_session):
+    cart_service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0)
+    cart_service.cart_repo.get_by_user_id_with_lock.return_value = MagicMock(spec=Cart)
+    cart_service.product_repo.get_by_id_with_lock.side_effect = [
+        _db_error("40P01"),
+        MagicMock(spec=Product),
+    ]
+
+    cart_service.add_item("user1", 1, 1)
+
+    mock_session.rollback.assert_called_once()
+    mock_session.commit.assert_called_once()
+    mock_add_item.assert_called_once()
+
+
+def test_add_item_gives_up_after_max_attempts(cart_service, mock_session):
+    cart_service.retry_policy = RetryPolicy(max_attempts=2, base_delay=0)
+    cart_service.product_repo.get_by_id_with_lock.side_effect = _db_error("40001")
+
+    with pytest.raises(OperationalError):
+        cart_service.add_item("user1", 1, 1)
+
+    assert cart_service.product_repo.get_by_id_with_lock.call_count == 2
+    mock_session.commit.assert_not_called()
+
+
+def test_add_item_does_not_retry_other_database_errors(cart_service, mock_session):
+    cart_service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0)
+    cart_service.product_repo.get_by_id_with_lock.side_effect = _db_error("23505")
+
+    with pytest.raises(OperationalError):
+        cart_service.add_item("user1", 1, 1)
+
+    assert cart_service.product_repo.get_by_id_with_lock.call_count == 1
+    mock_session.rollback.assert_not_called()
+
+
+def test_retry_policy_delay_is_jittered_and_capped():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, max_delay=0.03)
+
+    delays = [policy.delay(attempt) for attempt in (1, 2, 3, 4) for _ in range(50)]
+
+    assert all(0 <= delay <= 0.03 for delay in delays)
+    assert len(set(delays)) > 1
@@ -0,0 +1,21 @@
+from sqlalchemy.engine import make_url
+from src.database import to_async_url
+
+
+def test_async_url_uses_asyncpg():
+    url = make_url(to_async_url("postgresql://user:secret@db:5432/shop"))
+
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.password == "secret"
+    assert url.database == "shop"
+
+
+def test_async_url_translates_sslmode_and_drops_libpq_only_params():
+    url = make_url(
+        to_async_url(
+            "postgresql://user:secret@db/shop"
+            "?sslmode=require&connect_timeout=5&application_name=api"
+        )
+    )
+
+    assert dict(url.query) == {"ssl": "require"}
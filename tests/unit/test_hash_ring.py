@@ -0,0 +1,76 @@
+import pytest
+from src.shopping.sharding import HashRing, check_cart_shard_settings, parse_shard_urls
+
+KEYS = [f"user-{i}" for i in range(20000)]
+
+
+def test_mapping_is_stable_and_ignores_shard_order():
+    ring = HashRing(["a", "b", "c"])
+    reordered = HashRing(["c", "a", "b"])
+
+    assert [ring.owner(key) for key in KEYS] == [reordered.owner(key) for key in KEYS]
+
+
+def test_keys_spread_over_all_shards():
+    ring = HashRing(["a", "b", "c", "d"])
+    counts = {name: 0 for name in ring.names}
+    for key in KEYS:
+        counts[ring.owner(key)] += 1
+
+    for count in counts.values():
+        assert count == pytest.approx(len(KEYS) / 4, rel=0.25)
+
+
+def test_adding_a_shard_only_moves_keys_to_it():
+    before = HashRing(["a", "b", "c", "d"])
+    after = HashRing(["a", "b", "c", "d", "e"])
+
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+
+    assert {after.owner(key) for key in moved} == {"e"}
+    assert len(moved) / len(KEYS) == pytest.approx(1 / 5, rel=0.25)
+
+
+def test_ring_needs_a_shard():
+    with pytest.raises(ValueError):
+        _ = HashRing([])
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls(" a=postgresql://h/a , b=postgresql://h/b,") == {
+        "a": "postgresql://h/a",
+        "b": "postgresql://h/b",
+    }
+    assert parse_shard_urls("") == {}
+    with pytest.raises(ValueError):
+        _ = parse_shard_urls("postgresql://h/a")
+
+
+def test_cart_shards_refuse_primary_only_features():
+    check_cart_shard_settings(
+        database_async=False,
+        stock_lease_products=False,
+        coalesce_window_ms=0,
+        cart_line_ttl=0,
+    )
+    with pytest.raises(ValueError, match="DATABASE_ASYNC, CART_LINE_TTL"):
+        check_cart_shard_settings(
+            database_async=True,
+            stock_lease_products=False,
+            coalesce_window_ms=0,
+            cart_line_ttl=1800,
+        )
+    with pytest.raises(ValueError, match="STOCK_LEASE_PRODUCTS"):
+        check_cart_shard_settings(
+            database_async=False,
+            stock_lease_products=True,
+            coalesce_window_ms=0,
+            cart_line_ttl=0,
+        )
+    with pytest.raises(ValueError, match="CART_COALESCE_WINDOW_MS"):
+        check_cart_shard_settings(
+            database_async=False,
+            stock_lease_products=False,
+            coalesce_window_ms=2,
+            cart_line_ttl=0,
+        )
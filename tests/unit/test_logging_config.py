@@ -0,0 +1,156 @@
+import json
+import queue
+import logging
+import pytest
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from src.logging_config import (
+    ContextQueueHandler,
+    JSONFormatter,
+    SamplingFilter,
+    hold_sampled_records,
+    log_context,
+    parse_sample_rates,
+    release_sampled_records,
+)
+
+
+def make_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger("tests.logging_config")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_queued_record_keeps_the_context_it_was_logged_in():
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue()
+    logger = make_logger(ContextQueueHandler(log_queue))
+
+    token = log_context.set({"correlation_id": "abc"})
+    try:
+        logger.info("Added %d items", 3)
+    finally:
+        log_context.reset(token)
+
+    # Formatted later, on another thread, outside the request context
+    output = json.loads(JSONFormatter(encoder="json").format(log_queue.get_nowait()))
+    assert output["message"] == "Added 3 items"
+    assert output["correlation_id"] == "abc"
+
+
+def test_queued_record_keeps_exception_text():
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue()
+    logger = make_logger(ContextQueueHandler(log_queue))
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.error("Failed", exc_info=True)
+
+    output = json.loads(JSONFormatter(encoder="json").format(log_queue.get_nowait()))
+    assert "ValueError: boom" in output["exception"]
+
+
+def test_full_queue_drops_records_without_blocking():
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=1)
+    logger = make_logger(ContextQueueHandler(log_queue))
+    before = REGISTRY.get_sample_value("log_records_dropped_total") or 0
+
+    logger.info("kept")
+    logger.info("dropped")
+
+    assert log_queue.qsize() == 1
+    assert REGISTRY.get_sample_value("log_records_dropped_total") == before + 1
+
+
+def test_orjson_encoder_matches_json():
+    _ = pytest.importorskip("orjson")
+    record = logging.LogRecord("x", logging.INFO, "f.py", 1, "hi %s", ("there",), None)
+
+    assert json.loads(JSONFormatter(encoder="orjson").format(record)) == json.loads(
+        JSONFormatter(encoder="json").format(record)
+    )
+
+
+class CountingArg:
+    """Log argument that counts how often it is formatted."""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self) -> str:
+        self.formatted += 1
+        return "arg"
+
+
+def sampled_logger(rates: str) -> tuple[logging.Logger, queue.Queue]:
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue()
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(rates)))
+    return make_logger(handler), log_queue
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("src.shopping=0.1, src.main:DEBUG=0") == {
+        ("src.shopping", None): 0.1,
+        ("src.main", logging.DEBUG): 0.0,
+    }
+    with pytest.raises(ValueError):
+        _ = parse_sample_rates("src:LOUD=1")
+
+
+def test_most_specific_rate_wins():
+    sampler = SamplingFilter(
+        parse_sample_rates("=0.5,src=0.2,src.shopping=0.1,src.shopping:DEBUG=0")
+    )
+
+    assert sampler.rate_for("src.shopping.service", logging.INFO) == 0.1
+    assert sampler.rate_for("src.shopping.service", logging.DEBUG) == 0.0
+    assert sampler.rate_for("src.main", logging.INFO) == 0.2
+    assert sampler.rate_for("uvicorn", logging.INFO) == 0.5
+
+
+def test_dropped_records_are_never_formatted_and_warnings_are_kept():
+    logger, log_queue = sampled_logger("tests=0")
+    arg = CountingArg()
+
+    logger.info("Adding %s", arg)
+    logger.warning("Stock low for %s", arg)
+
+    assert log_queue.qsize() == 1
+    assert log_queue.get_nowait().getMessage() == "Stock low for arg"
+    assert arg.formatted == 1
+
+
+def test_sampling_keeps_or_drops_a_request_as_a_whole():
+    logger, log_queue = sampled_logger("tests=0.5")
+
+    kept_sizes = set()
+    for index in range(20):
+        token = log_context.set({"correlation_id": f"request-{index}"})
+        try:
+            before = log_queue.qsize()
+            for _ in range(3):
+                logger.info("line")
+            kept_sizes.add(log_queue.qsize() - before)
+        finally:
+            log_context.reset(token)
+
+    assert kept_sizes == {0, 3}
+
+
+def test_slow_request_releases_its_dropped_records():
+    logger, log_queue = sampled_logger("tests=0")
+
+    with patch("src.logging_config._handler", logger.handlers[0]):
+        fast = hold_sampled_records()
+        logger.info("fast request line")
+        release_sampled_records(fast, elapsed=0.001)
+        assert log_queue.qsize() == 0
+
+        slow = hold_sampled_records()
+        logger.info("slow request line")
+        release_sampled_records(slow, elapsed=60.0)
+
+    assert log_queue.get_nowait().getMessage() == "slow request line"